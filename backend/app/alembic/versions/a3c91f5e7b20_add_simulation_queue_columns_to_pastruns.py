@@ -0,0 +1,35 @@
+"""add simulation queue columns to pastruns
+
+Revision ID: a3c91f5e7b20
+Revises: 6e17e7986ee0
+Create Date: 2026-02-03 10:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91f5e7b20'
+down_revision = '6e17e7986ee0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('pastruns', sa.Column('queued_at', sa.DateTime(), nullable=True))
+    op.add_column('pastruns', sa.Column('started_at', sa.DateTime(), nullable=True))
+    op.add_column('pastruns', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    op.add_column('pastruns', sa.Column('worker', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    # Workers only ever look for queued runs, keep that index small
+    op.create_index('idx_pastruns_queue', 'pastruns', ['queued_at'], unique=False,
+                    postgresql_where=sa.text('status = 1000'))
+
+
+def downgrade():
+    op.drop_index('idx_pastruns_queue', table_name='pastruns')
+    op.drop_column('pastruns', 'worker')
+    op.drop_column('pastruns', 'finished_at')
+    op.drop_column('pastruns', 'started_at')
+    op.drop_column('pastruns', 'queued_at')
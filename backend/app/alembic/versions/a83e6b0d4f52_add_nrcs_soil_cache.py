@@ -0,0 +1,43 @@
+"""add nrcs soil cache
+
+Revision ID: a83e6b0d4f52
+Revises: f5c27d9e1b84
+Create Date: 2026-04-08 11:23:09.540127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83e6b0d4f52'
+down_revision = 'f5c27d9e1b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Horizons of the main component of a map unit (mukey, comma-joined when
+    # a point falls on several), NULL when SDM has no data for it
+    op.create_table(
+        'nrcs_soil_profile',
+        sa.Column('mukey', sa.String(), nullable=False),
+        sa.Column('horizons', JSONB(), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('mukey'),
+    )
+    # Map unit of each rounded lon/lat tile looked up, NULL outside the survey
+    op.create_table(
+        'nrcs_soil_tile',
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('mukey', sa.String(), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('lon', 'lat'),
+    )
+
+
+def downgrade():
+    op.drop_table('nrcs_soil_tile')
+    op.drop_table('nrcs_soil_profile')
@@ -0,0 +1,45 @@
+"""add simulation summary
+
+Revision ID: a9d3f07c5e21
+Revises: f2c6d84e0b17
+Create Date: 2026-03-12 09:18:44.502163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f07c5e21'
+down_revision = 'f2c6d84e0b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per run, written when its outputs are ingested. Runs ingested
+    # earlier get theirs the first time their summary is viewed.
+    op.create_table(
+        'simulation_summary',
+        sa.Column('sim_id', sa.Integer(), sa.ForeignKey('pastruns.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('crop', sa.String(), nullable=False),
+        sa.Column('yield', sa.Float(), nullable=True),
+        sa.Column('total_biomass', sa.Float(), nullable=True),
+        sa.Column('nitrogen_uptake', sa.Float(), nullable=True),
+        sa.Column('plant_density', sa.Float(), nullable=True),
+        sa.Column('sowing_date', sa.Date(), nullable=True),
+        sa.Column('emergence_date', sa.Date(), nullable=True),
+        sa.Column('tasseled_date', sa.Date(), nullable=True),
+        sa.Column('silked_date', sa.Date(), nullable=True),
+        sa.Column('maturity_date', sa.Date(), nullable=True),
+        sa.Column('harvest_date', sa.Date(), nullable=True),
+        sa.Column('rstage_dates', postgresql.JSONB(), nullable=True),
+        sa.Column('total_n_applied', sa.Float(), nullable=True),
+        sa.Column('total_irrigation', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('simulation_summary')
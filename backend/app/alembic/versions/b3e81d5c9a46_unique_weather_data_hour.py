@@ -0,0 +1,34 @@
+"""unique weather data hour
+
+Revision ID: b3e81d5c9a46
+Revises: a9d3f07c5e21
+Create Date: 2026-03-16 10:02:37.118940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e81d5c9a46'
+down_revision = 'a9d3f07c5e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Overlapping downloads used to leave several rows for one station hour;
+    # keep the most recent one so downloads can upsert on the hour. Daily
+    # stations have no hour: NULL is indexed as -1 so their days are unique too.
+    op.execute("""
+        DELETE FROM weather_data a USING weather_data b
+         WHERE a.weather_id = b.weather_id AND a.date = b.date
+           AND a.hour IS NOT DISTINCT FROM b.hour AND a.id < b.id
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX uq_weather_data_station_hour ON weather_data (weather_id, date, COALESCE(hour, -1))
+    """)
+
+
+def downgrade():
+    op.drop_index('uq_weather_data_station_hour', table_name='weather_data')
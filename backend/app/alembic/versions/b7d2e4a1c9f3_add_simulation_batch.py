@@ -0,0 +1,37 @@
+"""add simulation batch
+
+Revision ID: b7d2e4a1c9f3
+Revises: a3c91f5e7b20
+Create Date: 2026-02-10 14:37:05.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4a1c9f3'
+down_revision = 'a3c91f5e7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('simulation_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('members', sa.Integer(), nullable=False),
+    sa.Column('parameters', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('pastruns', sa.Column('batch_id', sa.Integer(), nullable=True))
+    op.create_index('idx_pastruns_batch_id', 'pastruns', ['batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_pastruns_batch_id', table_name='pastruns')
+    op.drop_column('pastruns', 'batch_id')
+    op.drop_table('simulation_batch')
@@ -0,0 +1,165 @@
+"""hash partition output tables
+
+Revision ID: c4d9e2a7f315
+Revises: a83e6b0d4f52
+Create Date: 2026-10-18 14:02:37.118540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e2a7f315'
+down_revision = 'a83e6b0d4f52'
+branch_labels = None
+depends_on = None
+
+output_tables = [
+    'g01_maize', 'g03_maize', 'g04_maize', 'g05_maize', 'g07_maize', 'plantStress_maize',
+    'g01_potato', 'g03_potato', 'g04_potato', 'g05_potato', 'g07_potato', 'nitrogen_potato', 'plantStress_potato',
+    'g01_cotton', 'g03_cotton', 'g04_cotton', 'g05_cotton', 'g07_cotton', 'plantStress_cotton',
+    'g01_soybean', 'g03_soybean', 'g04_soybean', 'g05_soybean', 'g07_soybean', 'nitrogen_soybean',
+    'plantStress_soybean',
+    'g03_fallow', 'g05_fallow', 'g07_fallow',
+]
+
+# table -> (partition key, sim id index, index columns)
+partitioned_tables = {table: (f'{table}_id', f'idx_{table}_sim_date', [f'{table}_id', 'Date_Time'])
+                      for table in output_tables}
+partitioned_tables['plantStress_fallow'] = ('plantStress_fallow_id', 'idx_plantStress_fallow_sim',
+                                            ['plantStress_fallow_id'])
+partitioned_tables['geometry'] = ('simID', 'idx_geometry_simID', ['simID'])
+partitioned_tables['soil_node_arrays'] = ('sim_id', None, [])
+
+# Fixed number of hash partitions per table, all created here: ingest and
+# delete never run DDL, a run's rows are removed with DELETE
+hash_partitions = 16
+
+
+def quoted(columns):
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def read_keys(tables):
+    '''
+    Primary keys and unique constraints of the given tables as
+    (name, type, columns), one per column list.
+    '''
+    query = sa.text("""
+        SELECT c.conname, c.contype, array_agg(a.attname ORDER BY k.ord)
+          FROM pg_constraint c
+          CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord)
+          JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+         WHERE c.conrelid = ANY(CAST(:tables AS regclass[])) AND c.contype IN ('p', 'u')
+         GROUP BY c.oid, c.conname, c.contype, c.conrelid
+         ORDER BY c.conrelid = CAST(:parent AS regclass) DESC, c.contype, c.conname
+    """)
+    names = [f'"{table}"' for table in tables if table_exists(table)]
+    keys = {}
+    for name, kind, columns in op.get_bind().execute(query, {'tables': names, 'parent': names[0]}):
+        if kind == 'p' and any(k == 'p' for k, _ in keys.values()):
+            continue
+        keys.setdefault(tuple(columns), (kind, name))
+    return [(name, kind, list(columns)) for columns, (kind, name) in keys.items()]
+
+
+def table_exists(table):
+    return op.get_bind().execute(sa.text("SELECT to_regclass(:name) IS NOT NULL"),
+                                 {'name': f'"{table}"'}).scalar()
+
+
+def default_sequences(table):
+    query = sa.text("""
+        SELECT a.attname, pg_get_serial_sequence(quote_ident(:table), a.attname)
+          FROM pg_attribute a
+         WHERE a.attrelid = quote_ident(:table)::regclass AND a.attnum > 0 AND NOT a.attisdropped
+           AND pg_get_serial_sequence(quote_ident(:table), a.attname) IS NOT NULL
+    """)
+    return list(op.get_bind().execute(query, {'table': table}))
+
+
+def rebuild(table, key, partition_by):
+    '''
+    Rename table out of the way and create an empty parent with the same
+    columns and defaults in its place, partitioned as given. The caller
+    copies the rows and drops the old table. Returns the old table name.
+    '''
+    old = f'{table}_old'
+    op.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    op.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY {partition_by} ("{key}")')
+    return old
+
+
+def add_keys(table, key, keys):
+    # Keys of a partitioned table must include the partition key
+    for name, kind, columns in keys:
+        if key not in columns:
+            columns = columns + [key]
+        constraint = 'PRIMARY KEY' if kind == 'p' else 'UNIQUE'
+        op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {constraint} ({quoted(columns)})')
+
+
+def upgrade():
+    # e5a7c93d1f08 and f2c6d84e0b17 partitioned these tables by LIST, one
+    # partition per run created at ingest. Every table is rebuilt as HASH of
+    # the simulation id and its rows copied over. LIKE ... INCLUDING DEFAULTS
+    # left the primary keys of the old tables on their default partitions
+    # only; they are added back on the new parents.
+    for table, (key, index, columns) in partitioned_tables.items():
+        default = f'{table}_default'
+        keys = read_keys([table, default])
+        # Identity columns became sequences owned by the default partition
+        sequences = default_sequences(default) if table_exists(default) else []
+        old = rebuild(table, key, 'HASH')
+        for remainder in range(hash_partitions):
+            op.execute(f'CREATE TABLE "{table}_h{remainder:02d}" PARTITION OF "{table}" '
+                       f'FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder})')
+        condition = ''
+        if any(kind == 'p' for _, kind, _ in keys):
+            # The primary key makes the run id NOT NULL; rows without one
+            # belong to no simulation and were never read
+            condition = f' WHERE "{key}" IS NOT NULL'
+        op.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"{condition}')
+        for column, sequence in sequences:
+            op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."{column}"')
+        op.execute(f'DROP TABLE "{old}"')
+        add_keys(table, key, keys)
+        if index is not None:
+            op.execute(f'CREATE INDEX "{index}" ON "{table}" ({quoted(columns)})')
+
+
+def downgrade():
+    # Back to the LIST layout of e5a7c93d1f08: the rows of the output tables
+    # go to the default partition, those of soil_node_arrays (whose default
+    # partition takes no rows) to one partition per run. The keys keep the
+    # simulation id.
+    last_run = op.get_bind().execute(sa.text("SELECT COALESCE(max(id), 0) FROM pastruns")).scalar()
+    for table, (key, index, columns) in partitioned_tables.items():
+        keys = read_keys([table])
+        sequences = default_sequences(table)
+        old = rebuild(table, key, 'LIST')
+        default = f'{table}_default'
+        if table == 'soil_node_arrays':
+            op.execute(f'CREATE TABLE "{default}" PARTITION OF "{table}" DEFAULT')
+            op.execute(f'ALTER TABLE "{default}" ADD CONSTRAINT "{default}_runs" CHECK (false)')
+            sim_ids = op.get_bind().execute(sa.text(f'SELECT DISTINCT "{key}" FROM "{old}"')).scalars()
+            for sim_id in sim_ids:
+                op.execute(f'CREATE TABLE "{table}_p{int(sim_id)}" PARTITION OF "{table}" FOR VALUES IN ({int(sim_id)})')
+            op.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+        else:
+            op.execute(f'CREATE TABLE "{default}" (LIKE "{old}" INCLUDING DEFAULTS)')
+            op.execute(f'INSERT INTO "{default}" SELECT * FROM "{old}"')
+            last_id = op.get_bind().execute(sa.text(f'SELECT max("{key}") FROM "{default}"')).scalar()
+            bound = max(int(last_run), int(last_id or 0))
+            op.execute(f'ALTER TABLE "{default}" ADD CONSTRAINT "{default}_runs" '
+                       f'CHECK ("{key}" IS NULL OR "{key}" <= {bound})')
+            op.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+        for column, sequence in sequences:
+            op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{default}"."{column}"')
+        op.execute(f'DROP TABLE "{old}"')
+        add_keys(table, key, keys)
+        if index is not None:
+            # e5a7c93d1f08 expects the index of the default partition under this name
+            op.execute(f'CREATE INDEX "{index}_default" ON "{default}" ({quoted(columns)})')
+            op.execute(f'CREATE INDEX "{index}" ON "{table}" ({quoted(columns)})')
@@ -0,0 +1,27 @@
+"""add weather data version and window index
+
+Revision ID: c4e8a2f61d57
+Revises: b7d2e4a1c9f3
+Create Date: 2026-02-17 09:21:44.630158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2f61d57'
+down_revision = 'b7d2e4a1c9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('weather_meta', sa.Column('data_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    # WriteWeather reads one station's rows for the simulation window
+    op.create_index('idx_weather_data_station_date', 'weather_data', ['weather_id', 'stationtype', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_weather_data_station_date', table_name='weather_data')
+    op.drop_column('weather_meta', 'data_version')
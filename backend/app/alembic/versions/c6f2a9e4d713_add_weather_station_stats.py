@@ -0,0 +1,75 @@
+"""add weather station stats
+
+Revision ID: c6f2a9e4d713
+Revises: b3e81d5c9a46
+Create Date: 2026-03-18 15:27:06.481125
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f2a9e4d713'
+down_revision = 'b3e81d5c9a46'
+branch_labels = None
+depends_on = None
+
+stats_variables = ["srad", "wind", "rh", "rain", "tmax", "tmin", "temperature"]
+
+
+def extreme_columns():
+    columns = []
+    for var in stats_variables:
+        columns.append(sa.Column(f'{var}_min', sa.Float(), nullable=True))
+        columns.append(sa.Column(f'{var}_max', sa.Float(), nullable=True))
+    return columns
+
+
+def upgrade():
+    # Hours and extremes per station day, and their rollup per station; the
+    # weather ingest keeps both current for the days it writes
+    op.create_table(
+        'weather_station_daily',
+        sa.Column('weather_id', sa.String(), nullable=False),
+        sa.Column('stationtype', sa.String(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('hours', sa.Integer(), nullable=False),
+        *extreme_columns(),
+        sa.PrimaryKeyConstraint('weather_id', 'date', 'stationtype'),
+    )
+    op.create_table(
+        'weather_station_stats',
+        sa.Column('weather_id', sa.String(), nullable=False),
+        sa.Column('stationtype', sa.String(), nullable=False),
+        sa.Column('row_count', sa.BigInteger(), nullable=False),
+        sa.Column('days', sa.Integer(), nullable=False),
+        sa.Column('complete_days', sa.Integer(), nullable=False),
+        sa.Column('first_date', sa.Date(), nullable=True),
+        sa.Column('last_date', sa.Date(), nullable=True),
+        *extreme_columns(),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('weather_id', 'stationtype'),
+    )
+    columns = ", ".join(f"{var}_min, {var}_max" for var in stats_variables)
+    op.execute(f"""
+        INSERT INTO weather_station_daily (weather_id, stationtype, date, hours, {columns})
+        SELECT weather_id, stationtype, CAST(date AS date), count(*),
+               {", ".join(f"min({var}), max({var})" for var in stats_variables)}
+          FROM weather_data
+         WHERE weather_id IS NOT NULL AND stationtype IS NOT NULL AND date ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$'
+         GROUP BY weather_id, stationtype, date
+    """)
+    op.execute(f"""
+        INSERT INTO weather_station_stats (weather_id, stationtype, row_count, days, complete_days,
+                                           first_date, last_date, {columns})
+        SELECT weather_id, stationtype, sum(hours), count(*), count(*) FILTER (WHERE hours >= 24),
+               min(date), max(date), {", ".join(f"min({var}_min), max({var}_max)" for var in stats_variables)}
+          FROM weather_station_daily
+         GROUP BY weather_id, stationtype
+    """)
+
+
+def downgrade():
+    op.drop_table('weather_station_stats')
+    op.drop_table('weather_station_daily')
@@ -0,0 +1,52 @@
+"""add soil grid
+
+Revision ID: d47a1c8e2f90
+Revises: c6f2a9e4d713
+Create Date: 2026-03-24 10:12:41.305518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd47a1c8e2f90'
+down_revision = 'c6f2a9e4d713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per distinct .grd file; runs on the same grid share its nodes
+    # instead of copying them into geometry
+    op.create_table(
+        'soil_grid',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('node_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', name='uq_soil_grid_content_hash'),
+    )
+    op.create_table(
+        'grid_node',
+        sa.Column('grid_id', sa.Integer(), nullable=False),
+        sa.Column('nodeNum', sa.Integer(), nullable=False),
+        sa.Column('X', sa.Float(), nullable=False),
+        sa.Column('Y', sa.Float(), nullable=False),
+        sa.Column('Layer', sa.Integer(), nullable=True),
+        sa.Column('Area', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['grid_id'], ['soil_grid.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('grid_id', 'nodeNum'),
+    )
+    op.add_column('pastruns', sa.Column('grid_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_pastruns_grid_id', 'pastruns', 'soil_grid', ['grid_id'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_pastruns_grid_id', 'pastruns', ['grid_id'])
+
+
+def downgrade():
+    op.drop_index('ix_pastruns_grid_id', table_name='pastruns')
+    op.drop_constraint('fk_pastruns_grid_id', 'pastruns', type_='foreignkey')
+    op.drop_column('pastruns', 'grid_id')
+    op.drop_table('grid_node')
+    op.drop_table('soil_grid')
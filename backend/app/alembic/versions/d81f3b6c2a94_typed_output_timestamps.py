@@ -0,0 +1,67 @@
+"""typed Date_Time and sim id indexes on output tables
+
+Revision ID: d81f3b6c2a94
+Revises: c4e8a2f61d57
+Create Date: 2026-02-24 10:12:05.418337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3b6c2a94'
+down_revision = 'c4e8a2f61d57'
+branch_labels = None
+depends_on = None
+
+# Output tables with a Date_Time column; the sim id column is <table>_id
+output_tables = [
+    'g01_maize', 'g03_maize', 'g04_maize', 'g05_maize', 'g07_maize', 'plantStress_maize',
+    'g01_potato', 'g03_potato', 'g04_potato', 'g05_potato', 'g07_potato', 'nitrogen_potato', 'plantStress_potato',
+    'g01_cotton', 'g03_cotton', 'g04_cotton', 'g05_cotton', 'g07_cotton', 'plantStress_cotton',
+    'g01_soybean', 'g03_soybean', 'g04_soybean', 'g05_soybean', 'g07_soybean', 'nitrogen_soybean',
+    'plantStress_soybean',
+    'g03_fallow', 'g05_fallow', 'g07_fallow',
+]
+# Column types before this revision, for downgrade
+day_number_tables = ['g03_fallow', 'g05_fallow']
+timestamp_tables = ['plantStress_cotton', 'nitrogen_soybean', 'plantStress_soybean']
+
+
+def date_time_type(table):
+    query = sa.text("""
+        SELECT data_type FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table AND column_name = 'Date_Time'
+    """)
+    return op.get_bind().execute(query, {'table': table}).scalar()
+
+
+def upgrade():
+    for table in output_tables:
+        data_type = date_time_type(table)
+        if data_type in ('double precision', 'real'):
+            # 2dsoil days since 12/30/1899
+            using = """timestamp '1899-12-30' + "Date_Time" * interval '1 day'"""
+        elif data_type in ('character varying', 'text'):
+            using = """NULLIF(trim("Date_Time"), '')::timestamp"""
+        else:
+            using = None
+        if using is not None:
+            op.execute(f'ALTER TABLE "{table}" ALTER COLUMN "Date_Time" TYPE timestamp USING {using}')
+        op.create_index(f'idx_{table}_sim_date', table, [f'{table}_id', 'Date_Time'], unique=False)
+    op.create_index('idx_plantStress_fallow_sim', 'plantStress_fallow', ['plantStress_fallow_id'], unique=False)
+    op.create_index('idx_geometry_simID', 'geometry', ['simID'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_geometry_simID', table_name='geometry')
+    op.drop_index('idx_plantStress_fallow_sim', table_name='plantStress_fallow')
+    for table in reversed(output_tables):
+        op.drop_index(f'idx_{table}_sim_date', table_name=table)
+        if table in day_number_tables:
+            op.execute(f'ALTER TABLE "{table}" ALTER COLUMN "Date_Time" TYPE double precision '
+                       f'USING EXTRACT(EPOCH FROM "Date_Time" - timestamp \'1899-12-30\') / 86400')
+        elif table not in timestamp_tables:
+            op.execute(f'ALTER TABLE "{table}" ALTER COLUMN "Date_Time" TYPE varchar '
+                       f'USING to_char("Date_Time", \'YYYY-MM-DD HH24:MI:SS\')')
@@ -0,0 +1,35 @@
+"""add soil node index
+
+Revision ID: e18b5f3a6c27
+Revises: d47a1c8e2f90
+Create Date: 2026-03-27 09:41:17.862094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e18b5f3a6c27'
+down_revision = 'd47a1c8e2f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Timesteps of each per-node output of a run and where their rows sit in
+    # the Date_Time-sorted Parquet archive, written at ingest
+    op.create_table(
+        'soil_node_index',
+        sa.Column('sim_id', sa.Integer(), nullable=False),
+        sa.Column('output', sa.String(length=3), nullable=False),
+        sa.Column('Date_Time', sa.DateTime(), nullable=False),
+        sa.Column('row_start', sa.Integer(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['sim_id'], ['pastruns.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('sim_id', 'output', 'Date_Time'),
+    )
+
+
+def downgrade():
+    op.drop_table('soil_node_index')
@@ -0,0 +1,83 @@
+"""partition output tables by simulation id
+
+Revision ID: e5a7c93d1f08
+Revises: d81f3b6c2a94
+Create Date: 2026-03-03 14:40:19.207716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c93d1f08'
+down_revision = 'd81f3b6c2a94'
+branch_labels = None
+depends_on = None
+
+output_tables = [
+    'g01_maize', 'g03_maize', 'g04_maize', 'g05_maize', 'g07_maize', 'plantStress_maize',
+    'g01_potato', 'g03_potato', 'g04_potato', 'g05_potato', 'g07_potato', 'nitrogen_potato', 'plantStress_potato',
+    'g01_cotton', 'g03_cotton', 'g04_cotton', 'g05_cotton', 'g07_cotton', 'plantStress_cotton',
+    'g01_soybean', 'g03_soybean', 'g04_soybean', 'g05_soybean', 'g07_soybean', 'nitrogen_soybean',
+    'plantStress_soybean',
+    'g03_fallow', 'g05_fallow', 'g07_fallow',
+]
+
+# table -> (partition key, sim id index, index columns)
+partitioned_tables = {table: (f'{table}_id', f'idx_{table}_sim_date', [f'{table}_id', 'Date_Time'])
+                      for table in output_tables}
+partitioned_tables['plantStress_fallow'] = ('plantStress_fallow_id', 'idx_plantStress_fallow_sim',
+                                            ['plantStress_fallow_id'])
+partitioned_tables['geometry'] = ('simID', 'idx_geometry_simID', ['simID'])
+
+
+def quoted(columns):
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def identity_columns(table):
+    query = sa.text("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table AND is_identity = 'YES'
+    """)
+    return [row[0] for row in op.get_bind().execute(query, {'table': table})]
+
+
+def upgrade():
+    # Every run gets its own LIST partition (created at ingest); the existing
+    # rows stay where they are, in the DEFAULT partition. The CHECK on the
+    # default partition lets Postgres create a new run's partition without
+    # scanning the old rows.
+    last_run = op.get_bind().execute(sa.text("SELECT COALESCE(max(id), 0) FROM pastruns")).scalar()
+    for table, (key, index, columns) in partitioned_tables.items():
+        default = f'{table}_default'
+        op.execute(f'ALTER TABLE "{table}" RENAME TO "{default}"')
+        op.execute(f'ALTER INDEX "{index}" RENAME TO "{index}_default"')
+        # Partitioned tables cannot have identity columns before Postgres 17
+        for column in identity_columns(default):
+            sequence = f'{table}_{column}_seq'
+            op.execute(f'ALTER TABLE "{default}" ALTER COLUMN "{column}" DROP IDENTITY')
+            op.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{default}"."{column}"')
+            op.execute(f"""SELECT setval('"{sequence}"', COALESCE((SELECT max("{column}") FROM "{default}"), 0) + 1, false)""")
+            op.execute(f"""ALTER TABLE "{default}" ALTER COLUMN "{column}" SET DEFAULT nextval('"{sequence}"')""")
+        op.execute(f'CREATE TABLE "{table}" (LIKE "{default}" INCLUDING DEFAULTS) PARTITION BY LIST ("{key}")')
+        # Rows of deleted runs can carry ids above the last pastrun
+        last_id = op.get_bind().execute(sa.text(f'SELECT max("{key}") FROM "{default}"')).scalar()
+        bound = max(int(last_run), int(last_id or 0))
+        op.execute(f'ALTER TABLE "{default}" ADD CONSTRAINT "{default}_runs" '
+                   f'CHECK ("{key}" IS NULL OR "{key}" <= {bound})')
+        op.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+        # Attaches the existing index of the default partition
+        op.execute(f'CREATE INDEX "{index}" ON "{table}" ({quoted(columns)})')
+
+
+def downgrade():
+    for table, (key, index, columns) in partitioned_tables.items():
+        default = f'{table}_default'
+        op.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+        op.execute(f'ALTER TABLE "{default}" DROP CONSTRAINT "{default}_runs"')
+        op.execute(f'INSERT INTO "{default}" SELECT * FROM "{table}"')
+        op.execute(f'DROP TABLE "{table}"')
+        op.execute(f'ALTER TABLE "{default}" RENAME TO "{table}"')
+        op.execute(f'ALTER INDEX "{index}_default" RENAME TO "{index}"')
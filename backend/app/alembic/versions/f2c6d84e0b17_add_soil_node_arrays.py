@@ -0,0 +1,39 @@
+"""add soil node arrays
+
+Revision ID: f2c6d84e0b17
+Revises: e5a7c93d1f08
+Create Date: 2026-03-10 11:05:52.734480
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d84e0b17'
+down_revision = 'e5a7c93d1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per run, output file and timestep; data is a float32
+    # (variables x nodes) matrix in geometry nodeNum order. Partitioned by
+    # run like the other output tables.
+    op.execute("""
+        CREATE TABLE soil_node_arrays (
+            sim_id integer NOT NULL,
+            output varchar NOT NULL,
+            "Date_Time" timestamp NOT NULL,
+            variables text[] NOT NULL,
+            node_count integer NOT NULL,
+            data bytea NOT NULL,
+            PRIMARY KEY (sim_id, output, "Date_Time")
+        ) PARTITION BY LIST (sim_id)
+    """)
+    op.execute('CREATE TABLE soil_node_arrays_default PARTITION OF soil_node_arrays DEFAULT')
+    op.execute("ALTER TABLE soil_node_arrays_default ADD CONSTRAINT soil_node_arrays_default_runs CHECK (false)")
+
+
+def downgrade():
+    op.drop_table('soil_node_arrays')
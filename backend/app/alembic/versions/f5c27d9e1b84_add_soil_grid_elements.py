@@ -0,0 +1,26 @@
+"""add soil grid elements
+
+Revision ID: f5c27d9e1b84
+Revises: e18b5f3a6c27
+Create Date: 2026-04-02 14:05:52.117430
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c27d9e1b84'
+down_revision = 'e18b5f3a6c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Corner node numbers of the .grd elements as little-endian int32
+    # (elements x 4); grids stored without them are triangulated from nodes
+    op.add_column('soil_grid', sa.Column('elements', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('soil_grid', 'elements')
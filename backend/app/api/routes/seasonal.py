@@ -1,26 +1,30 @@
 import asyncio
 import json
 from typing import Any, List
-import subprocess
-import time
 from fastapi.responses import StreamingResponse
 import os
-import sys
-import re
 import csv
 import pandas as pd
 import glob
+import shutil
 import logging
 from datetime import datetime, timedelta
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from typing import AsyncGenerator
 from app.api.deps import SessionDep, CurrentUser
-from app.models import Message, SimData, seasonRunResponse,Pastrun
+from app.models import Message, SimData, seasonRunResponse,Pastrun, SimulationBatch
 from app.generateModelInputFiles_helper import *
 from app.dbsupport_helper import *
+from app.simulation_worker import batch_progress, enqueue_batch, enqueue_simulation, queue_stats
+from app.runSupervisor_helper import run_supervised, set_run_status
+from app.ingestOutputFiles_helper import ingestSimulationOutputs
+from app.simulationSummary_helper import store_simulation_summary
+from app.weatherStats_helper import station_has_weather
+from app.simulationInputs_helper import load_simulation_inputs
+from app.fileCache_helper import cache_key, file_digest, grid_cache, input_cache
+from app.core.config import settings
 from sqlalchemy.sql import text
 from watchfiles import awatch  # Added import for awatch
-import time
 # NOTE: The 'watchfiles' library is required for efficient file watching. Ensure it is installed in your environment.
 
 # Create an instance of the FastAPI class
@@ -56,180 +60,6 @@ remOutputFilesFlag = 0
 if not os.path.exists(storeDir):
     print('RotationTab Error: Missing storeDir')
 
-def extract_date_time(date,time):
-    '''
-  Split date and returns as a timestamp.
-  Input:
-    date
-    time
-  Output:
-    date as a timestamp
-    '''
-    (m,d,y) = str(date).split('/')
-    newDate = pd.Timestamp(int(y),int(m),int(d),time)
-    return newDate
-
-def checkNaNInOutputFile(table_name,g_name):
-    '''
-  Check output data for NaN values.
-    table_name
-    g_name = input filename with full path
-  Output:
-    columnList = list with columns with NaN values
-    '''
-    columnList = []
-    spaceStr = ", "
-    message = ""
-    g_df = pd.read_csv(g_name,skipinitialspace=True,index_col=False)
-    # Check for NaN values for each dataframe column
-    dates = []
-    date = ""
-    for col in g_df.columns:
-        if g_df[col].isnull().values.any():
-            if len(dates)  == 0:
-                dates = list(g_df.loc[pd.isna(g_df[col]),:].index)
-                if(table_name == "g01_maize" or table_name == "g01_potato" or \
-                   table_name == "nitrogen_potato" or table_name == "plantStress_potato" or \
-                   table_name == "g01_soybean" or table_name == "nitrogen_soybean" or \
-                   table_name == "plantStress_soybean"):
-                    # Change date format
-                    g_df['Date_Time'] = g_df.apply(lambda row: extract_date_time(row['date'],row['time']), axis=1)
-
-                if(table_name == "g03_maize" or table_name == "g04_maize" or table_name == "g05_maize" or \
-                   table_name == "g03_potato" or table_name == "g04_potato" or table_name == "g05_potato" or \
-                   table_name == "g03_soybean" or table_name == "g04_soybean" or table_name == "g05_soybean" or\
-                   table_name == "g03_fallow" or table_name == "g05_fallow"):
-                    # Change date format
-                    # 2dsoil start counting the days starting on 12/30/1899.
-                    g_df['DateInit'] = pd.Timestamp('1899-12-30')
-                    g_df['Date_Time'] = g_df['DateInit'] + pd.to_timedelta(g_df['Date_time'], unit='D')
-
-                g_df['Date_Time'] = g_df['Date_Time'].dt.strftime('%m/%d/%Y')
-                date = "Date:"+spaceStr.join(g_df['Date_Time'].loc[dates])+"<br>\n"
-            columnList.append(col)
-    if len(columnList) > 0:
-        message = g_name+": "+spaceStr.join(columnList)+"<br>\n"+date
-    return message
-
-
-
-def ingestOutputFile(table_name, g_name, simulationname, session: Any) -> bool:
-    '''
-    Ingest file with output data into the cropOutput database using a SQLAlchemy Session.
-    Input:
-      table_name: The name of the table to insert data into.
-      g_name: Input filename with full path (CSV file).
-      simulationname: The simulation name to link to the table.
-      session: SQLAlchemy session object.
-    Output:
-      True if successful, False if there is an error.
-    '''
-    try:
-        # Load the CSV file into a pandas DataFrame
-        id = table_name + "_id"
-        g_df = pd.read_csv(g_name,skipinitialspace=True,index_col=False)
-        # strip leading and trailing spaces from column names
-        for col in g_df.columns: 
-            g_df.rename(columns={col:col.strip()},inplace=True)
-        g_df[id] = int(simulationname)
-        # Apply date formatting or column transformations based on the table_name
-        if table_name in ["g01_maize", "g01_potato", "nitrogen_potato", "plantStress_potato", 
-                          "plantStress_maize", "g01_soybean", "nitrogen_soybean", 
-                          "plantStress_soybean", "g01_cotton", "plantStress_cotton"]:
-            # Change date format
-            g_df['Date_Time'] = g_df.apply(lambda row: extract_date_time(row['date'], row['time']), axis=1)
-            g_df = g_df.drop(columns=['date', 'time'],axis=1)
-            if table_name == "g01_potato":
-                g_df.rename(columns={ 
-                    'LA/pl': 'LA_pl',
-                    'Tr-Pot': 'Tr_Pot','Tr-Act': 'Tr_Act',
-                    'Rg+Rm':'Rg_Rm'
-                    }, inplace=True)
-            if table_name == "nitrogen_potato":
-                g_df.rename(columns={'Seed N': 'seed_N'}, inplace=True)
-            if table_name in ["nitrogen_potato", "plantStress_potato", "nitrogen_soybean", 
-                              "plantStress_soybean", "g01_cotton", "plantStress_cotton"]:
-                g_df = g_df.drop(columns=['jday'])
-
-        if table_name in ["g03_maize", "g04_maize", "g05_maize", "g07_maize", "g03_potato", "g04_potato", 
-                          "g05_potato", "g07_potato", "g03_soybean", "g04_soybean", "g05_soybean", "g07_soybean", 
-                          "g03_fallow", "g05_fallow", "g07_fallow", "g03_cotton", "g04_cotton", "g05_cotton", 
-                          "g07_cotton"]:
-            # 2dsoil start counting the days starting on 12/30/1899
-            g_df['DateInit'] = pd.Timestamp('1899-12-30')
-            g_df['Date_Time'] = g_df['DateInit'] + pd.to_timedelta(g_df['Date_time'], unit='D').dt.round('h')
-            g_df = g_df.drop(columns=['DateInit', 'Date', 'Date_time'])
-            if table_name in ["g03_maize", "g03_cotton", "g03_soybean", "g03_potato", "g03_fallow"]:
-                g_df = g_df.drop(columns=['Area', 'Vx', 'Vy'])
-
-        # Use the session to perform a bulk insert using pandas' to_sql method
-        g_df.to_sql(table_name, session.bind, if_exists='append', index=False)
-
-        return True
-    except Exception as e:
-        print(f"Error while ingesting output file: {e}")
-        return False
-    
-
-
-
-def ingestGeometryFile(grdFile: str, g03File: str, simulation: str, session: Any) -> bool:
-    '''
-    Ingest geometry data from .grd and .g03 files into the cropOutput database.
-    
-    Input:
-      grdFile: Path to the .grd file
-      g03File: Path to the .g03 file
-      simulation: Simulation name (or ID) to associate with the data
-      session: Active SQLAlchemy session
-    Output:
-      True if data is ingested successfully, False otherwise.
-    '''
-    try:
-        # First, read the .grd file
-        searchFor = "***************** ELEMENT INFORMATION ******************************************************"
-        with open(grdFile, 'r') as gf:
-            lines = gf.readlines()
-            for line in lines:
-                if line.find(searchFor) != -1:
-                    lineNum = lines.index(line)
-                    totLines = len(lines)
-                    footer = totLines - lineNum
-                    break
-        
-        # Load the .grd file into a DataFrame
-        grd_df = pd.read_csv(grdFile, header=[3], sep='\s+', skipinitialspace=True, skipfooter=footer, engine='python')
-        grd_df = grd_df.rename(columns={'n': 'nodeNum', 'x': 'X', 'y': 'Y', 'MatNum': 'Layer'})
-        
-        # Load the .g03 file into a DataFrame
-        g_df = pd.read_csv(g03File, skipinitialspace=True, index_col=False)
-        for col in g_df.columns: 
-            g_df.rename(columns={col: col.strip()}, inplace=True)
-        g_df = g_df.drop(columns=['Date_time', 'Date', 'hNew', 'thNew', 'Vx', 'Vy', 'Q', 'NO3N', 'NH4N', 'Temp', 'CO2Conc', 'O2Conc'])
-        
-        # Drop duplicates from the .g03 data
-        g_df = g_df.drop_duplicates(keep="first")
-
-        # Add simulation ID to the g_df
-        g_df['simID'] = int(simulation)
-        
-        # Merge the two DataFrames on X and Y columns
-        result = pd.merge(grd_df, g_df, how='inner', on=['X', 'Y'])
-
-        # Insert the merged result into the 'geometry' table
-        result.to_sql('geometry', session.bind, if_exists="append", index=False)
-
-        # Commit the session
-        session.commit()
-
-        return True
-    except Exception as e:
-        session.rollback()  # Rollback in case of an error
-        print(f"Error while ingesting geometry data: {e}")
-        return False
-
-
-
 import os
 
 def WriteLayerGas(soilname, field_name, field_path, rowSpacing, rootWeightPerSlab,session,current_user_id):
@@ -295,11 +125,12 @@ def WriteLayerGas(soilname, field_name, field_path, rowSpacing, rootWeightPerSla
 
 
 
-def WriteIni(cropname,experiment,treatmentname, site, soil, field_path,waterStressFlag, nitroStressFlag,session, current_user_id):
+def WriteIni(inputs, site, field_path, waterStressFlag, nitroStressFlag):
     '''
-    lcrop,lexperiment,ltreatmentname,field_name,lsoilname,
-    Get data from operation, soil_long
+    Writes the initialization file (*.ini) from the operations, site and
+    soil depth prefetched in inputs (SimulationInputs)
     '''
+    cropname = inputs.crop
     # Default values
     autoirrigation = 0
     rowangle = 0
@@ -314,18 +145,14 @@ def WriteIni(cropname,experiment,treatmentname, site, soil, field_path,waterStre
     EndDate = 0
     cultivar = "fallow"
 
-    # Find cropid, exid, tid and fetch operation list
-    operationList = []
-    exid = read_experimentDB_id(cropname, experiment,session)
-    tid = read_treatmentDB_id(exid, treatmentname,session)
-    operationList = read_operationsDB_id(tid,session)  # Gets all the operations
+    operationList = inputs.operations  # All the operations of the treatment
 
     # Processing operation list
     for ii, jj in enumerate(operationList):
         if jj[1] == 'Simulation Start':
             if cropname == "fallow":
                 SowingDate = (pd.to_datetime(jj[2]) + pd.DateOffset(days=370)).strftime('%m/%d/%Y')
-            initCond = readOpDetails(jj[0], jj[1],session)
+            initCond = inputs.details(jj[0])
             # Extract initialization conditions
             depth = initCond[0][6]
             length = initCond[0][5]
@@ -351,10 +178,10 @@ def WriteIni(cropname,experiment,treatmentname, site, soil, field_path,waterStre
             EndDate = jj[2]
             if cropname == "fallow":
                 EndDate = (pd.to_datetime(jj[2]) + pd.DateOffset(days=365)).strftime('%m/%d/%Y')
-    tsite_tuple = extract_sitedetails(site,session)  # Get site details
+    tsite_tuple = inputs.site  # Site details
 
     # Maximum profile depth
-    maxSoilDepth = read_soillongDB_maxdepth(soil,session, current_user_id)
+    maxSoilDepth = inputs.max_soil_depth
     RowSP = rowSpacing
 
     # Write INI file
@@ -534,7 +361,15 @@ def prepare_and_execute( simulation_name, session: Any, current_user_id):
     with open(dest_file, 'r') as read_file:
         waterfilecontent = read_file.readlines()
 
-    sandcontent = WriteSoiData(lsoilname, field_name, field_path, session,current_user_id)
+    # Input files that only depend on DB rows are cached by a hash of those rows
+    # and hard-linked into the run folder; .soi/.dat are copied since they are
+    # rewritten by CreateSoilFiles.
+    fingerprints = read_input_fingerprints(lsoilname, session, current_user_id)
+    sandcontent = input_cache.get_or_create(
+        cache_key("soi", fingerprints['soil']), field_path,
+        {"soi": f"{lsoilname}.soi", "dat": f"{field_name}.dat"},
+        lambda: float(WriteSoiData(lsoilname, field_name, field_path, session, current_user_id)),
+        copy_slots=("soi", "dat"))
     if sandcontent > 75:
         with open(dest_file, 'w') as write_file:
             for line in waterfilecontent:
@@ -545,111 +380,142 @@ def prepare_and_execute( simulation_name, session: Any, current_user_id):
     dest_file = os.path.join(field_path, 'WatMovParam.dat')
     copyFile(src_file, dest_file)
 
-    WriteBiologydefault(field_name, field_path, session)
+    input_cache.get_or_create(cache_key("bio", fingerprints['biology']), field_path,
+                              {"bio": "BiologyDefault.bio"},
+                              lambda: WriteBiologydefault(field_name, field_path, session))
 
     # Start
     # Includes initial, management and fertilizer
-    rowSpacing, rootWeightPerSlab, cultivar = WriteIni(lcrop, lexperiment, ltreatmentname, field_name,
-                                                       lsoilname, field_path, waterStressFlag,
-                                                       nitroStressFlag, session, current_user_id)
+    # Treatment, operations, site and soil depth for the writers below, in a few batched queries
+    inputs = load_simulation_inputs(lcrop, lexperiment, ltreatmentname, field_name, lsoilname, session, current_user_id)
+    rowSpacing, rootWeightPerSlab, cultivar = WriteIni(inputs, field_name, field_path, waterStressFlag, nitroStressFlag)
     if cultivar != "fallow":
-        WriteCropVariety(lcrop, cultivar, field_name, field_path, session,current_user_id)
+        input_cache.get_or_create(
+            cache_key("var", lcrop, cultivar, read_cultivar_fingerprint(cultivar, lcrop, session, current_user_id)),
+            field_path, {"var": f"{cultivar}.var"},
+            lambda: WriteCropVariety(lcrop, cultivar, field_name, field_path, session, current_user_id))
     else:
         src_file = os.path.join(storeDir, 'fallow.var')
         dest_file = os.path.join(field_path, 'fallow.var')
         copyFile(src_file, dest_file)
     WriteDripIrrigationFile(field_name, field_path)
-    hourly_flag, edate = WriteWeather(lexperiment, ltreatmentname, lstationtype, lweather, field_path, ltempVar, lrainVar, lCO2Var,current_user_id, session)
-    WriteSoluteFile(lsoilname, field_path, session, current_user_id)
-    WriteGasFile(field_path, session)
+    weather_meta = input_cache.get_or_create(
+        cache_key("wea", lstationtype, lweather, ltempVar, lrainVar, lCO2Var,
+                  read_weather_fingerprint(lexperiment, ltreatmentname, lstationtype, lweather, current_user_id, session)),
+        field_path, {"wea": f"{lstationtype}.wea", "cli": f"{lstationtype}.cli"},
+        lambda: [str(v) for v in WriteWeather(lexperiment, ltreatmentname, lstationtype, lweather, field_path,
+                                              ltempVar, lrainVar, lCO2Var, current_user_id, session)])
+    hourly_flag, edate = int(weather_meta[0]), pd.Timestamp(weather_meta[1])
+    input_cache.get_or_create(
+        cache_key("sol", fingerprints['soil'], fingerprints['solute'], fingerprints['dispersivity']),
+        field_path, {"sol": "NitrogenDefault.sol"},
+        lambda: WriteSoluteFile(lsoilname, field_path, inputs, session, current_user_id))
+    input_cache.get_or_create(cache_key("gas", fingerprints['gas']), field_path,
+                              {"gas": "GasID.gas"}, lambda: WriteGasFile(field_path, session))
     hourlyFlag = 1
     WriteTimeFileData(ltreatmentname, lexperiment, lcrop, lstationtype, hourlyFlag, field_name, field_path, hourly_flag, 0, session)
-    WriteNitData(lsoilname, field_name, field_path, rowSpacing, session, current_user_id)
-    WriteLayerGas(lsoilname, field_name, field_path, rowSpacing, rootWeightPerSlab, session, current_user_id)
-    surfResType = WriteManagement(lcrop, lexperiment, ltreatmentname, field_name, field_path, rowSpacing, session)
-    irrType = irrigationInfo(lcrop, lexperiment, ltreatmentname, session)
+    input_cache.get_or_create(
+        cache_key("nit", fingerprints['soil'], rowSpacing), field_path, {"nit": f"{field_name}.nit"},
+        lambda: WriteNitData(lsoilname, field_name, field_path, rowSpacing, session, current_user_id))
+    input_cache.get_or_create(
+        cache_key("lyr", fingerprints['soil'], fingerprints['gridratio'], rowSpacing, rootWeightPerSlab),
+        field_path, {"lyr": f"{field_name}.lyr"},
+        lambda: WriteLayerGas(lsoilname, field_name, field_path, rowSpacing, rootWeightPerSlab, session, current_user_id))
+    surfResType = WriteManagement(inputs, field_name, field_path, rowSpacing)
+    irrType = irrigationInfo(inputs)
     WriteMulchGeo(field_path, surfResType, session)
-    o_t_exid = getTreatmentID(ltreatmentname, lexperiment, lcrop, session)
-    WriteIrrigation(field_name, field_path, simulation_name, o_t_exid, session)
+    WriteIrrigation(field_name, field_path, simulation_name, inputs, session)
     WriteRunFile(lcrop, lsoilname, field_name, cultivar, field_path, lstationtype)
     src_file = os.path.join(field_path, f"{field_name}.lyr")
     layerdest_file = os.path.join(field_path, f"{field_name}.lyr")
     createsoil_opfile = lsoilname
     grid_name = field_name
-    pp = subprocess.Popen(['mono', createsoilexe, f"{field_name}.lyr", "/GN", grid_name, "/SN", createsoil_opfile], cwd=field_path)
-    
-    while pp.poll() is None:
-        time.sleep(1)
-        runname = os.path.join(field_path, f"Run{field_name}.dat")
-    try:
-        if lcrop == "maize":
-            p = subprocess.Popen([maizsimexe, runname], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
-            file_ext = ["g01", "G03", "G04", "G05", "G07"]
-        elif lcrop == "potato":
-            p = subprocess.Popen([spudsimexe, runname], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
-            file_ext = ["g01", "G03", "G04", "G05", "G07"]
-        elif lcrop == "soybean":
-            p = subprocess.Popen([glycimexe, runname], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
-            file_ext = ["g01", "G03", "G04", "G05", "G07"]
-        elif lcrop == "cotton":
-            p = subprocess.Popen([gossymexe, runname], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
-            file_ext = ["g01", "G03", "G04", "G05", "G07"]
-        else:  # fallow
-            p = subprocess.Popen([maizsimexe, runname], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
-            file_ext = ["G03", "G05", "G07"]
-        for line in iter(p.stdout.readline, b''):
-            if b'Progress' in line:
-                prog = re.findall(r"[-+]?\d*\.\d+|\d+", line.decode())
-                update_status(int(prog[0]), simulation_name, session)
-        (out, err) = p.communicate()
-        if p.returncode == 0:
-            print("twosoil stage completed. %s", str(out))
-            update_status(101, simulation_name, session)
-        else:
-            print("twosoil stage failed. Error =. %s", str(err))
-            delete_pastrunsDB(str(simulation_name), lcrop, session)
 
+    def create_soil_files():
+        soil_run = run_supervised(['mono', createsoilexe, f"{field_name}.lyr", "/GN", grid_name, "/SN", createsoil_opfile],
+                                  cwd=field_path, timeout=settings.CREATESOIL_TIMEOUT_SECONDS)
+        if not soil_run.ok:
+            reason = "timed out" if soil_run.timed_out else soil_run.stderr.decode(errors='replace')
+            logger.error(f"CreateSoilFiles failed for simulation {simulation_name}: {reason}")
+        return soil_run.ok
+
+    # The grid only depends on the layer file, so identical .lyr files reuse
+    # the .grd/.nod/.soi of an earlier run instead of starting mono again.
+    soil_files_ok = grid_cache.get_or_create_outputs(
+        cache_key("grid", file_digest(layerdest_file), grid_name, createsoil_opfile),
+        field_path, create_soil_files)
+    if not soil_files_ok:
+        # The model would run on missing or stale soil files
+        delete_pastrunsDB(str(simulation_name), lcrop, session)
+        shutil.rmtree(field_path, ignore_errors=True)
+        return False
+    runname = os.path.join(field_path, f"Run{field_name}.dat")
+    if lcrop == "maize":
+        modelexe = maizsimexe
+        file_ext = ["g01", "G03", "G04", "G05", "G07"]
+    elif lcrop == "potato":
+        modelexe = spudsimexe
+        file_ext = ["g01", "G03", "G04", "G05", "G07"]
+    elif lcrop == "soybean":
+        modelexe = glycimexe
+        file_ext = ["g01", "G03", "G04", "G05", "G07"]
+    elif lcrop == "cotton":
+        modelexe = gossymexe
+        file_ext = ["g01", "G03", "G04", "G05", "G07"]
+    else:  # fallow
+        modelexe = maizsimexe
+        file_ext = ["G03", "G05", "G07"]
+    try:
+        # Progress lines are throttled to one status write per second or per 1% change
+        model_run = run_supervised([modelexe, runname], timeout=settings.SIMULATION_TIMEOUT_SECONDS,
+                                   memory_limit_mb=settings.SIMULATION_MEMORY_LIMIT_MB,
+                                   on_progress=lambda prog: set_run_status(prog, simulation_name, session))
     except OSError as e:
+        logger.error(f"failed to execute twodsoil program, {e}")
         delete_pastrunsDB(str(simulation_name), lcrop, session)
-        sys.exit("failed to execute twodsoil program, %s", str(e))
-
-    missingRec = ""
-    # Check for NaN on output files
-    for ext in file_ext:
-        g_name2 = os.path.join(field_path, f"{field_name}.{ext}")
-        table_name = f"{ext.lower()}_{lcrop}"
-        print(table_name,"table_name++++++")
-        missingRec += checkNaNInOutputFile(table_name, g_name2)
-
-    if lcrop != "fallow":
-        missingRec += checkNaNInOutputFile(f"plantStress_{lcrop}", os.path.join(field_path, "plantstress.crp"))
-        if lcrop == "potato" or lcrop == "soybean":
-            missingRec += checkNaNInOutputFile(f"nitrogen_{lcrop}", os.path.join(field_path, "nitrogen.crp"))
+        shutil.rmtree(field_path, ignore_errors=True)
+        return False
+    if model_run.ok:
+        logger.info(f"twosoil stage completed in {model_run.elapsed:.1f}s")
+    else:
+        reason = "timed out" if model_run.timed_out else model_run.stderr.decode(errors='replace')
+        logger.error(f"twosoil stage failed. Error = {reason}")
+        delete_pastrunsDB(str(simulation_name), lcrop, session)
+        shutil.rmtree(field_path, ignore_errors=True)
+        return False
 
+    # Each output file is read once: NaN check, geometry and COPY in one transaction
+    outputs = [(f"{ext.lower()}_{lcrop}", os.path.join(field_path, f"{field_name}.{ext}")) for ext in file_ext]
+    plantstress_file = os.path.join(field_path, "plantstress.crp")
+    if lcrop != "fallow" or os.path.exists(plantstress_file):
+        outputs.append((f"plantStress_{lcrop}", plantstress_file))
+    if lcrop == "soybean" or lcrop == "potato":
+        outputs.append((f"nitrogen_{lcrop}", os.path.join(field_path, "nitrogen.crp")))
+    ingested, missingRec = ingestSimulationOutputs(outputs, str(simulation_name), session,
+                                                   grdFile=os.path.join(field_path, f"{field_name}.grd"))
     if missingRec != "":
+        logger.warning(f"Simulation {simulation_name} has NaN values: {missingRec}")
+    if not ingested:
         delete_pastrunsDB(str(simulation_name), lcrop, session)
-    else:
-        for ext in file_ext:
-            g_name = os.path.join(field_path, f"{field_name}.{ext}")
-            g_name2 = os.path.join(field_path, f"{field_name}.{ext}")
-            table_name = f"{ext.lower()}_{lcrop}"
-            # Ingest .grd file and Area from G03 file on the geometry table
-            if ext == 'G03' or ext == 'g03':
-                ingestGeometryFile(os.path.join(field_path, f"{field_name}.grd"), g_name2, str(simulation_name), session)
-            ingestOutputFile(table_name, g_name2, str(simulation_name), session)
-            if remOutputFilesFlag:
-                os.remove(g_name)
-        ingestOutputFile(f"plantStress_{lcrop}", os.path.join(field_path, "plantstress.crp"), str(simulation_name), session)
-        if remOutputFilesFlag:
-            os.remove(os.path.join(field_path, "plantstress.crp"))
-
-        if lcrop == "soybean" or lcrop == "potato":
-            ingestOutputFile(f"nitrogen_{lcrop}", os.path.join(field_path, "nitrogen.crp"), str(simulation_name), session)
-            if remOutputFilesFlag:
-                os.remove(os.path.join(field_path, "nitrogen.crp"))
-    
+        shutil.rmtree(field_path, ignore_errors=True)
+        return False
+    if remOutputFilesFlag:
+        for table_name, g_name in outputs:
+            os.remove(g_name)
+    # Summary views read this row instead of scanning the outputs
+    try:
+        store_simulation_summary(simulation_name, session)
+    except Exception as e:
+        session.rollback()
+        logger.exception(f"Failed to store the summary of simulation {simulation_name}: {e}")
+        delete_pastrunsDB(str(simulation_name), lcrop, session)
+        shutil.rmtree(field_path, ignore_errors=True)
+        return False
+    # Readers cache the outputs of runs at 101, so it is only set once they
+    # are all stored
+    update_status(101, simulation_name, session)
+
     # Remove the simulation folder after completion
-    import shutil
     try:
         shutil.rmtree(field_path)
     except Exception as e:
@@ -745,6 +611,14 @@ async def execute_the_model(
     return StreamingResponse(stream_csv_selected_columns(file_path,simulation_name,session), media_type="text/event-stream")
 
 
+@router.get("/queue")
+def get_queue_status(session: SessionDep, current_user: CurrentUser) -> Any:
+    """
+    Simulation queue depth, running runs and average wait/run times.
+    """
+    return queue_stats(session)
+
+
 # Modify the route to use asyncio.create_task
 @router.post("/seasonRun", response_model=seasonRunResponse)
 def create_soil(
@@ -802,6 +676,122 @@ def create_soil(
         logger.error(f"Error during simulation: {e}")
         raise HTTPException(status_code=500, detail="An error occurred during the simulation process.")
     
+def insert_batch_pastrunsDB(batch_id, site, managementname, weather, stationtype, soilname, startyear, endyear,
+                            waterstress, nitrostress, members, session, userid) -> list:
+    '''
+  Insert all members of a simulation batch in one statement.
+  Input:
+    batch_id
+    site, managementname, weather, stationtype, soilname, startyear, endyear,
+    waterstress, nitrostress - shared by every member, as in update_pastrunsDB
+    members - list of (tempVar, rainVar, CO2Var)
+  Output:
+    list of pastrun ids, in the order of members
+    '''
+    query = text("""
+        INSERT INTO pastruns ("rotationID", "site", "treatment", "weather", "soil", "stationtype", "startyear", "endyear", "odate",
+                              "waterstress", "nitrostress", "tempVar", "rainVar", "CO2Var", "owner_id", "status", "batch_id")
+        SELECT 0, :site, :managementname, :weather, :soilname, :stationtype, :startyear, :endyear, :odate,
+               :waterstress, :nitrostress, m.temp, m.rain, m.co2, :userid, 1, :batch_id
+        FROM unnest(CAST(:temp AS integer[]), CAST(:rain AS integer[]), CAST(:co2 AS integer[]))
+             WITH ORDINALITY AS m(temp, rain, co2, n)
+        ORDER BY m.n
+        RETURNING "id"
+    """)
+    result = session.execute(query, {
+        'site': site, 'managementname': managementname, 'weather': weather, 'soilname': soilname,
+        'stationtype': stationtype, 'startyear': int(startyear), 'endyear': int(endyear),
+        'odate': str(int(datetime.now().timestamp())), 'waterstress': str(waterstress),
+        'nitrostress': str(nitrostress), 'userid': userid, 'batch_id': batch_id,
+        'temp': [m[0] for m in members], 'rain': [m[1] for m in members], 'co2': [m[2] for m in members]})
+    return sorted(row[0] for row in result.fetchall())
+
+
+def sweep_values(value, low, high, name) -> list:
+    '''
+    Values of one sweep dimension. A scalar is a one-value dimension; for
+    CO2 "None" (or 0) means the CO2 of the weather file.
+    '''
+    values = value if isinstance(value, list) else [value]
+    result = []
+    for v in values:
+        v = 0 if v in (None, "None", "") else int(float(v))
+        if name == "co2Variance" and v == 0:
+            result.append(0)
+            continue
+        if v < low or v > high:
+            raise HTTPException(status_code=400, detail=f"{name} value {v} is outside {low}..{high}.")
+        result.append(v)
+    return sorted(set(result))
+
+
+@router.post("/seasonBatch")
+def create_season_batch(
+    *, payload: dict, session: SessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Create and queue a sensitivity sweep. Takes the seasonRun payload where
+    tempVariance, rainVariance and co2Variance of a row may be lists; every
+    combination becomes one pastruns member of the batch. Members share their
+    soil, grid, cultivar and gas input files through the input caches and are
+    run by the simulation workers on all cores.
+    """
+    site = payload["site"]
+    weather = payload["weather"]
+    soil = payload["soil"]
+    station = payload["station"]
+    grids = []
+    for row in payload["rows"]:
+        temps = sweep_values(row.get("tempVariance", 0), -10, 10, "tempVariance")
+        rains = sweep_values(row.get("rainVariance", 0), -100, 100, "rainVariance")
+        co2s = sweep_values(row.get("co2Variance", "None"), 280, 1000, "co2Variance")
+        grids.append((row, [(t, r, c) for t in temps for r in rains for c in co2s]))
+    size = sum(len(members) for row, members in grids)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="The parameter grid is empty.")
+    if size > settings.SIMULATION_BATCH_MAX_MEMBERS:
+        raise HTTPException(status_code=400,
+                            detail=f"The parameter grid has {size} members, the limit is {settings.SIMULATION_BATCH_MAX_MEMBERS}.")
+    try:
+        batch = SimulationBatch(owner_id=current_user.id, created_at=datetime.now(), members=size,
+                                parameters=json.dumps(payload))
+        session.add(batch)
+        session.flush()
+        memberList = []
+        for row, members in grids:
+            waterStressFlag = 0 if row["waterStress"] == "Yes" else 1
+            nitroStressFlag = 0 if row["nitrogenStress"] == "Yes" else 1
+            ids = insert_batch_pastrunsDB(batch.id, site, f"{row['crop']}/{row['experiment']}", station, weather, soil,
+                                          row["startDate"], row["endDate"], waterStressFlag, nitroStressFlag,
+                                          members, session, current_user.id)
+            # Members only differ in the climate variations, check the treatment once
+            error = check_simulation_inputs(session.get(Pastrun, ids[0]), session, current_user.id)
+            if error is not None:
+                session.rollback()
+                return error
+            memberList.extend(ids)
+        session.commit()
+        batch_id = batch.id
+        queued = enqueue_batch(batch_id, session)
+        return {"id": batch_id, "members": memberList, "message": f"{queued} simulations queued."}
+    except HTTPException:
+        raise
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error creating simulation batch: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while creating the simulation batch.")
+
+
+@router.get("/seasonBatch/{batch_id}")
+def get_season_batch(batch_id: int, session: SessionDep, current_user: CurrentUser) -> Any:
+    """
+    Aggregated progress of a simulation batch.
+    """
+    batch = session.get(SimulationBatch, batch_id)
+    if not batch or batch.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Simulation batch not found.")
+    return {"id": batch_id, **batch_progress(batch_id, session)}
+
 # @router.get("/seasonRun/{simulation_name}", status_code=202)
 # async def get_simulation_results(background_tasks: BackgroundTasks, simulation_name: int, session: SessionDep, current_user: CurrentUser) -> Any:
 #     """
@@ -817,9 +807,78 @@ def create_soil(
 #         raise HTTPException(status_code=500, detail="An error occurred while fetching simulation results.")
     
 
+def check_simulation_inputs(simulation: Pastrun, session: Any, current_user_id) -> Any:
+    """
+    Verify that a simulation can be run: weather data exists, the treatment has
+    a cultivar and the key operation dates are in order.
+    Returns None if the inputs are fine, otherwise the error response.
+    """
+    # Parse treatment info
+    treatment = simulation.treatment
+    weather_info= simulation.weather
+    statoiptiontype = simulation.stationtype
+    statement = select(WeatherMeta).filter(
+    WeatherMeta.stationtype == weather_info,
+    WeatherMeta.owner_id == current_user_id
+    )
+    weatherMetadata = session.exec(statement).first()
+    weather_id=str(weatherMetadata.id)
+    # weather_station_stats is kept current by the weather ingest
+    if not station_has_weather(weather_id, statoiptiontype, session):
+        return {"id": -1, "message": "Weather data not found for the specified station type."}
+    # You may need to adjust how you get experiment/crop/treatment name
+    crop = treatment.split('/')[0]
+    experiment = treatment.split('/')[1] if '/' in treatment else None
+    treatment_name = treatment.split('/')[2] if treatment.count('/') >= 2 else None
+
+    # Fetch all operations for this treatment
+    # You may need to adjust this helper to your schema
+    exid = read_experimentDB_id(crop, experiment, session)
+    tid = read_treatmentDB_id(exid, treatment_name, session)
+    operationList = read_operationsDB_id(tid, session)  # [(id, name, date, ...), ...]
+    cutlivar_simStart_check = is_all_cultivar_zero(tid, session)
+
+    if not cutlivar_simStart_check:
+        return {"id": -1, "message": "Please add cultivar for this experiment. Management-> experiment->treatment -> Simulation start -> cultivar."}
+    # Only check these key operations
+    key_ops = ['Simulation Start', 'Sowing', 'Harvest', 'Simulation End']
+    op_dates = []
+    for op_name in key_ops:
+        # Find the first operation with this name
+        op = next((o for o in operationList if o[1] == op_name), None)
+        if op is not None and op[2]:
+            try:
+                op_date = pd.to_datetime(op[2])
+            except Exception:
+                return {"error": f"Operation '{op_name}' has invalid date: {op[2]}"}
+            op_dates.append((op_name, op_date))
+        else:
+            op_dates.append((op_name, None))
+
+    # Check chronological order
+    wrong_ops = []
+    last_date = None
+    for idx, (op_name, op_date) in enumerate(op_dates):
+        if op_date is None:
+            continue  # skip missing ops
+        if last_date and op_date < last_date:
+            
+            # Report both the current and previous operation as problematic
+            wrong_ops.append(f"{op_dates[idx-1][0]} ({op_dates[idx-1][1].strftime('%m/%d/%Y') if op_dates[idx-1][1] else 'N/A'}) before {op_name} ({op_date.strftime('%m/%d/%Y')})")
+        last_date = op_date
+    
+    if wrong_ops:
+        msg = (
+            "The following operations are out of order: "
+            + "; ".join(wrong_ops)
+            + ". Please ensure Simulation Start < Sowing < Harvest < Simulation End."
+        )
+        return {"id":-1,"message": msg}
+    return None
+
+
 @router.get("/seasonRun/{simulation_name}", status_code=202)
 async def get_simulation_results(
-    background_tasks: BackgroundTasks,
     simulation_name: int,
     session: SessionDep,
     current_user: CurrentUser
@@ -833,83 +892,14 @@ async def get_simulation_results(
         if not simulation:
             raise HTTPException(status_code=404, detail="Simulation not found.")
 
-        # Fetch all operations for this simulation
-          # Parse treatment info
-        treatment = simulation.treatment
-        weather_info= simulation.weather
-        statoiptiontype = simulation.stationtype
-        statement = select(WeatherMeta).filter(
-        WeatherMeta.stationtype == weather_info,
-        WeatherMeta.owner_id == current_user.id
-        )
-        weatherMetadata = session.exec(statement).first()
-        weather_id=str(weatherMetadata.id)
-        query = text(
-            """
-            select jday, date from weather_data where 
-                stationtype= :stationtype and weather_id= :weather_id order by date
-            """
-        )
-
-        # Execute the query with provided parameters
-        result = session.execute(query, {'stationtype': statoiptiontype, 'weather_id': weather_id})
-
-        # Fetch and return the result
-        row = result.fetchone()
-        if not row:
-            return {"id": -1, "message": "Weather data not found for the specified station type."}
-        # You may need to adjust how you get experiment/crop/treatment name
-        crop = treatment.split('/')[0]
-        experiment = treatment.split('/')[1] if '/' in treatment else None
-        treatment_name = treatment.split('/')[2] if treatment.count('/') >= 2 else None
-
-        # Fetch all operations for this treatment
-        # You may need to adjust this helper to your schema
-        exid = read_experimentDB_id(crop, experiment, session)
-        tid = read_treatmentDB_id(exid, treatment_name, session)
-        operationList = read_operationsDB_id(tid, session)  # [(id, name, date, ...), ...]
-        cutlivar_simStart_check = is_all_cultivar_zero(tid, session)
-
-        if not cutlivar_simStart_check:
-            return {"id": -1, "message": "Please add cultivar for this experiment. Management-> experiment->treatment -> Simulation start -> cultivar."}
-        # Only check these key operations
-        key_ops = ['Simulation Start', 'Sowing', 'Harvest', 'Simulation End']
-        op_dates = []
-        for op_name in key_ops:
-            # Find the first operation with this name
-            op = next((o for o in operationList if o[1] == op_name), None)
-            if op is not None and op[2]:
-                try:
-                    op_date = pd.to_datetime(op[2])
-                except Exception:
-                    return {"error": f"Operation '{op_name}' has invalid date: {op[2]}"}
-                op_dates.append((op_name, op_date))
-            else:
-                op_dates.append((op_name, None))
-
-        # Check chronological order
-        wrong_ops = []
-        last_date = None
-        for idx, (op_name, op_date) in enumerate(op_dates):
-            if op_date is None:
-                continue  # skip missing ops
-            if last_date and op_date < last_date:
-                
-                # Report both the current and previous operation as problematic
-                wrong_ops.append(f"{op_dates[idx-1][0]} ({op_dates[idx-1][1].strftime('%m/%d/%Y') if op_dates[idx-1][1] else 'N/A'}) before {op_name} ({op_date.strftime('%m/%d/%Y')})")
-            last_date = op_date
-        
-        if wrong_ops:
-            msg = (
-                "The following operations are out of order: "
-                + "; ".join(wrong_ops)
-                + ". Please ensure Simulation Start < Sowing < Harvest < Simulation End."
-            )
-            return {"id":-1,"message": msg}
+        error = check_simulation_inputs(simulation, session, current_user.id)
+        if error is not None:
+            return error
 
-        # If all good, start the simulation
-        background_tasks.add_task(prepare_and_execute, simulation_name, session, current_user.id)
-        return {"id": simulation_name, "message": "Simulation started successfully."}
+        # If all good, hand the run to the simulation workers
+        if not enqueue_simulation(simulation_name, session):
+            return {"id": simulation_name, "message": "Simulation is already queued or running."}
+        return {"id": simulation_name, "message": "Simulation queued successfully."}
     except Exception as e:
         logger.error(f"Error fetching simulation results: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while fetching simulation results.")
\ No newline at end of file
@@ -1,13 +1,33 @@
+import logging
+from datetime import datetime
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
+import numpy as np
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from sqlmodel import func, select
+from sqlalchemy.sql import text
 
 from app.api.deps import CurrentUser, SessionDep
-from app.models import PastrunsPublic, Pastrun, Message
-from app.dbsupport_helper import read_experimentDB_id, read_treatmentDB_id, getCottonAgronomicData,read_operationsDB_id, readOpDetails, getMaizeDateByDev, getMaizeAgronomicData,getMaturityDate,getSoybeanDevDate,getPotatoAgronomicData,getSoybeanAgronomicData 
+from app.core.config import settings
+from app.models import PastrunsPublic, Pastrun, Message, RunComparison
+from app.dbsupport_helper import read_output_columns
+from app.outputArchive_helper import read_archive_table, table_to_ipc
+from app.downsample_helper import downsample, downsample_methods, series_cache
+from app.simulationSummary_helper import read_simulation_summary, store_simulation_summary, summary_columns
+from app.soilArrays_helper import node_outputs
+from app.soilGrid_helper import read_grid_nodes, read_simulation_grid
+from app.soilRaster_helper import raster_cache, read_snapshot_raster
+from app.soilSnapshot_helper import node_coordinates, read_snapshot, read_snapshot_variables, read_timesteps
+from app.runComparison_helper import biomass_columns, daily_statistics, ensure_summaries, run_deltas, select_comparison_runs, summary_statistics
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Output files kept in the Parquet archive, by table prefix
+archived_outputs = ["g01", "g03", "g04", "g05", "g07", "plantStress", "nitrogen"]
+# Outputs with one row per timestep; g03/g04/g07 have one per node and are
+# served by the soil2d endpoints
+series_outputs = ["g01", "g05", "plantStress", "nitrogen"]
 
 @router.get("/", response_model=PastrunsPublic)
 def read_pastrun(
@@ -33,102 +53,91 @@ def read_pastrun(
 def read_exp_data(
     session: SessionDep, simid: int, current_user: CurrentUser,
 ) -> Any:
-    totalNAppl = 0
-    totalirrAppl = 0
-    statement = (
-        select(Pastrun.treatment)
-        .where(Pastrun.id == simid)
-    )
-    pastruns = session.exec(statement).all()
-    split_parts = pastruns[0].split('/')
-    cropname = split_parts[0]
-    FertilizerDateList = []
-    PGRDateList = []
-    IrrigationDateList = []
-    exid = read_experimentDB_id(cropname, split_parts[1], session)
-    tid = read_treatmentDB_id(exid, split_parts[2], session)
-    operationList = read_operationsDB_id(tid, session)
-    for ii, jj in enumerate(operationList):
-        if jj[1] == 'Simulation Start':
-            BeginDate = jj[2]  # month/day/year
-
-            initCond = readOpDetails(jj[0], jj[1], session)
-            plantDensity = initCond[0][3]
-            eomult = initCond[0][8]
-            rowSP = initCond[0][9]
-            cultivar = initCond[0][10]
-
-        if jj[1] == 'Sowing':
-            SowingDate = jj[2]
-
-        if jj[1] == 'Tillage':
-            TillageDate = jj[2]
-
-        if jj[1] == "Fertilizer":
-            FertilizerDateList.append(jj[2])
-            fertInfo = readOpDetails(jj[0], jj[1], session)
-            for j in range(len(fertInfo)):
-                if fertInfo[j][5] == "Nitrogen (N)":
-                    totalNAppl = totalNAppl + fertInfo[j][6]
-
-        if jj[1] in "Plant Growth Regulator":
-            PGRDateList.append(jj[2])
-
-        if jj[1] == 'Emergence':
-            EmergenceDate = jj[2]
-
-        if jj[1] == 'Harvest':
-            HarvestDate = jj[2]  # month/day/year
-
-        if jj[1] == "Irrigation":
-            IrrigationDateList.append(jj[2])
-            irrInfo = readOpDetails(jj[0], jj[1], session)
-            for j in range(len(irrInfo)):
-                if irrInfo[j][3] == "Sprinkler":
-                    totalirrAppl = totalirrAppl + irrInfo[j][4]
-            #   print(totalirrAppl)
-
-    FertilizerDate = ""
-    if len(FertilizerDateList) >= 1:
-        FertilizerDate = ", "
-        FertilizerDate = FertilizerDate.join(FertilizerDateList)
-
-    IrrigationDate = ""
-    if len(IrrigationDateList) >= 1:
-        IrrigationDate = ", "
-        IrrigationDate = IrrigationDate.join(IrrigationDateList)
-
-    PGRDate = ""
-    if len(PGRDateList) >= 1:
-        PGRDate = ", "
-        PGRDate = PGRDate.join(PGRDateList)
+    item = session.get(Pastrun, simid)
+    if not item or (not current_user.is_superuser and item.owner_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    # Stored at ingest; finished runs ingested before the summary table get
+    # theirs now
+    summary = read_simulation_summary(simid, session)
+    if summary is None:
+        if not run_finished(item):
+            raise HTTPException(status_code=409, detail="Simulation has not finished")
+        try:
+            summary = store_simulation_summary(simid, session)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to store the summary of simulation {simid}: {e}")
+            raise HTTPException(status_code=409, detail="Simulation has no outputs to summarize")
     result_dict = {}
-    if cropname == "maize":
-        # EmergenceDate = getMaizeDateByDev(simid,"Emerged")
-        # TasseledDate = getMaizeDateByDev(simid,"Tasseled")
-        # SilkedDate = getMaizeDateByDev(simid,"Silked")
-        MaturityDate = getMaizeDateByDev(simid, "Matured", session)
-
-        if MaturityDate != "N/A":
-            agroDataTuple = getMaizeAgronomicData(simid, MaturityDate, session)
-        else:
-            agroDataTuple = getMaizeAgronomicData(simid, HarvestDate, session)
-
-    elif cropname=="potato":
-        MaturityDate = getMaturityDate(simid, session)
-        agroDataTuple = getPotatoAgronomicData(simid, HarvestDate, session)
-
-    elif cropname == "soybean":
-        MaturityDate= getSoybeanDevDate(simid,7,session)
-        agroDataTuple = getSoybeanAgronomicData(simid, HarvestDate,session)
-    elif cropname == "cotton":
-        agroDataTuple = getCottonAgronomicData(simid,session)
-    # Ensure all values are float for safe multiplication
-    result_dict['Yield'] = round(float(agroDataTuple[0]) * float(plantDensity) * 10, 2)
-    result_dict['Total_biomass'] = round(float(agroDataTuple[1]) * float(plantDensity) * 10, 2)
-    result_dict['Nitrogen_Uptake'] = round(float(agroDataTuple[2]) * float(plantDensity) * 10, 2)
+    result_dict['Yield'] = summary['yield']
+    result_dict['Total_biomass'] = summary['total_biomass']
+    result_dict['Nitrogen_Uptake'] = summary['nitrogen_uptake']
     return result_dict
 
+@router.get("/summary")
+def read_summaries(
+    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+) -> Any:
+    """
+    Stored summaries of the user's completed runs, newest first.
+    """
+    columns = ", ".join(f"s.{col}" for col in summary_columns)
+    query = text(f"""
+        SELECT {columns}, p.treatment, p.site FROM simulation_summary s
+          JOIN pastruns p ON p.id = s.sim_id
+         WHERE p.owner_id = :owner
+         ORDER BY s.sim_id DESC OFFSET :skip LIMIT :limit
+    """)
+    rows = session.execute(query, {'owner': current_user.id, 'skip': skip, 'limit': limit}).fetchall()
+    return {"data": [dict(row._mapping) for row in rows]}
+
+@router.post("/compare")
+def compare_runs(session: SessionDep, current_user: CurrentUser, request: RunComparison) -> Any:
+    """
+    Aggregates across a set of completed runs (explicit ids and/or a pastruns
+    filter such as a batch): per-run summaries with deltas to the baseline
+    run, the distribution of yield, biomass and N uptake, and per crop the
+    daily mean and spread of the requested g01 variables.
+    """
+    if any(p < 0 or p > 100 for p in request.percentiles):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+    if request.baseline is not None:
+        item = session.get(Pastrun, request.baseline)
+        if not item or item.status != 101:
+            raise HTTPException(status_code=404, detail="Baseline simulation not found")
+        if not current_user.is_superuser and (item.owner_id != current_user.id):
+            raise HTTPException(status_code=400, detail="Not enough permissions")
+    runs = select_comparison_runs(request, current_user.id, session)
+    if not runs:
+        raise HTTPException(status_code=404, detail="No completed simulations match the selection")
+    if len(runs) > settings.COMPARE_MAX_RUNS:
+        raise HTTPException(status_code=400,
+                            detail=f"{len(runs)} simulations match, the limit is {settings.COMPARE_MAX_RUNS}")
+    ids = [run[0] for run in runs]
+    ensure_summaries(ids + ([request.baseline] if request.baseline is not None else []), session)
+
+    summaries = {row["sim_id"]: row for row in run_deltas(ids, request.baseline, session)}
+    crops = {}
+    runList = []
+    for sim_id, treatment, site, tempVar, rainVar, CO2Var in runs:
+        crops.setdefault(treatment.split('/')[0], []).append(sim_id)
+        runList.append({"id": sim_id, "treatment": treatment, "site": site, "tempVar": tempVar,
+                        "rainVar": rainVar, "CO2Var": CO2Var, **summaries.get(sim_id, {})})
+
+    daily = {}
+    baseline_crop = session.get(Pastrun, request.baseline).treatment.split('/')[0] if request.baseline else None
+    for crop, crop_ids in crops.items():
+        if crop not in biomass_columns:
+            continue
+        stats = daily_statistics(crop, crop_ids, request.variables,
+                                 request.baseline if baseline_crop == crop else None, session)
+        if stats is None:
+            raise HTTPException(status_code=400, detail=f"Unknown variables for g01_{crop}")
+        daily[crop] = stats
+    return {"runs": runList,
+            "summary": summary_statistics(ids, request.percentiles, session),
+            "daily": daily}
+
 @router.delete("/delete/{id}")
 def delete_item(session: SessionDep, current_user: CurrentUser, id: int) -> Message:
     """
@@ -141,4 +150,216 @@ def delete_item(session: SessionDep, current_user: CurrentUser, id: int) -> Mess
         raise HTTPException(status_code=400, detail="Not enough permissions")
     session.delete(item)
     session.commit()
-    return Message(message="Item deleted successfully")
\ No newline at end of file
+    return Message(message="Item deleted successfully")
+
+
+@router.get("/{id}/arrow/{table}")
+def read_output_arrow(
+    session: SessionDep, current_user: CurrentUser, id: int, table: str,
+    columns: list[str] | None = Query(default=None),
+    start: datetime | None = None, end: datetime | None = None,
+) -> Response:
+    """
+    Archived output of a run (table is g01, g03, g04, g05, g07, plantStress or
+    nitrogen) as an Arrow IPC stream, limited to the requested columns and
+    Date_Time window.
+    """
+    item = session.get(Pastrun, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    if table not in archived_outputs:
+        raise HTTPException(status_code=404, detail=f"Unknown output table {table}")
+    cropname = item.treatment.split('/')[0]
+    try:
+        arrow_table = read_archive_table(id, f"{table}_{cropname}", columns, start, end)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {e.args[0]}")
+    if arrow_table is None:
+        raise HTTPException(status_code=404, detail="No archived output for this simulation")
+    return Response(content=table_to_ipc(arrow_table), media_type="application/vnd.apache.arrow.stream")
+
+
+def read_owned_run(id: int, session: SessionDep, current_user: CurrentUser) -> Pastrun:
+    item = session.get(Pastrun, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return item
+
+
+def run_finished(item: Pastrun) -> bool:
+    # The worker sets 101 once the outputs and the summary are stored and
+    # finished_at when it lets go of the run; only then are they final
+    return item.status == 101 and item.finished_at is not None
+
+
+@router.get("/{id}/soil2d/dates")
+def read_soil2d_dates(session: SessionDep, current_user: CurrentUser, id: int, table: str = "g03") -> Any:
+    """
+    Timestamps and variables of a per-node output of a run (table is g03,
+    g04 or g07), to pick the frames of a 2D soil plot.
+    """
+    item = read_owned_run(id, session, current_user)
+    if table not in node_outputs:
+        raise HTTPException(status_code=404, detail=f"Unknown output table {table}")
+    table_name = f"{table}_{item.treatment.split('/')[0]}"
+    stamps = read_timesteps(id, table_name, session)
+    return {"dates": [stamp.strftime('%Y-%m-%d %H:%M:%S') for stamp in stamps],
+            "variables": read_snapshot_variables(id, table_name, session)}
+
+
+@router.get("/{id}/soil2d/nodes")
+def read_soil2d_nodes(
+    session: SessionDep, current_user: CurrentUser, id: int,
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    Grid node coordinates of a run as little-endian float32: X of every node
+    then Y, in node order, the order of the values of /soil2d. A grid never
+    changes, so clients fetch it once and revalidate with its ETag.
+    """
+    read_owned_run(id, session, current_user)
+    grid_id = read_simulation_grid(id, session)
+    etag = f'"grid-{grid_id}"' if grid_id is not None else f'"run-{id}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    nodes = read_grid_nodes(id, session)
+    if nodes.empty:
+        raise HTTPException(status_code=404, detail="No grid for this simulation")
+    coords = node_coordinates(nodes)
+    headers["X-Node-Count"] = str(len(coords) // 2)
+    return Response(content=coords.tobytes(), media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/{id}/soil2d")
+def read_soil2d_snapshot(
+    session: SessionDep, current_user: CurrentUser, id: int, variable: str, date: datetime,
+    table: str = "g03",
+) -> Response:
+    """
+    Values of one variable of a per-node output at every grid node at one
+    timestep, as little-endian float32 in node order (NaN where a node has
+    no value).
+    """
+    item = read_owned_run(id, session, current_user)
+    if table not in node_outputs:
+        raise HTTPException(status_code=404, detail=f"Unknown output table {table}")
+    table_name = f"{table}_{item.treatment.split('/')[0]}"
+    try:
+        values = read_snapshot(id, table_name, variable, date, session)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown variable {variable}")
+    if values is None:
+        raise HTTPException(status_code=404, detail="No output at this date")
+    headers = {"X-Node-Count": str(len(values))}
+    # Outputs of a finished run do not change
+    if run_finished(item):
+        headers["Cache-Control"] = "private, max-age=86400"
+    return Response(content=values.tobytes(), media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/{id}/soil2d/raster")
+def read_soil2d_raster(
+    session: SessionDep, current_user: CurrentUser, id: int, variable: str, date: datetime,
+    table: str = "g03",
+) -> Response:
+    """
+    One variable of a per-node output at one timestep interpolated on the
+    grid mesh onto a fixed pixel grid, as little-endian float32 rows of
+    X-Raster-Width pixels, the first row at the smallest Y (NaN outside the
+    mesh). X-Raster-Extent gives xmin,xmax,ymin,ymax.
+    """
+    item = read_owned_run(id, session, current_user)
+    if table not in node_outputs:
+        raise HTTPException(status_code=404, detail=f"Unknown output table {table}")
+    table_name = f"{table}_{item.treatment.split('/')[0]}"
+
+    def build() -> Any:
+        rendered = read_snapshot_raster(id, table_name, variable, date, session)
+        if rendered is None:
+            return None
+        raster, weights = rendered
+        return {"content": raster.tobytes(),
+                "headers": {"X-Raster-Width": str(weights.width), "X-Raster-Height": str(weights.height),
+                            "X-Raster-Extent": ",".join(f"{value:g}" for value in weights.extent)}}
+
+    try:
+        # Outputs of a run still being ingested can change
+        raster = build() if not run_finished(item) else \
+            raster_cache.get_or_create((id, table_name, variable, date), build)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown variable {variable}")
+    if raster is None:
+        raise HTTPException(status_code=404, detail="No output at this date")
+    headers = dict(raster["headers"])
+    if run_finished(item):
+        headers["Cache-Control"] = "private, max-age=86400"
+    return Response(content=raster["content"], media_type="application/octet-stream", headers=headers)
+
+
+def read_series_columns(id: int, table_name: str, variables: list, start, end, session: SessionDep) -> Any:
+    '''
+    Columns of a run's output, from the Parquet archive when there is one and
+    from the cropOutput table otherwise.
+    Output:
+        (datetime64 array, {variable: float array}); raises 400 for unknown variables
+    '''
+    try:
+        arrow_table = read_archive_table(id, table_name, variables, start, end)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown variables: {e.args[0]}")
+    if arrow_table is not None:
+        stamps = arrow_table.column("Date_Time").to_numpy()
+        return stamps, {var: arrow_table.column(var).to_numpy(zero_copy_only=False).astype(float)
+                        for var in variables}
+    data = read_output_columns(table_name, id, variables, start, end, session)
+    if data is None:
+        raise HTTPException(status_code=400, detail=f"Unknown variables for {table_name}")
+    return data
+
+
+@router.get("/{id}/series")
+def read_output_series(
+    session: SessionDep, current_user: CurrentUser, id: int,
+    variables: list[str] = Query(...), table: str = "g01",
+    start: datetime | None = None, end: datetime | None = None,
+    points: int = Query(default=500, ge=3), method: str = "lttb",
+) -> Any:
+    """
+    Plot series of a run downsampled to about `points` samples per variable
+    with LTTB (method=lttb) or per-bucket min/max (method=minmax), so the
+    payload does not depend on the model's output frequency.
+    """
+    item = session.get(Pastrun, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    if table not in archived_outputs:
+        raise HTTPException(status_code=404, detail=f"Unknown output table {table}")
+    if table not in series_outputs:
+        raise HTTPException(status_code=400, detail=f"Output table {table} has one row per node, it is not a time series")
+    if method not in downsample_methods:
+        raise HTTPException(status_code=400, detail=f"Unknown method {method}")
+    points = min(points, settings.SERIES_MAX_POINTS)
+    table_name = f"{table}_{item.treatment.split('/')[0]}"
+
+    def build() -> dict:
+        stamps, columns = read_series_columns(id, table_name, variables, start, end, session)
+        series = {}
+        for var in variables:
+            var_stamps, values = downsample(stamps, columns[var], points, method)
+            series[var] = {"Date_Time": np.datetime_as_string(var_stamps, unit='s').tolist(),
+                           "values": values.tolist()}
+        return series
+
+    # Outputs of a run still being ingested can change
+    if not run_finished(item):
+        return build()
+    key = (id, table_name, tuple(variables), points, method, start, end)
+    return series_cache.get_or_create(key, build,
+                                      cacheable=lambda series: any(s["values"] for s in series.values()))
@@ -3,11 +3,9 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Query, Response, status
 from sqlmodel import func, select
 from sqlalchemy import delete
-import requests
 import json
-import xmltodict
-import pandas as pd
 from app.api.deps import SessionDep, CurrentUser
+from app.nrcsSoil_helper import lookup_horizons, soil_layers
 from app.models import Soil, SoilCreate, SoilsPublic, SoilUpdate, SoilPublic, Message, Site, SoilLongPublic, SoilLongCreate, SoilLong, SoilsLongPublic, SoilLongUpdate
 import datetime
 from pydantic import BaseModel
@@ -143,119 +141,20 @@ def delete_soil(session: SessionDep, current_user: CurrentUser, id: int) -> Mess
 @router.get("/NRCS/{siteId}", response_model=Dict[str, List[Dict[str, Any]]])
 def fetch_soil_profile(session: SessionDep, siteId: int) -> Any:
     """
-    Fetch Soil profile from NRCS using site ID
+    Fetch Soil profile from NRCS using site ID. Lookups are cached per map
+    unit and per rounded lon/lat tile (see nrcsSoil_helper).
     """
     statement = select(Site).where(Site.id == siteId)
     site = session.exec(statement).first()
     
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
-    
-    lonLat = f"{site.rlon} {site.rlat}"
-    url = "https://SDMDataAccess.nrcs.usda.gov/Tabular/SDMTabularService.asmx"
-    headers = {'content-type': 'text/xml'}
-    body = f"""<?xml version="1.0" encoding="utf-8"?>
-            <soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" xmlns:sdm="http://SDMDataAccess.nrcs.usda.gov/Tabular/SDMTabularService.asmx">
-            <soap:Header/>
-            <soap:Body>
-                <sdm:RunQuery>
-                    <sdm:Query>SELECT co.cokey as cokey, ch.chkey as chkey, comppct_r as prcent, slope_r, slope_h as slope, hzname, hzdepb_r as depth, 
-                                awc_r as awc, claytotal_r as clay, silttotal_r as silt, sandtotal_r as sand, om_r as OM, dbthirdbar_r as dbthirdbar, 
-                                wthirdbar_r/100 as th33, (dbthirdbar_r-(wthirdbar_r/100)) as bd FROM sacatalog sc
-                                FULL OUTER JOIN legend lg  ON sc.areasymbol=lg.areasymbol
-                                FULL OUTER JOIN mapunit mu ON lg.lkey=mu.lkey
-                                FULL OUTER JOIN component co ON mu.mukey=co.mukey
-                                FULL OUTER JOIN chorizon ch ON co.cokey=ch.cokey
-                                FULL OUTER JOIN chtexturegrp ctg ON ch.chkey=ctg.chkey
-                                FULL OUTER JOIN chtexture ct ON ctg.chtgkey=ct.chtgkey
-                                FULL OUTER JOIN copmgrp pmg ON co.cokey=pmg.cokey
-                                FULL OUTER JOIN corestrictions rt ON co.cokey=rt.cokey
-                                WHERE mu.mukey IN (SELECT * from SDA_Get_Mukey_from_intersection_with_WktWgs84('point({lonLat})')) order by co.cokey, ch.chkey, prcent, depth
-                    </sdm:Query>
-                </sdm:RunQuery>
-            </soap:Body>
-            </soap:Envelope>"""
-
-    try:
-        response = requests.post(url, data=body, headers=headers, timeout=30)
-        response.raise_for_status()  # Raise an exception for bad responses
-        
-        # Put query results in dictionary format
-        my_dict = xmltodict.parse(response.content)
-        
-        try:
-            soil_df = pd.DataFrame.from_dict(my_dict['soap:Envelope']['soap:Body']['RunQueryResponse']['RunQueryResult']['diffgr:diffgram']['NewDataSet']['Table'])
-
-            # Drop columns where all values are None or NaN
-            soil_df = soil_df.dropna(axis=1, how='all')
-            soil_df = soil_df[soil_df.chkey.notnull()]
-
-            # Drop unecessary columns
-            soil_df = soil_df.drop(['@diffgr:id', '@msdata:rowOrder', '@diffgr:hasChanges'], axis=1)
-
-            # Drop duplicate rows
-            soil_df = soil_df.drop_duplicates()
-
-            # Convert prcent and depth column from object to float
-            soil_df['prcent'] = soil_df['prcent'].astype(float)
-            soil_df['depth'] = soil_df['depth'].astype(float)
-
-            # Select rows with max prcent
-            soil_df = soil_df[soil_df.prcent == soil_df.prcent.max()]
-
-            # Sort rows by depth
-            soil_df = soil_df.sort_values(by=['depth'])
-
-            # Check for rows with NaN values
-            soil_df_with_NaN = soil_df[soil_df.isnull().any(axis=1)]
-            depth = ", ".join(soil_df_with_NaN["depth"].astype(str))
-            if len(depth) > 0:
-                soil_df = soil_df.dropna()
-                
-            new_dict_list = []
-            for index, row in soil_df.iterrows():
-                new_dict = {
-                    "Bottom_depth": row['depth'],
-                    "OM_pct": row['OM'],
-                    "NO3": 25,
-                    "NH4": 4,
-                    "HnNew": -200,
-                    "initType": "m",
-                    "Tmpr": 25,
-                    "Sand": row['sand'],
-                    "Silt": row['silt'],
-                    "Clay": row['clay'],
-                    "BD": row['bd'],
-                    "TH33": row['th33'],
-                    "TH1500": 0.1,
-                    "kl": -0.035,
-                    "kh": 0.00007,
-                    "km": 0.07,
-                    "kn": 0.2,
-                    "kd": 0.00001,
-                    "fe": 0.6,
-                    "fh": 0.2,
-                    "r0": 10.0,
-                    "rL": 50.0,
-                    "rm": 10.0,
-                    "fa": 0.1,
-                    "nq": 8,
-                    "cs": 0.00001,
-                    "CO2": 400,
-                    "O2": 206000,
-                    "N2O": 0,
-                }
-                new_dict_list.append(new_dict)
-                
-        except (KeyError, ValueError, TypeError) as e:
-            # If there's an error processing the data, return default values
-            new_dict_list = create_default_soil_data()
-            
-    except requests.RequestException as e:
-        # If the request fails, return default values
-        new_dict_list = create_default_soil_data()
 
-    return {"data": new_dict_list}
+    horizons = lookup_horizons(site.rlon, site.rlat, session)[0]
+    if horizons is None:
+        # No NRCS data for the site (or SDM unreachable with nothing cached)
+        return {"data": create_default_soil_data()}
+    return {"data": soil_layers(horizons)}
 
 
 def create_default_soil_data() -> List[Dict[str, Any]]:
@@ -3,15 +3,17 @@ import requests
 import pandas as pd
 import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, UploadFile
 from sqlmodel import func, select
-from io import BytesIO
 import ssl
 ssl._create_default_https_context = ssl._create_unverified_context
 from app.api.deps import SessionDep, CurrentUser
 from app.models import WeatherDatasPublic, WeatherDataPublic, WeatherMeta, WeatherMetasPublic, WeatherMetaPublic, WeatherCreate, WeatherMetaBase, WeatherMetaCreate, WeatherUpdate, Message, WeatherMetaUpdate, WeatherData, SitesPublic, Site, Treatment, Experiment, Operation
-from dateutil import parser
-from aiohttp import ClientSession
+from app.weather_helper import bump_weather_version, weather_cache
+from app.weatherDownload_helper import download_range, download_station_weather, missing_windows, read_station_coverage
+from app.weatherStats_helper import delete_station_stats, read_station_stats
+from app.weatherIngest_helper import copy_weather_rows, ingest_columns, ingest_weather_csv, upload_chunk_rows, upload_required, validate_weather_frame
+from app.core.config import settings
 
 # Create an instance of the FastAPI class
 router = APIRouter()
@@ -86,8 +88,11 @@ def delete_station(session: SessionDep, current_user: CurrentUser, id: int) -> M
         raise HTTPException(status_code=400, detail="Not enough permissions")
     # Delete all weather data with this weather_id
     session.query(WeatherData).filter(WeatherData.weather_id == id).delete()
+    delete_station_stats(id, session)
+    stationtype = station.stationtype
     session.delete(station)
     session.commit()
+    weather_cache.invalidate(stationtype)
     return Message(message="station and related weather data deleted successfully")
 
 @router.put("/{id}", response_model=WeatherMetaPublic)
@@ -121,69 +126,66 @@ def read_station_data(
         WeatherMeta.stationtype == stationType,
         WeatherMeta.owner_id == current_user.id
     ).first()
-    print(query)
-    weather_data_query = session.query(WeatherData).filter(WeatherData.weather_id == query.id)
-    df_weatherdata = pd.read_sql(weather_data_query.statement, session.bind)
-    
+    stats = read_station_stats(query.id, session)
+
     weatherSummary = stationType + " Data Availability Report"
-    if df_weatherdata.empty:
+    if stats is None:
         weatherSummary += "<br>No data available.<br>"
         return {"summary": weatherSummary, "data": None}
-
-    df_weatherdata['date'] = pd.to_datetime(df_weatherdata['date']).dt.date
-    df_weatherdata = df_weatherdata.sort_values(by='date')
-    nan_value = float("NaN")
-    df_weatherdata.replace("", nan_value, inplace=True)
-    df_weatherdata = df_weatherdata.groupby('weather_id').agg({
-        'date': ['min', 'max'], 
-        'srad': ['min', 'max'], 
-        'wind': ['min', 'max'],
-        'rh': ['min', 'max'], 
-        'rain': ['min', 'max'], 
-        'tmax': ['min', 'max'],
-        'tmin': ['min', 'max'], 
-        'temperature': ['min', 'max']
-    }).reset_index()
-    df_weatherdata.columns = ['_'.join(col).strip() if col[1] else col[0] for col in df_weatherdata.columns.values]
-    # return WeatherDatasPublic(data=df_weatherdata.iloc[0].to_dict(), count=1)
-    return {"summary": weatherSummary, "data": df_weatherdata.iloc[0].to_dict()}
+    return {"summary": weatherSummary, "data": stats}
 
 @router.post("/data", response_model=List[WeatherDataPublic])
 def create_station_table(
     *,
     session: SessionDep,
     current_user: CurrentUser,
+    response: Response,
     stations_in: List[WeatherCreate]
 ) -> Any:
     """
-    Create new stations.
+    Create new stations. Invalid rows are skipped; the response lists the
+    stored rows and X-Rejected-Rows gives the number skipped.
     """
-    
-    stations = []
-    for station_in in stations_in:
-        # Create a new instance of WeatherDataPublic with the provided data and owner_id
-        station_data = WeatherCreate(
-            stationtype=station_in.stationtype,
-            weather_id=station_in.weather_id,
-            jday=station_in.jday,
-            date=parser.parse(station_in.date).strftime('%Y-%m-%d'),
-            hour=station_in.hour,
-            srad=station_in.srad,
-            wind=station_in.wind,
-            rh=station_in.rh,
-            rain=station_in.rain,
-            tmax=station_in.tmax,
-            tmin=station_in.tmin,
-            temperature=station_in.temperature,
-            co2=station_in.co2,
-            # owner_id=current_user.id
-        )
-        session.add(station_data)
+    frame = pd.DataFrame([station_in.model_dump(include=set(ingest_columns)) for station_in in stations_in],
+                         columns=ingest_columns)
+    valid, rejected = validate_weather_frame(frame, upload_required)
+    if rejected:
+        logger.warning(f"Weather rows rejected: {rejected} of {len(frame)}")
+    response.headers["X-Rejected-Rows"] = str(rejected)
+    if valid.empty:
+        return []
+    rows = copy_weather_rows(valid, session, returning=True)
+    session.commit()
+    # Let the simulation workers reload this station's weather
+    bump_weather_version(valid["weather_id"].unique(), session)
+
+    return [WeatherDataPublic(**row._mapping) for row in rows]
+
+
+@router.post("/data/upload/{id}")
+def upload_station_data(
+    session: SessionDep, current_user: CurrentUser, id: int, file: UploadFile
+) -> Any:
+    """
+    Load a weather CSV file (jday, date, hour, srad, wind, rh, rain, tmax,
+    tmin, temperature, co2 columns) into a station. Rows of an hour the
+    station already has replace it.
+    """
+    station = session.query(WeatherMeta).filter(
+        WeatherMeta.id == id,
+        WeatherMeta.owner_id == current_user.id
+    ).first()
+    if not station:
+        raise HTTPException(status_code=404, detail="Station not found")
+    try:
+        chunks = pd.read_csv(file.file, chunksize=upload_chunk_rows, skipinitialspace=True)
+        written, rejected = ingest_weather_csv(chunks, str(station.stationtype), id, session)
         session.commit()
-        session.refresh(station_data)
-        stations.append(station_data)
-    
-    return stations
+    except (ValueError, KeyError, pd.errors.ParserError) as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid weather file: {e}")
+    bump_weather_version([id], session)
+    return {"message": f"Number of rows ingested into database: {written}", "rejected": rejected}
 
 
 @router.get("/download/{id}/{con}")
@@ -211,63 +213,28 @@ async def download(
     if not siteData or not siteData.rlat or not siteData.rlon:
         raise HTTPException(status_code=400, detail="Site location data missing")
 
-    # Construct URL and fetch data
-    currentyear = datetime.now().year
-    year = str(currentyear + 2)
-    url = f"https://weather.covercrop-data.org/hourly?email=ARS-CLASSIM-Help@usda.gov&lat={siteData.rlat}&lon={siteData.rlon}&start=2018-1-1&end={year}-12-31&attributes=air_temperature,relative_humidity,wind_speed,shortwave_radiation,precipitation&output=csv&options=predicted"
+    # Only the days the station is missing, plus the recent days that may
+    # still hold predicted values; con re-downloads the whole range
+    start, end, refresh_from = download_range(con, datetime.now().date())
+    covered = read_station_coverage(id, start, end, db)
+    windows = missing_windows(covered, start, end, settings.WEATHER_DOWNLOAD_CHUNK_DAYS, refresh_from)
+    if not windows:
+        return {"message": "data existed"}
 
-    logger.info("Weather fetch station_id=%s site=%s url=%s", id, sitename, url)
-    # Add timeout to prevent hanging on slow external API
+    logger.info("Weather fetch station_id=%s site=%s windows=%s url=%s", id, sitename, len(windows),
+                settings.WEATHER_SERVICE_URL)
     try:
-        # Use aiohttp for async requests - rename ClientSession variable to avoid collision
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        async with ClientSession() as http_session:  # Renamed to http_session
-            async with http_session.get(url, headers=headers, timeout=45) as response:
-                if response.status != 200:
-                    return {"error": f"API returned status {response.status}"}
-                content = await response.read()
-                data = pd.read_csv(BytesIO(content))
+        row_count = await download_station_weather(stationType, id, siteData.rlat, siteData.rlon, windows, db)
     except Exception as e:
+        db.rollback()
         logger.error(f"Failed to fetch weather data: {e}")
+        # Windows committed before the failure are kept and skipped next time
+        bump_weather_version([id], db)
         return {"error": "Website has reported an error. Please try again later."}
+    bump_weather_version([id], db)
 
-    # Process data with vectorized operations
-    processed_data = process_weather_data(data, stationType, id)
-    
-    # Check date range
-    dateList = processed_data['date']
-    minDate = min(dateList)
-    maxDate = max(dateList)
-    
-    # Check if data exists
-    data_exists = check_existing_data(db, id, minDate, maxDate)
-    
-    if data_exists and not con:
-        return {"message": "data existed"}
-    
-    # Delete existing data if replacing
-    if data_exists:
-        delete_weather_data(db, stationType, minDate, maxDate)
-    
-    # Insert new data efficiently
-    columns_to_keep = ['stationtype', 'weather_id', 'jday', 'date', 'hour', 'srad', 'wind', 'rh', 'rain', 'tmax', 'tmin', 'temperature', 'co2']
-    final_data = processed_data[columns_to_keep]
-    row_count = bulk_insert_weather_data(db, final_data)
-    
     return {"message": f"Number of rows ingested into database: {row_count}"}
     
-def delete_weather_data(session: SessionDep, station_type: str, mindate: datetime, maxdate: datetime):
-    """
-    Retrieve weather data for a specific station type between the given dates.
-    """
-    session.query(WeatherData).filter(
-        WeatherData.stationtype == station_type,
-        WeatherData.date > mindate,
-        WeatherData.date < maxdate
-    ).delete()
-    session.commit()
-
-
 @router.get("/getStationsBySite/{site}", response_model=WeatherMetasPublic)
 def getStationsBySite(
     session: SessionDep, site : str, current_user: CurrentUser, skip: int = 0, limit: int = 100
@@ -378,65 +345,3 @@ def get_dates_by_treatments(
     }
 
     return response
-
-def check_existing_data(session, weather_id, min_date, max_date):
-    # More efficient count query with exists
-    exists_query = select(1).where(
-        WeatherData.weather_id == weather_id,
-        WeatherData.date > min_date,
-        WeatherData.date < max_date
-    ).exists()
-    
-    return session.query(exists_query).scalar()
-
-# Vectorized operations instead of row-by-row processing
-def process_weather_data(data, station_type, weather_id):
-    # Convert dates once using vectorized operations
-    date_objects = pd.to_datetime(data['date'])
-    data['jday'] = date_objects.dt.strftime('%j')
-    data['hour'] = date_objects.dt.strftime('%H')
-    data['date'] = date_objects.dt.strftime('%Y-%m-%d')
-    
-    # Rename columns with a single operation
-    data.rename(columns={
-        "air_temperature": "temperature", 
-        "relative_humidity": "rh", 
-        "wind_speed": "wind", 
-        "shortwave_radiation": "srad", 
-        "precipitation": "rain"
-    }, inplace=True)
-    
-    # Apply calculations with vectorized operations
-    data['srad'] = data['srad'] * 3600 / 1000000
-    data['rh'] = data['rh'] * 100
-    
-    # Add station columns
-    data['stationtype'] = station_type
-    data['weather_id'] = weather_id
-    
-    # Fill missing columns with default values
-    for col in ['tmax', 'tmin', 'co2']:
-        if col not in data.columns:
-            data[col] = 0.00
-            
-    return data
-
-def bulk_insert_weather_data(session, data):
-    # Convert DataFrame directly to list of dicts - more efficient than row iteration
-    records = data.to_dict(orient='records')
-    
-    # Filter out invalid records
-    valid_records = [
-        record for record in records 
-        if not any(pd.isna(record[col]) for col in ['jday', 'hour', 'srad', 'wind', 'rh', 'rain', 'tmax', 'tmin', 'temperature', 'co2'])
-    ]
-    
-    # Use chunking for very large datasets to avoid memory issues
-    chunk_size = 5000
-    for i in range(0, len(valid_records), chunk_size):
-        chunk = valid_records[i:i+chunk_size]
-        session.bulk_insert_mappings(WeatherData, chunk)
-        session.flush()  # Flush but don't commit until all chunks are processed
-        
-    session.commit()
-    return len(valid_records)
\ No newline at end of file
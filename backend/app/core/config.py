@@ -1,3 +1,4 @@
+import os
 import secrets
 import warnings
 from typing import Annotated, Any, Literal
@@ -106,6 +107,64 @@ class Settings(BaseSettings):
     GUEST_EMAIL_TEMPLATE_PATH: str = "email-templates/guest-report.html"
     GUEST_EMAIL_FROM_NAME: str = "CLASSIM System"
 
+    # Simulation workers. Runs are queued on pastruns.status and drained by the
+    # worker service (`python -m app.simulation_worker`), which starts
+    # SIMULATION_WORKER_PROCESSES processes per node. SIMULATION_WORKERS embeds
+    # a pool of that size in every API process instead; keep it 0 when the API
+    # runs several uvicorn/gunicorn workers or with --reload.
+    SIMULATION_WORKERS: int = 0
+    SIMULATION_WORKER_PROCESSES: int = os.cpu_count() or 1
+    SIMULATION_POLL_SECONDS: float = 2.0
+    # Per-run limits for the model executables (0 disables a limit)
+    SIMULATION_TIMEOUT_SECONDS: int = 3600
+    SIMULATION_MEMORY_LIMIT_MB: int = 4096
+    CREATESOIL_TIMEOUT_SECONDS: int = 600
+    # Largest parameter grid accepted by POST /seasonalsim/seasonBatch
+    SIMULATION_BATCH_MAX_MEMBERS: int = 1000
+    # Size cap of the content-addressed cache of generated model input files
+    INPUT_CACHE_MAX_MB: int = 2048
+    # Size cap of the cache of CreateSoilFiles outputs (.grd/.nod/.soi)
+    GRID_CACHE_MAX_MB: int = 1024
+    # Stations whose weather frames each worker process keeps in memory
+    WEATHER_CACHE_STATIONS: int = 8
+    # Hourly weather service used by /weather/download. Only days a station
+    # is missing (plus the last WEATHER_DOWNLOAD_REFRESH_DAYS, which may hold
+    # predicted values) are requested, WEATHER_DOWNLOAD_CHUNK_DAYS per request
+    WEATHER_SERVICE_URL: str = "https://weather.covercrop-data.org/hourly"
+    WEATHER_SERVICE_EMAIL: str = "ARS-CLASSIM-Help@usda.gov"
+    WEATHER_DOWNLOAD_START: str = "2018-01-01"
+    WEATHER_DOWNLOAD_AHEAD_DAYS: int = 14
+    WEATHER_DOWNLOAD_REFRESH_DAYS: int = 7
+    WEATHER_DOWNLOAD_CHUNK_DAYS: int = 90
+    # Where per-node 2DSOIL outputs (G03/G04/G07) are stored: one row per node
+    # and hour in the cropOutput tables, one packed row per timestep in
+    # soil_node_arrays, or both
+    SOIL_NODE_STORAGE: Literal["rows", "arrays", "both"] = "rows"
+    # Parquet copy of every run's output files, served by the arrow endpoint;
+    # the directory defaults to executables/archive
+    OUTPUT_ARCHIVE_ENABLED: bool = True
+    OUTPUT_ARCHIVE_DIR: str | None = None
+    # Downsampled plot series kept per API process, and the largest point
+    # count a client may ask for
+    SERIES_CACHE_ENTRIES: int = 256
+    SERIES_MAX_POINTS: int = 5000
+    # Largest set of runs one comparison request may aggregate
+    COMPARE_MAX_RUNS: int = 1000
+    # Pixel grid of the 2D soil rasters, interpolation weights kept per API
+    # process (one entry per grid) and rendered rasters kept per process
+    SOIL_RASTER_WIDTH: int = 200
+    SOIL_RASTER_HEIGHT: int = 200
+    SOIL_WEIGHTS_CACHE_ENTRIES: int = 32
+    SOIL_RASTER_CACHE_ENTRIES: int = 512
+    # NRCS Soil Data Access lookups: map units are cached per lon/lat tile
+    # rounded to NRCS_TILE_DECIMALS and their profiles per map unit key, both
+    # refetched after NRCS_CACHE_TTL_DAYS; NRCS_OFFLINE serves the cache only
+    NRCS_SDM_URL: str = "https://SDMDataAccess.nrcs.usda.gov/Tabular/SDMTabularService.asmx"
+    NRCS_SDM_TIMEOUT: int = 30
+    NRCS_CACHE_TTL_DAYS: int = 180
+    NRCS_TILE_DECIMALS: int = 3
+    NRCS_OFFLINE: bool = False
+
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
         if not self.EMAILS_FROM_NAME:
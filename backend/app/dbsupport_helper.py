@@ -7,7 +7,8 @@ import shutil
 from sqlalchemy.sql import text
 from datetime import datetime as dt
 from app.api.deps import SessionDep
-from datetime import datetime, timedelta
+from app.outputArchive_helper import delete_archive
+from datetime import timedelta
 currentDir = os.getcwd()
 dbDir=os.path.join(currentDir,'executables')
 
@@ -202,6 +203,151 @@ def readOpDetails(operationid: int, operationName: str, session: SessionDep) ->
     return rlist
 
 
+
+op_detail_queries = {
+    'Simulation Start': """
+        SELECT o."opID", name, odate, pop, autoirrigation, xseed, yseed, cec, eomult, "rowSpacing", cultivar, "seedpieceMass"
+        FROM operations o
+        JOIN "initCondOp" ico ON o."opID" = ico."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'Tillage': """
+        SELECT o."opID", name, odate, tillage
+        FROM operations o
+        JOIN "tillageOp" t ON o."opID" = t."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'Fertilizer': """
+        SELECT o."opID", name, odate, "fertilizationClass", depth, nutrient, "nutrientQuantity"
+        FROM operations o
+        JOIN "fertilizationOp" fo ON o."opID" = fo."opID"
+        JOIN "fertNutOp" fno ON o."opID" = fno."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'Plant Growth Regulator': """
+        SELECT o."opID", name, odate, "PGRChemical", po."applicationType", bandwidth, "applicationRate", po."PGRUnit", pat.code as appTypeCode, pu.code as appUnitCode
+        FROM operations o
+        JOIN "PGROp" po ON o."opID" = po."opID"
+        JOIN "PGRApplType" pat ON po."applicationType" = pat."applicationType"
+        JOIN "PGRUnit" pu ON po."PGRUnit" = pu."PGRUnit"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'Surface Residue': """
+        SELECT o."opID", name, odate, "residueType", "applicationType", "applicationTypeValue"
+        FROM operations o
+        JOIN "surfResOp" sro ON o."opID" = sro."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+}
+
+irrigation_detail_queries = {
+    'Sprinkler': """
+        SELECT o."opID", name, "irrigationClass", odate, "AmtIrrAppl"
+        FROM operations o
+        JOIN "Irrig_pivotOp" Iro ON o."opID" = Iro."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'FloodH': """
+        SELECT o."opID", name, "irrigationClass", "pondDepth", "irrStartD", "startH", "irrStopD", "stopH"
+        FROM operations o
+        JOIN "irrig_floodH" Iro ON o."opID" = Iro."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+    'FloodR': """
+        SELECT o."opID", name, "irrigationClass", "pondDepth", rate, "irrStartD", "startH", "irrStopD", "stopH"
+        FROM operations o
+        JOIN "irrig_floodR" Iro ON o."opID" = Iro."opID"
+        WHERE o."opID" = ANY(:ids)
+    """,
+}
+
+
+def readOpDetails_batch(operations: list, session: SessionDep) -> dict:
+    '''
+    readOpDetails for a whole operation list with one query per operation
+    type instead of one per operation.
+    Input:
+        operations = list of ("opID", name, odate) as from read_operationsDB_id
+    Output:
+        dict opID -> list of tuples, the rows readOpDetails returns for it
+    '''
+    details = {}
+    by_name = {}
+    for op in operations:
+        by_name.setdefault(op[1], []).append(op[0])
+        details[op[0]] = []
+
+    irrigation_ids = by_name.pop('Irrigation', [])
+    queries = []
+    plain_ids = []
+    for name, ids in by_name.items():
+        if name in op_detail_queries:
+            queries.append((op_detail_queries[name], ids))
+        else:
+            plain_ids.extend(ids)
+    if irrigation_ids:
+        query = text("""SELECT "opID", "irrigationClass" FROM "irrigationDetails" WHERE "opID" = ANY(:ids)""")
+        classes = {}
+        for opID, irrigation_class in session.execute(query, {'ids': irrigation_ids}).fetchall():
+            classes.setdefault(opID, irrigation_class)
+        by_class = {}
+        for opID in irrigation_ids:
+            irrigation_class = classes.get(opID)
+            if irrigation_class in irrigation_detail_queries:
+                by_class.setdefault(irrigation_class, []).append(opID)
+            else:
+                plain_ids.append(opID)
+        for irrigation_class, ids in by_class.items():
+            queries.append((irrigation_detail_queries[irrigation_class], ids))
+    if plain_ids:
+        queries.append(("""SELECT o."opID", name, odate FROM operations o WHERE o."opID" = ANY(:ids)""", plain_ids))
+
+    for query, ids in queries:
+        for row in session.execute(text(query), {'ids': ids}).fetchall():
+            details[row[0]].append(row)
+    return details
+
+
+def read_simulation_context(crop: str, experiment: str, treatmentname: str, site: str, soilname: str,
+                            session: SessionDep, current_user_id) -> Any:
+    '''
+    The ids and scalar values a run's input writers look up, in one query.
+    Input:
+      crop, experiment, treatmentname, site, soilname
+    Output:
+      mapping with exid, tid (treatment name prefix match, as read_treatmentDB_id),
+      o_t_exid (exact match, as getTreatmentID), site_id, rlat, rlon, altitude
+      and max_depth of the soil profile
+    '''
+    query = text("""
+        WITH ex AS (SELECT exid FROM experiment WHERE crop = :crop AND name = :experiment LIMIT 1)
+        SELECT
+            (SELECT exid FROM ex) AS exid,
+            (SELECT tid FROM treatment WHERE t_exid = (SELECT exid FROM ex) AND name LIKE :treatment_prefix LIMIT 1) AS tid,
+            (SELECT tid FROM treatment WHERE t_exid = (SELECT exid FROM ex) AND name = :treatment LIMIT 1) AS o_t_exid,
+            s.id AS site_id, s.rlat, s.rlon, s.altitude,
+            (SELECT max("Bottom_depth") FROM soil_long
+              WHERE o_sid = (SELECT id FROM soil WHERE soilname = :soilname AND owner_id = :user_id)) AS max_depth
+        FROM (SELECT 1) one
+        LEFT JOIN LATERAL (SELECT id, rlat, rlon, altitude FROM site WHERE sitename = :site LIMIT 1) s ON true
+    """)
+    return session.execute(query, {'crop': crop, 'experiment': experiment, 'treatment': treatmentname,
+                                   'treatment_prefix': treatmentname + '%', 'site': site,
+                                   'soilname': soilname, 'user_id': current_user_id}).mappings().one()
+
+
+def read_dispersivity_table(session: SessionDep) -> dict:
+    '''
+    The dispersivity table as texture -> (alpha,), for looking up every soil
+    layer without a query each.
+    '''
+    rows = session.execute(text("""SELECT texturecl, alpha FROM dispersivity ORDER BY id""")).fetchall()
+    table = {}
+    for texturecl, alpha in rows:
+        table.setdefault(texturecl, (alpha,))
+    return table
+
+
 def extract_sitedetails(site_string: str, session: SessionDep):
     '''
     Retrieve site information from sitedetails table
@@ -289,18 +435,36 @@ def delete_cropOutputSim(id: str, crop: str, session: SessionDep) -> bool:
     elif crop == "cotton":
         file_ext = ["g01", "g03", "g04", "g05", "g07", "plantStress"]
 
+    # The output tables are hash partitioned on the run id, each DELETE
+    # below only touches the partition holding the run
+    session.execute(text("""DELETE FROM simulation_summary WHERE sim_id = :id"""), {'id': id})
+    session.execute(text("""DELETE FROM soil_node_arrays WHERE sim_id = :id"""), {'id': id})
+    session.execute(text("""DELETE FROM soil_node_index WHERE sim_id = :id"""), {'id': id})
+
     # Delete geometry data
     geo_query = text("""DELETE FROM geometry WHERE "simID" = :id""")
     session.execute(geo_query, {'id': id})
 
+    # Unlink the grid of the run, and drop it once no other run shares it
+    session.execute(text("""
+        WITH unlinked AS (
+            UPDATE pastruns p SET grid_id = NULL FROM pastruns old
+             WHERE p.id = old.id AND p.id = :id AND old.grid_id IS NOT NULL
+            RETURNING old.grid_id
+        )
+        DELETE FROM soil_grid g USING unlinked u
+         WHERE g.id = u.grid_id AND NOT EXISTS (SELECT 1 FROM pastruns p WHERE p.grid_id = g.id AND p.id <> :id)
+    """), {'id': id})
+
     # Delete from each crop-specific table
     for ext in file_ext:
         table_name = f"{ext}_{crop}"
         id_name = f"{table_name}_id"
-        query = text(f"DELETE FROM {table_name} WHERE {id_name} = :id")
+        query = text(f'DELETE FROM "{table_name}" WHERE "{id_name}" = :id')
         session.execute(query, {'id': id})
 
     session.commit()
+    delete_archive(id)
     return True
 
 
@@ -360,8 +524,7 @@ def getMaizeDateByDev(sim_id:int ,maizePhase: str, session:SessionDep):
     })
     row = result.fetchone()
     if row[0] is not None:
-       dt_obj = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-       rlist = dt_obj.strftime('%m/%d/%Y')
+       rlist = row[0].strftime('%m/%d/%Y')
 
     else:
         rlist="N/A"
@@ -382,12 +545,7 @@ def getMaturityDate(sim_id:int ,session:SessionDep):
 
     row = result.fetchone()
     if row[0] is not None:
-        try:
-            dt_obj = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-            rlist = dt_obj.strftime('%m/%d/%Y')
-
-        except AttributeError:
-            rlist = row[0]  # Already a string
+        rlist = row[0].strftime('%m/%d/%Y')
     else:
         rlist = "N/A"
     return rlist
@@ -411,8 +569,7 @@ def getSoybeanDevDate(sim_id, rstage, session:SessionDep):
     row = result.fetchone()
     if row:
         if row[0] is not None:
-            dt_obj = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-            rlist = dt_obj.strftime('%m/%d/%Y')
+            rlist = row[0].strftime('%m/%d/%Y')
         else:
             rlist = "N/A"
         return rlist
@@ -430,11 +587,12 @@ def getMaizeAgronomicData(sim_id, date, session:SessionDep):
     '''
     rlist = None # list
 
-    harvestDate = dt.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
-    query=text("""select (max("earDM")*.86), max("shootDM"), max("NUpt") from g01_maize where g01_maize_id=:id and "Date_Time" <= :time""")
+    # Every record of the harvest day counts, so the range ends at the next midnight
+    dayAfterHarvest = dt.strptime(date, '%m/%d/%Y') + timedelta(days=1)
+    query=text("""select (max("earDM")*.86), max("shootDM"), max("NUpt") from g01_maize where g01_maize_id=:id and "Date_Time" < :time""")
     result = session.execute(query, {
         'id': sim_id,
-        'time': harvestDate+'%',
+        'time': dayAfterHarvest,
     })
     c1row = result.fetchone()
     if c1row != None:
@@ -455,11 +613,12 @@ def getPotatoAgronomicData(sim_id, date,session:SessionDep):
     Tr-Act = transpiration
     '''
     rlist = None # list   
-    harvestDate = dt.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
-    query= text("""select max("tuberDM"), max("totalDM"), sum("Tr_Act") from g01_potato where g01_potato_id=:id and "Date_Time" <= :time""")
+    # Every record of the harvest day counts, so the range ends at the next midnight
+    dayAfterHarvest = dt.strptime(date, '%m/%d/%Y') + timedelta(days=1)
+    query= text("""select max("tuberDM"), max("totalDM"), sum("Tr_Act") from g01_potato where g01_potato_id=:id and "Date_Time" < :time""")
     result= session.execute(query, {
         'id': sim_id,
-        'time': harvestDate+'%',
+        'time': dayAfterHarvest,
     })
     c = result.fetchone()
     rlist = [] 
@@ -482,11 +641,12 @@ def getSoybeanAgronomicData(sim_id, date, session:SessionDep):
     Tr_act = transpiration
     '''
     rlist = None # list   
-    harvestDate = dt.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
-    query= text("""select max("seedDM"), max("totalDM"), sum("Tr_act") from g01_soybean where g01_soybean_id=:id and "Date_Time" <= :time""")
+    # Every record of the harvest day counts, so the range ends at the next midnight
+    dayAfterHarvest = dt.strptime(date, '%m/%d/%Y') + timedelta(days=1)
+    query= text("""select max("seedDM"), max("totalDM"), sum("Tr_act") from g01_soybean where g01_soybean_id=:id and "Date_Time" < :time""")
     result= session.execute(query, {
         'id': sim_id,
-        'time': harvestDate+'%',
+        'time': dayAfterHarvest,
     })
     c = result.fetchone()
     rlist = [] 
@@ -522,6 +682,38 @@ def getCottonAgronomicData(sim_id,session:SessionDep):
     return rlist
 
 
+def read_output_columns(table_name: str, sim_id: int, variables: list, start, end, session: SessionDep) -> Any:
+    '''
+    Date_Time and some columns of a run's output table, in time order.
+    Input:
+        table_name: cropOutput table, e.g. g01_maize
+        sim_id = simulation id
+        variables = column names, checked against the table
+        start, end = optional inclusive Date_Time bounds
+    Output:
+        (datetime64 array, {variable: float array}), None if a variable is not a column
+    '''
+    query = text("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table_name
+    """)
+    columns = {row[0] for row in session.execute(query, {'table_name': table_name})}
+    if not columns or any(var not in columns for var in variables):
+        return None
+    selected = ", ".join(f'"{var}"' for var in variables)
+    query = text(f"""
+        SELECT "Date_Time", {selected} FROM "{table_name}"
+         WHERE "{table_name}_id" = :sim_id
+           AND (CAST(:start AS timestamp) IS NULL OR "Date_Time" >= :start)
+           AND (CAST(:end AS timestamp) IS NULL OR "Date_Time" <= :end)
+         ORDER BY "Date_Time"
+    """)
+    rows = session.execute(query, {'sim_id': sim_id, 'start': start, 'end': end}).fetchall()
+    frame = pd.DataFrame(rows, columns=["Date_Time"] + list(variables))
+    stamps = pd.to_datetime(frame["Date_Time"]).to_numpy()
+    return stamps, {var: pd.to_numeric(frame[var], errors='coerce').to_numpy(dtype=float) for var in variables}
+
+
 def read_cultivar_DB_detailed(hybridname: str, cropname: str, session: SessionDep,current_user_id=None) -> Any:
     '''
     Extracts the link id from cropname and croptable. With linkid, we can query cultivar_* table to get details of the crop variety.
@@ -977,3 +1169,80 @@ def read_soilshortDB(soilname: str, session: SessionDep,current_user_id) -> list
     except Exception as e:
         print(f"Error while fetching restricted soil information: {e}")
         return rlist
+
+
+def read_input_fingerprints(soilname: str, session: SessionDep, current_user_id) -> dict:
+    '''
+    Hashes of the DB rows the soil, grid, gas, biology and solute input
+    writers read, computed in one round trip. Used as input cache keys.
+    Input:
+      soilname
+    Output:
+      dict with soil, gridratio, gas, biology, solute and dispersivity md5 hashes
+    '''
+    query = text("""
+        WITH s AS (SELECT id, o_gridratio_id FROM soil WHERE soilname = :soilname AND owner_id = :user_id)
+        SELECT
+            (SELECT md5(coalesce(string_agg(sl::text, '|' ORDER BY sl.id), ''))
+               FROM soil_long sl WHERE sl.o_sid = (SELECT id FROM s)) AS soil,
+            (SELECT md5(coalesce(string_agg(g::text, '|' ORDER BY g::text), ''))
+               FROM gridratio g WHERE g.gridratio_id = (SELECT o_gridratio_id FROM s)) AS gridratio,
+            (SELECT md5(coalesce(string_agg(g::text, '|' ORDER BY g.id), '')) FROM gas g) AS gas,
+            (SELECT md5(coalesce(string_agg(b::text, '|' ORDER BY b.id), '')) FROM biologydefault b) AS biology,
+            (SELECT md5(coalesce(string_agg(x::text, '|' ORDER BY x.id), '')) FROM solute x WHERE x.id = 1) AS solute,
+            (SELECT md5(coalesce(string_agg(d::text, '|' ORDER BY d.id), '')) FROM dispersivity d) AS dispersivity
+    """)
+    row = session.execute(query, {'soilname': soilname, 'user_id': current_user_id}).mappings().one()
+    return dict(row)
+
+
+def read_cultivar_fingerprint(hybridname: str, cropname: str, session: SessionDep, current_user_id=None) -> Any:
+    '''
+    Hash of the cultivar row WriteCropVariety reads.
+    Input:
+      hybridname
+      cropname
+    Output:
+      md5 of the row, None if the crop has no cultivar table
+    '''
+    if cropname not in ("maize", "potato", "soybean", "cotton"):
+        return None
+    query = text(f"""SELECT md5(c::text) FROM cultivar_{cropname} c WHERE hybridname = :hybridname AND owner_id = :owner""")
+    row = session.execute(query, {'hybridname': hybridname, 'owner': current_user_id}).fetchone()
+    return row[0] if row else None
+
+
+def read_weather_fingerprint(experiment, treatmentname, stationtype, weather, owner_id, session: SessionDep) -> Any:
+    '''
+    Version of the weather rows (weather_meta.data_version, bumped by every
+    write) and hash of the station parameters WriteWeather reads, plus the
+    treatment's simulation window.
+    Input:
+      experiment
+      treatmentname
+      stationtype
+      weather
+      owner_id
+    Output:
+      (window start, window end, station id:data_version, md5 of the station row)
+    '''
+    query = text("""
+        SELECT min(o.odate), max(o.odate)
+        FROM operations o, treatment t, experiment e
+        WHERE t.tid = o.o_t_exid AND e.exid = t.t_exid
+        AND e.name = :experiment_name AND t.name = :treatment_name
+    """)
+    odates = session.execute(query, {'experiment_name': experiment, 'treatment_name': treatmentname}).fetchall()
+    dates = pd.to_datetime(pd.Series([d for row in odates for d in row if d is not None]))
+    sdate = (dates.min() - timedelta(days=1)).strftime('%Y-%m-%d')
+    edate = (dates.max() + timedelta(days=1)).strftime('%Y-%m-%d')
+    query = text("""
+        SELECT
+            (SELECT id || ':' || data_version FROM weather_meta
+              WHERE stationtype = :weather AND owner_id = :owner_id ORDER BY id LIMIT 1) AS rows,
+            (SELECT md5(coalesce(string_agg(m::text, '|' ORDER BY m.id, m::text), ''))
+               FROM (SELECT wm.*, s.rlat, s.rlon FROM weather_meta wm, site s
+                      WHERE wm.site = s.sitename AND wm.stationtype = :stationtype) m) AS station
+    """)
+    row = session.execute(query, {'stationtype': stationtype, 'weather': weather, 'owner_id': owner_id}).fetchone()
+    return sdate, edate, row[0], row[1]
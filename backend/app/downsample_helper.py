@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets: indices of `points` samples that keep the
+    visual shape of a line. The first and last samples are always kept.
+    Input:
+        x: increasing float positions
+        y: values, no NaN
+        points: target number of samples
+    Output:
+        sorted index array
+    '''
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n) if points >= n else np.linspace(0, n - 1, max(points, 0)).astype(np.int64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket (the last sample for the final bucket)
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[previous] - avg_x) * (by - y[previous]) - (x[previous] - bx) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_buckets(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    '''
+    Split the series in points // 2 equal-width time buckets and keep the
+    minimum and maximum of each, so no peak is lost.
+    Input:
+        x: increasing float positions
+        y: values, no NaN
+        points: target number of samples
+    Output:
+        sorted index array
+    '''
+    n = len(x)
+    buckets = max(points // 2, 1)
+    if n <= points:
+        return np.arange(n)
+    bucket = np.minimum(((x - x[0]) / (x[-1] - x[0] or 1) * buckets).astype(np.int64), buckets - 1)
+    # Sort by (bucket, value) once; the first and last of each bucket are its min and max
+    order = np.lexsort((y, bucket))
+    firsts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    lasts = np.r_[firsts[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[firsts], order[lasts]]))
+
+
+downsample_methods = {"lttb": lttb, "minmax": minmax_buckets}
+
+
+def downsample(stamps: np.ndarray, values: np.ndarray, points: int, method: str = "lttb") -> tuple:
+    '''
+    Downsample one time series, skipping missing values.
+    Input:
+        stamps: datetime64 array
+        values: float array
+        points: target number of samples
+        method: 'lttb' or 'minmax'
+    Output:
+        (datetime64 array, float array)
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(values)
+    stamps, values = stamps[keep], values[keep]
+    x = stamps.astype("datetime64[s]").astype(np.int64).astype(np.float64)
+    index = downsample_methods[method](x, values, points)
+    return stamps[index], values[index]
+
+
+def _has_data(value: Any) -> bool:
+    if value is None:
+        return False
+    try:
+        return len(value) > 0
+    except TypeError:
+        return True
+
+
+class SeriesCache:
+    '''
+    Process-wide LRU of values derived from outputs (downsampled series,
+    soil rasters). Outputs of a finished run never change, so entries only
+    leave by eviction. Empty values are not kept: a lookup that found nothing
+    may find the outputs once they are ingested.
+    '''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: tuple, build: Callable[[], Any],
+                      cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        '''
+        Cached value of key, built and stored on a miss.
+        Input:
+            build: computes the value
+            cacheable: False for values that must not be stored; by default
+                None and empty values are not
+        '''
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        if not (cacheable or _has_data)(value):
+            return value
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+
+series_cache = SeriesCache(settings.SERIES_CACHE_ENTRIES)
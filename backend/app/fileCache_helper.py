@@ -0,0 +1,233 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+currentDir = os.getcwd()
+classimDir = os.path.join(currentDir, 'executables')
+cacheDir = os.path.join(classimDir, 'cache')
+
+# Bump when a writer changes its output format so old entries are not reused
+INPUT_CACHE_VERSION = 1
+
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    '''
+    Content hash of everything a cached file depends on.
+    Input:
+        namespace: cache area, e.g. "inputs/soi"
+        parts: JSON-serializable values (DB row hashes, parameters)
+    Output:
+        hex digest
+    '''
+    payload = json.dumps([namespace, INPUT_CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FileCache:
+    '''
+    Content-addressed on-disk cache of generated files.
+
+    Each entry is a directory <root>/<key[:2]>/<key> holding the files under
+    stable slot names plus meta.json with values the generator returned.
+    Entries are published with an atomic rename and never modified, so
+    they can be hard-linked into run directories. A per-key lock keeps
+    concurrent runs from generating the same entry twice. Entries are
+    evicted least recently used first once the cache grows past max_mb.
+    '''
+
+    def __init__(self, name: str, max_mb: int):
+        self.root = os.path.join(cacheDir, name)
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    @contextmanager
+    def lock(self, key: str):
+        lock_dir = os.path.join(self.root, "locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, key[:16] + ".lock"), "w") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def load(self, key: str, dest_dir: str, files: dict, copy_slots: tuple = ()) -> Any:
+        '''
+        Materialize a cached entry into dest_dir.
+        Input:
+            key
+            dest_dir: run directory
+            files: slot -> file name in dest_dir
+            copy_slots: slots that are copied instead of hard-linked, for
+                        files a later step rewrites in place
+        Output:
+            (True, meta) on a hit, (False, None) on a miss
+        '''
+        entry = self.entry_path(key)
+        meta_file = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_file):
+            return False, None
+        try:
+            for slot, name in files.items():
+                src = os.path.join(entry, slot)
+                dest = os.path.join(dest_dir, name)
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                if slot in copy_slots:
+                    shutil.copyfile(src, dest)
+                else:
+                    try:
+                        os.link(src, dest)
+                    except OSError:
+                        shutil.copyfile(src, dest)
+            with open(meta_file) as fh:
+                meta = json.load(fh)
+            os.utime(entry)
+            return True, meta
+        except FileNotFoundError:
+            # Evicted while we were reading it
+            return False, None
+
+    def store(self, key: str, src_dir: str, files: dict, meta: Any) -> None:
+        '''
+        Publish the generated files of src_dir as the entry for key.
+        '''
+        entry = self.entry_path(key)
+        if os.path.exists(entry):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp-")
+        try:
+            for slot, name in files.items():
+                shutil.copyfile(os.path.join(src_dir, name), os.path.join(tmp, slot))
+            with open(os.path.join(tmp, "meta.json"), "w") as fh:
+                json.dump(meta, fh)
+            os.rename(tmp, entry)
+        except OSError as e:
+            logger.warning(f"Could not store cache entry {key}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def get_or_create(self, key: str, dest_dir: str, files: dict, generate: Callable[[], Any],
+                      copy_slots: tuple = ()) -> Any:
+        '''
+        Link the cached files for key into dest_dir, or run generate() (which
+        writes them into dest_dir) and cache the result.
+        Input:
+            key: from cache_key()
+            dest_dir: run directory
+            files: slot -> file name written by generate in dest_dir
+            generate: writer, its return value is cached as meta
+            copy_slots: slots copied instead of hard-linked
+        Output:
+            return value of generate (fresh or cached)
+        '''
+        hit, meta = self.load(key, dest_dir, files, copy_slots)
+        if hit:
+            return meta
+        with self.lock(key):
+            hit, meta = self.load(key, dest_dir, files, copy_slots)
+            if hit:
+                return meta
+            meta = generate()
+            if all(os.path.exists(os.path.join(dest_dir, name)) for name in files.values()):
+                self.store(key, dest_dir, files, meta)
+            return meta
+
+    def get_or_create_outputs(self, key: str, dest_dir: str, generate: Callable[[], Any]) -> Any:
+        '''
+        Like get_or_create for a generator whose output file names are not
+        known up front, e.g. an external executable. Files that generate()
+        creates or rewrites in dest_dir are detected from a before/after
+        listing and cached under their own names.
+        Input:
+            key: from cache_key()
+            dest_dir: run directory
+            generate: runs the tool, a falsy return value (failure) is not cached
+        Output:
+            return value of generate (fresh or cached)
+        '''
+        hit, result = self._load_outputs(key, dest_dir)
+        if hit:
+            return result
+        with self.lock(key):
+            hit, result = self._load_outputs(key, dest_dir)
+            if hit:
+                return result
+            before = _listing(dest_dir)
+            result = generate()
+            if result:
+                after = _listing(dest_dir)
+                changed = sorted(name for name, stamp in after.items() if before.get(name) != stamp)
+                self.store(key, dest_dir, {name: name for name in changed},
+                           {"files": changed, "result": result})
+            return result
+
+    def _load_outputs(self, key: str, dest_dir: str) -> Any:
+        try:
+            with open(os.path.join(self.entry_path(key), "meta.json")) as fh:
+                meta = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return False, None
+        hit, meta = self.load(key, dest_dir, {name: name for name in meta["files"]})
+        return hit, (meta["result"] if hit else None)
+
+    def evict(self) -> None:
+        '''
+        Drop least recently used entries until the cache fits in max_bytes.
+        '''
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        total = 0
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir() or prefix.name == "locks":
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                    total += size
+                except FileNotFoundError:
+                    continue
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _listing(path: str) -> dict:
+    return {entry.name: (entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(path) if entry.is_file()}
+
+
+def file_digest(path: str) -> str:
+    '''
+    sha256 of a file's contents, for keys that depend on a generated file.
+    '''
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+input_cache = FileCache("inputs", settings.INPUT_CACHE_MAX_MB)
+grid_cache = FileCache("grids", settings.GRID_CACHE_MAX_MB)
@@ -7,6 +7,7 @@ from app.dbsupport_helper import *
 from app.texture_helper import *
 from sqlmodel import func, select
 from app.models import WeatherMeta
+from app.weather_helper import format_weather, weather_cache
 global classimDir
 global runDir
 global storeDir
@@ -314,87 +315,17 @@ def WriteWeather(experiment,treatmentname,stationtype,weather,field_path,tempVar
     )
     weatherMetadata = session.exec(statement).first()
     weather_id=weatherMetadata.id
-    weather_query = """select jday, date, hour, srad, tmax, tmin, temperature, rain, wind, rh, co2 from weather_data where 
-        stationtype= %(stationtype)s and weather_id= %(weather_id)s order by date"""
-    df_weatherdata_orig = pd.read_sql(weather_query, session.connection(),params={'stationtype': stationtype,'weather_id': str(weather_id)})
-    
-    # Convert date column to Date type
-    df_weatherdata_orig['date'] = pd.to_datetime(df_weatherdata_orig['date'])
-    
-    firstDate = df_weatherdata_orig['date'].min()
-    lastDate = df_weatherdata_orig['date'].max()
-    df_weatherdata = df_weatherdata_orig.copy()
-    mask = (df_weatherdata['date'] >= sdate) & (df_weatherdata['date'] <= edate)
-    df_weatherdata = df_weatherdata.loc[mask]
+    # Only the simulation window is read, through the per-process station cache
+    df_weatherdata = weather_cache.window(stationtype, weather_id, sdate.strftime('%Y-%m-%d'),
+                                          edate.strftime('%Y-%m-%d'), session)
     #Check if dataframe is empty
 #     if df_weatherdata.empty == True or (df_weatherdata.shape[0] + 1) < diffInDays:
 #         return "Weather data is available for the data range of " + firstDate.strftime("%m/%d/%Y") + " and " + lastDate.strftime("%m/%d/%Y") + ". If this period covers \
 # the date range of your simulation, there are data missing for this simulation period."
-    # Check if data is daily or hourly
-    hourly_flag = 0
-    weather_length = df_weatherdata['date'].max() - df_weatherdata['date'].min()
-    num_records = len(df_weatherdata)
-    df_weatherdata['date'] = pd.to_datetime(df_weatherdata['date'],format='%Y-%m-%d')
-    weatherRoundDict = {"Radiation":2, "rain":2, "Wind":2, "rh":1, "CO2":1}
-    if(num_records > (weather_length.days+1)):
-        # header for hourly file
-        df_weatherdata = df_weatherdata.drop(columns=['tmax','tmin'])
-        weather_col_names = ["JDay", "Date", "hour", "Radiation", "temperature", "rain", "Wind", "rh", "CO2"] 
-        hourly_flag = 1
-        df_weatherdata = df_weatherdata.sort_values(by=['date','hour'])
-        # Sensitivity analyses temperature variance
-        if tempVar != 0:
-            df_weatherdata['temperature'] = df_weatherdata['temperature'] + float(tempVar)
-        weatherRoundDict['temperature'] = 1
-    else:
-        # header for daily file
-        df_weatherdata = df_weatherdata.drop(columns=['hour','temperature'])
-        weather_col_names = ["JDay", "Date", "Radiation", "Tmax","Tmin", "rain", "Wind", "rh", "CO2"] 
-        df_weatherdata = df_weatherdata.sort_values(by=['date'])
-        # Sensitivity analyses temperature variance
-        if tempVar != 0:
-            df_weatherdata['tmax'] = df_weatherdata['tmax'] + float(tempVar)
-            df_weatherdata['tmin'] = df_weatherdata['tmin'] + float(tempVar)
-        weatherRoundDict['tmax'] = 1
-        weatherRoundDict['tmin'] = 1
-    df_weatherdata['date'] = df_weatherdata['date'].dt.strftime('\'%m/%d/%Y\'')
-    df_weatherdata.columns = weather_col_names
-    rh_flag = 1
-    if (df_weatherdata['rh'].isna().sum() > 0 or (df_weatherdata['rh'] == '').sum() > 0):
-        df_weatherdata = df_weatherdata.drop(columns=['rh'])
-        rh_flag = 0
-        del weatherRoundDict['rh']
-    co2_flag = 1
-    if CO2Var != "None" and CO2Var != 0:
-        df_weatherdata['CO2'] = float(CO2Var)
-    else:
-        if (df_weatherdata['CO2'].isna().sum() > 0 or (df_weatherdata['CO2'] == 0).sum() > 0):
-            df_weatherdata = df_weatherdata.drop(columns=['CO2'])
-            co2_flag = 0
-            del weatherRoundDict['CO2']
-    if rainVar != 0:
-        df_weatherdata['rain'] = df_weatherdata['rain'] + (df_weatherdata['rain']*(float(rainVar)/100.0))         
-    else:
-        if (df_weatherdata['rain'].isna().sum() > 0 or (df_weatherdata['rain'] == '').sum() > 0):
-            df_weatherdata = df_weatherdata.drop(columns=['rain'])
-            del weatherRoundDict['rain']
-
-    wind_flag = 1
-    if (df_weatherdata['Wind'].isna().sum() > 0 or (df_weatherdata['Wind'] == '').sum() > 0):
-        df_weatherdata = df_weatherdata.drop(columns=['Wind'])
-        del weatherRoundDict['Wind']
-        wind_flag = 0
-    # the inputs for weather file comes from the weather flags. So we have to build that data stream 
-    # and then write
-    
-    comment_value = ",".join(df_weatherdata.columns)
-    #write the comment first
+    # Formats the window with NumPy: both header lines, then the data rows
+    weather_text, hourly_flag, rh_flag, co2_flag, wind_flag = format_weather(df_weatherdata, tempVar, rainVar, CO2Var)
     with open(filename,'a') as ff:
-        ff.write(comment_value)
-        ff.write('\n')
-
-    df_weatherdata = df_weatherdata.round(weatherRoundDict)
-    df_weatherdata.to_csv(filename,sep=' ',index=False,mode='a')
+        ff.write(weather_text)
     # Create .cli file
     # Extracts weather information from the weather_meta table and write the text file.       
     weatherparameters = read_weatherlongDB(stationtype,session) #returns a tuple
@@ -442,7 +373,7 @@ def WriteWeather(experiment,treatmentname,stationtype,weather,field_path,tempVar
     return hourly_flag, edate
 
 
-def WriteSoluteFile(soilname, field_path, session, current_user_id):
+def WriteSoluteFile(soilname, field_path, inputs, session, current_user_id):
     # Writes the SOLUTE FILE
     CODEC = "UTF-8"
     filename = os.path.join(field_path, "NitrogenDefault.sol")
@@ -455,8 +386,9 @@ def WriteSoluteFile(soilname, field_path, session, current_user_id):
             TextureCl = []  # Empty list for textures
 
             # Process each row of soil texture
-            for irow in soiltexture_list:
-                texture = Texture(irow[0], irow[2]).whatTexture()
+            profile_textures = classify_textures([irow[0] for irow in soiltexture_list],
+                                                 [irow[2] for irow in soiltexture_list])
+            for texture in profile_textures:
                 textures = list(filter(str.strip, texture.split("/")))
                 if len(textures) >= 1:
                     # Assumption: choose the second texture if there are two, else last one
@@ -476,7 +408,7 @@ def WriteSoluteFile(soilname, field_path, session, current_user_id):
 
             # Write dispersivity data for each texture
             for counter, texture in enumerate(TextureCl, start=1):
-                dispersivity = read_dispersivityDB(texture, session)
+                dispersivity = inputs.texture_dispersivity(texture)
                 fout.write(f'{1:-9d}{counter:-14d}{dispersivity[0]:-14.6f}{dispersivity[0]/2:-14.6f}\n')
             fout.write("\n")
     except IOError:
@@ -725,15 +657,16 @@ def WriteMulchGeo(field_path, nutrient,session):
 #     except IOError:
 #         print(f"Could not open file: {filename}")
 #WriteIrrigation(field_name, field_path, irrType, simulation_name, o_t_exid, session)
-def WriteIrrigation(field_name,field_path, simulationname, o_t_exid,session):
+def WriteIrrigation(field_name,field_path, simulationname, inputs,session):
     """Write irrigation data to .irr file"""
+    o_t_exid = inputs.o_t_exid
     
     # First create .irr file for the simulation period
     CODEC = "UTF-8"
     filename = os.path.join(field_path, f"{field_name}.irr")
 
     # Reading all the irrigation from irrigationDetails table
-    totIrrigation = read_irrigationDB(o_t_exid, session)
+    totIrrigation = inputs.irrigation
     values = [item[1] for item in totIrrigation]
     irrAmtlist = []
     floodlistH = []
@@ -866,8 +799,9 @@ def WriteRunFile(cropname, soilname, field_name, cultivar, field_path, stationty
     except IOError:
         print(f"Could not open file: {filename}")
 
-def WriteManagement(cropname, experiment, treatmentname, field_name, field_path, rowSpacing, session):
+def WriteManagement(inputs, field_name, field_path, rowSpacing):
     # Get data from operation, fertilizerOp and fertNutOp and Irrig_pivotOp
+    cropname = inputs.crop
 
     fertCount = 0
     PGRCount = 0
@@ -892,16 +826,15 @@ def WriteManagement(cropname, experiment, treatmentname, field_name, field_path,
     SurfResInfo = []
     IrrigationInfo = []
 
-    exid = read_experimentDB_id(cropname, experiment,session)
-    tid = read_treatmentDB_id(exid, treatmentname,session)
-    operationList = read_operationsDB_id(tid,session)
+    # Operations and their details are prefetched in inputs (SimulationInputs)
+    operationList = inputs.operations
     factor = (rowSpacing / 2) / 10000
     surfResType = "Rye"
     irrType = "No Irrigation"
 
     for ii, jj in enumerate(operationList):
         if jj[1] == "Fertilizer":
-            fertInfo = readOpDetails(jj[0], jj[1],session)
+            fertInfo = inputs.details(jj[0])
             for j in range(len(fertInfo)):
                 if j == 0:
                     fDepth.append(fertInfo[j][4])
@@ -933,7 +866,7 @@ def WriteManagement(cropname, experiment, treatmentname, field_name, field_path,
                         lammtN.append(fertInfo[j][6] * factor * 100)
             fertCount += 1
         if jj[1] == "Plant Growth Regulator":
-            PGRInfo = readOpDetails(jj[0], jj[1],session)
+            PGRInfo = inputs.details(jj[0])
             PGRDate.append(PGRInfo[0][2])
             PGRChem.append(PGRInfo[0][3])
             PGRAppMeth.append(PGRInfo[0][8])
@@ -942,10 +875,10 @@ def WriteManagement(cropname, experiment, treatmentname, field_name, field_path,
             PGRAppUnit.append(PGRInfo[0][9])
             PGRCount += 1
         if jj[1] == "Surface Residue":
-            SurfResInfo = readOpDetails(jj[0], jj[1],session)
+            SurfResInfo = inputs.details(jj[0])
             surfResType = SurfResInfo[0][3]
         if jj[1] == "Tillage":
-            TillageInfo = readOpDetails(jj[0], jj[1],session)
+            TillageInfo = inputs.details(jj[0])
             if TillageInfo[0][3] == "Moldboard plow":
                 tillDepth = 15
             elif TillageInfo[0][3] == "Chisel plow":
@@ -1008,19 +941,16 @@ def WriteManagement(cropname, experiment, treatmentname, field_name, field_path,
     return surfResType  # irrType
 
 
-def irrigationInfo(cropname, experiment, treatmentname,session):
-    operationList = []
+def irrigationInfo(inputs):
     IrrigationInfo = []
 
-    exid = read_experimentDB_id(cropname, experiment,session)
-    tid = read_treatmentDB_id(exid, treatmentname,session)
-    operationList = read_operationsDB_id(tid,session)
+    operationList = inputs.operations
 
     irrType = "No Irrigation"
 
     for ii, jj in enumerate(operationList):
         if jj[1] == "Irrigation":
-            IrrigationInfo = readOpDetails(jj[0], jj[1],session)
+            IrrigationInfo = inputs.details(jj[0])
             irrType = IrrigationInfo[0][3]
             print(IrrigationInfo)
 
@@ -0,0 +1,283 @@
+import io
+import logging
+import time
+from typing import Any
+
+import pandas as pd
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+from app.outputArchive_helper import OutputArchive
+from app.soilArrays_helper import copy_node_arrays, node_output, pack_node_frame
+from app.soilGrid_helper import grid_nodes, link_simulation_grid, read_grd, read_grd_elements, read_grid_id, store_grid
+from app.soilSnapshot_helper import copy_timestep_index
+
+logger = logging.getLogger(__name__)
+
+# Output tables whose rows carry a "date" (m/d/Y) and "time" (hour) column
+date_time_tables = ["g01_maize", "g01_potato", "nitrogen_potato", "plantStress_potato",
+                    "plantStress_maize", "g01_soybean", "nitrogen_soybean",
+                    "plantStress_soybean", "g01_cotton", "plantStress_cotton"]
+
+# 2DSOIL output tables, dated in days since 12/30/1899
+soil_tables = ["g03_maize", "g04_maize", "g05_maize", "g07_maize", "g03_potato", "g04_potato",
+               "g05_potato", "g07_potato", "g03_soybean", "g04_soybean", "g05_soybean", "g07_soybean",
+               "g03_fallow", "g05_fallow", "g07_fallow", "g03_cotton", "g04_cotton", "g05_cotton",
+               "g07_cotton"]
+
+g03_tables = ["g03_maize", "g03_cotton", "g03_soybean", "g03_potato", "g03_fallow"]
+
+jday_tables = ["nitrogen_potato", "plantStress_potato", "nitrogen_soybean",
+               "plantStress_soybean", "g01_cotton", "plantStress_cotton"]
+
+copy_chunk_rows = 50000
+
+
+def format_timestamps(stamps: pd.Series) -> pd.Series:
+    '''
+    Format timestamps as 'YYYY-MM-DD HH:MM:SS' text. Soil files repeat each
+    timestamp once per node, so only the distinct values are formatted.
+    Input:
+        stamps: datetime64 series
+    Output:
+        object series of strings
+    '''
+    codes, uniques = pd.factorize(stamps)
+    formatted = pd.Index(uniques).strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+    result = pd.Series(formatted[codes], index=stamps.index, dtype=object)
+    result[codes < 0] = None
+    return result
+
+
+def date_hour_to_timestamp(date: pd.Series, hour: pd.Series) -> pd.Series:
+    '''
+    Vectorized replacement for extract_date_time.
+    Input:
+        date: m/d/Y strings
+        hour: hour of the day
+    Output:
+        datetime64 series
+    '''
+    day = pd.to_datetime(date.astype(str).str.strip(), format='%m/%d/%Y')
+    return day + pd.to_timedelta(pd.to_numeric(hour), unit='h')
+
+
+def soil_days_to_timestamp(days: pd.Series) -> pd.Series:
+    '''
+    2dsoil start counting the days starting on 12/30/1899.
+    Input:
+        days: fractional days
+    Output:
+        datetime64 series rounded to the hour
+    '''
+    return pd.Timestamp('1899-12-30') + pd.to_timedelta(days, unit='D').dt.round('h')
+
+
+def read_output_file(g_name: str) -> pd.DataFrame:
+    '''
+    Read a model output file with stripped column names.
+    '''
+    g_df = pd.read_csv(g_name, skipinitialspace=True, index_col=False)
+    g_df.columns = [str(col).strip() for col in g_df.columns]
+    return g_df
+
+
+def prepare_output_frame(table_name: str, g_df: pd.DataFrame, simulationname: Any) -> pd.DataFrame:
+    '''
+    Shape an output file for its cropOutput table: Date_Time column, renamed
+    and dropped columns, and the simulation id column.
+    Input:
+        table_name
+        g_df: output file as read by read_output_file
+        simulationname
+    Output:
+        DataFrame ready to load
+    '''
+    g_df = g_df.copy()
+    g_df[table_name + "_id"] = int(simulationname)
+    if table_name in date_time_tables:
+        g_df['Date_Time'] = date_hour_to_timestamp(g_df['date'], g_df['time'])
+        g_df = g_df.drop(columns=['date', 'time'])
+        if table_name == "g01_potato":
+            g_df = g_df.rename(columns={'LA/pl': 'LA_pl', 'Tr-Pot': 'Tr_Pot',
+                                        'Tr-Act': 'Tr_Act', 'Rg+Rm': 'Rg_Rm'})
+        if table_name == "nitrogen_potato":
+            g_df = g_df.rename(columns={'Seed N': 'seed_N'})
+        if table_name in jday_tables:
+            g_df = g_df.drop(columns=['jday'])
+
+    if table_name in soil_tables:
+        g_df['Date_Time'] = soil_days_to_timestamp(g_df['Date_time'])
+        g_df = g_df.drop(columns=['Date', 'Date_time'])
+        if table_name in g03_tables:
+            g_df = g_df.drop(columns=['Area', 'Vx', 'Vy'])
+    return g_df
+
+
+def read_column_types(table_name: str, session: Any) -> dict:
+    '''
+    Column name -> data type of a table.
+    '''
+    query = text("""
+        SELECT column_name, data_type FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table_name
+    """)
+    return {row[0]: row[1] for row in session.execute(query, {'table_name': table_name})}
+
+
+def copy_frame(table_name: str, g_df: pd.DataFrame, session: Any) -> int:
+    '''
+    Load a DataFrame with COPY FROM STDIN on the session's connection. The
+    caller owns the transaction.
+    Input:
+        table_name
+        g_df
+    Output:
+        number of rows loaded
+    '''
+    if g_df.empty:
+        return 0
+    g_df = g_df.copy()
+    types = read_column_types(table_name, session)
+    for col in g_df.columns:
+        if pd.api.types.is_datetime64_any_dtype(g_df[col]):
+            g_df[col] = format_timestamps(g_df[col])
+        elif types.get(col) in ('integer', 'bigint', 'smallint') and pd.api.types.is_float_dtype(g_df[col]):
+            # COPY does not accept "12.0" for integer columns
+            g_df[col] = g_df[col].round().astype('Int64')
+    columns = ", ".join(f'"{col}"' for col in g_df.columns)
+    dbapi_conn = session.connection().connection.driver_connection
+    with dbapi_conn.cursor() as cur:
+        with cur.copy(f'COPY "{table_name}" ({columns}) FROM STDIN (FORMAT csv)') as copy:
+            for start in range(0, len(g_df), copy_chunk_rows):
+                buf = io.StringIO()
+                g_df.iloc[start:start + copy_chunk_rows].to_csv(buf, header=False, index=False)
+                copy.write(buf.getvalue())
+    return len(g_df)
+
+
+def store_simulation_grid(grdFile: str, grd_df: pd.DataFrame, grd_hash: str, g03_df: pd.DataFrame,
+                          simulation: Any, session: Any) -> int:
+    '''
+    Store the grid of a run once per .grd content and point the run at it.
+    Nodes and elements are only built for a grid not stored yet. The caller
+    owns the transaction.
+    Input:
+      grdFile: the .grd file
+      grd_df, grd_hash: as returned by read_grd
+      g03_df: G03 output as read by read_output_file
+      simulation: pastrun id
+    Output:
+      soil_grid id
+    '''
+    grid_id = read_grid_id(grd_hash, session)
+    if grid_id is None:
+        grid_id = store_grid(grd_hash, grid_nodes(grd_df, g03_df), session, read_grd_elements(grdFile))
+    link_simulation_grid(simulation, grid_id, session)
+    return grid_id
+
+
+def checkNaNInOutputFrame(table_name: str, g_name: str, g_df: pd.DataFrame) -> str:
+    '''
+  Check output data for NaN values.
+    table_name
+    g_name = input filename with full path
+    g_df = the file as read by read_output_file
+  Output:
+    message listing the columns and dates with NaN values, "" if there are none
+    '''
+    spaceStr = ", "
+    nan_mask = g_df.isna()
+    columnList = list(g_df.columns[nan_mask.any(axis=0).to_numpy()])
+    if not columnList:
+        return ""
+    # Dates of the rows where the first column with NaN values has them
+    rows = nan_mask[columnList[0]].to_numpy()
+    date = ""
+    if 'date' in g_df.columns and 'time' in g_df.columns:
+        stamps = date_hour_to_timestamp(g_df['date'][rows], g_df['time'][rows])
+        date = "Date:" + spaceStr.join(stamps.dt.strftime('%m/%d/%Y')) + "<br>\n"
+    elif 'Date_time' in g_df.columns:
+        stamps = pd.Timestamp('1899-12-30') + pd.to_timedelta(g_df['Date_time'][rows], unit='D')
+        date = "Date:" + spaceStr.join(stamps.dt.strftime('%m/%d/%Y')) + "<br>\n"
+    return g_name + ": " + spaceStr.join(columnList) + "<br>\n" + date
+
+
+def ingestSimulationOutputs(outputs: list, simulation: str, session: Any, grdFile: str = None) -> tuple[bool, str]:
+    '''
+    Validate and load every output file of a run. Each file is parsed once;
+    the NaN check, the grid nodes and the COPY all work on that frame.
+    Everything is loaded in one transaction, so a run is either fully
+    ingested or not at all.
+    Input:
+      outputs: list of (table_name, file path)
+      simulation: pastrun id
+      grdFile: .grd file, the grid of the run is stored with the g03 file when given
+    Output:
+      (True if all files were ingested, NaN report of the files)
+    Per-node outputs (G03/G04/G07) go to soil_node_arrays, the cropOutput
+    tables or both, following SOIL_NODE_STORAGE; packing needs grdFile.
+    With OUTPUT_ARCHIVE_ENABLED every file is also kept as Parquet, published
+    once the transaction commits. The row range of every timestep of a
+    per-node output goes to soil_node_index.
+    '''
+    started = time.perf_counter()
+    missingRec = ""
+    ok = True
+    total_rows = 0
+    storage = settings.SOIL_NODE_STORAGE if grdFile is not None else "rows"
+    grd_df = grd_hash = None
+    archive = OutputArchive(simulation) if settings.OUTPUT_ARCHIVE_ENABLED else None
+    for table_name, g_name in outputs:
+        try:
+            g_df = read_output_file(g_name)
+        except Exception as e:
+            logger.error(f"Error while reading output file {g_name}: {e}")
+            ok = False
+            break
+        missingRec += checkNaNInOutputFrame(table_name, g_name, g_df)
+        if missingRec != "":
+            # Keep checking the remaining files for the report, load nothing
+            continue
+        try:
+            file_started = time.perf_counter()
+            if grdFile is not None and grd_df is None:
+                grd_df, grd_hash = read_grd(grdFile)
+            if grdFile is not None and table_name in g03_tables:
+                store_simulation_grid(grdFile, grd_df, grd_hash, g_df, simulation, session)
+            out_df = prepare_output_frame(table_name, g_df, simulation)
+            as_arrays = storage != "rows" and node_output(table_name) is not None
+            rows = 0
+            if as_arrays:
+                rows += copy_node_arrays(pack_node_frame(table_name, out_df, grd_df, simulation), session)
+            if not as_arrays or storage == "both":
+                rows += copy_frame(table_name, out_df, session)
+            if archive is not None:
+                archive.add(table_name, out_df)
+            copy_timestep_index(table_name, out_df, simulation, session)
+            del out_df
+            total_rows += rows
+            elapsed = time.perf_counter() - file_started
+            logger.info(f"Ingested {rows} rows into {table_name} in {elapsed:.2f}s "
+                        f"({rows / elapsed if elapsed > 0 else 0:.0f} rows/s)")
+        except Exception as e:
+            logger.exception(f"Error while ingesting output file {g_name}: {e}")
+            ok = False
+            break
+        finally:
+            del g_df
+    if ok and missingRec == "":
+        session.commit()
+        if archive is not None:
+            try:
+                archive.publish()
+            except OSError as e:
+                logger.warning(f"Failed to archive outputs of simulation {simulation}: {e}")
+        elapsed = time.perf_counter() - started
+        logger.info(f"Simulation {simulation} outputs ingested: {total_rows} rows in {elapsed:.2f}s "
+                    f"({total_rows / elapsed if elapsed > 0 else 0:.0f} rows/s)")
+        return True, missingRec
+    session.rollback()
+    if archive is not None:
+        archive.discard()
+    return False, missingRec
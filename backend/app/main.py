@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI, Request, Query, HTTPException
 from fastapi.routing import APIRoute
@@ -9,6 +11,7 @@ import requests
 from app.api.main import api_router
 from app.core.config import settings
 from app.core import security
+from app.simulation_worker import SimulationWorkerPool
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -20,8 +23,20 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Seasonal simulations run in worker processes, never inside the API
+    # process. The embedded pool is off unless SIMULATION_WORKERS is set; the
+    # worker service drains the queue otherwise.
+    pool = SimulationWorkerPool()
+    pool.start()
+    yield
+    pool.stop()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -36,6 +51,8 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Binary soil 2D responses describe their layout in these headers
+        expose_headers=["X-Node-Count", "X-Raster-Width", "X-Raster-Height", "X-Raster-Extent", "X-Rejected-Rows", "ETag"],
     )
 
 
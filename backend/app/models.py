@@ -1,8 +1,9 @@
 from sqlmodel import Field, Relationship, SQLModel, Column
-from sqlalchemy import Float, Integer, String, text
+from sqlalchemy import ARRAY, Date, Float, Integer, LargeBinary, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
 from pydantic import BaseModel
 from typing import Optional, List, Any
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from enum import Enum
 
 class GuestType(str, Enum):
@@ -713,6 +714,8 @@ class WeatherMeta(WeatherMetaBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
     stationtype: str | None = None  # type: ignore
     owner_id: int | None = Field(default=None, foreign_key="user.id", nullable=False)
+    # Bumped whenever weather_data rows of this station change
+    data_version: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
     owner: User | None = Relationship(back_populates="stations")
 
 class WeatherMetaPublic(WeatherMetaBase):
@@ -851,6 +854,54 @@ class WeatherDatasPublic(SQLModel):
     data: list[WeatherDataPublic]
     count: int
 
+# Hours and extremes of one station day, kept current by the weather ingest
+class WeatherStationDaily(SQLModel, table=True):
+    __tablename__ = 'weather_station_daily'
+    weather_id: str = Field(primary_key=True)
+    day: date = Field(sa_column=Column("date", Date, primary_key=True))
+    stationtype: str = Field(primary_key=True)
+    hours: int
+    srad_min: float | None = None
+    srad_max: float | None = None
+    wind_min: float | None = None
+    wind_max: float | None = None
+    rh_min: float | None = None
+    rh_max: float | None = None
+    rain_min: float | None = None
+    rain_max: float | None = None
+    tmax_min: float | None = None
+    tmax_max: float | None = None
+    tmin_min: float | None = None
+    tmin_max: float | None = None
+    temperature_min: float | None = None
+    temperature_max: float | None = None
+
+# Rollup of weather_station_daily per station
+class WeatherStationStats(SQLModel, table=True):
+    __tablename__ = 'weather_station_stats'
+    weather_id: str = Field(primary_key=True)
+    stationtype: str = Field(primary_key=True)
+    row_count: int
+    days: int
+    complete_days: int
+    first_date: Optional[date] = None
+    last_date: Optional[date] = None
+    srad_min: float | None = None
+    srad_max: float | None = None
+    wind_min: float | None = None
+    wind_max: float | None = None
+    rh_min: float | None = None
+    rh_max: float | None = None
+    rain_min: float | None = None
+    rain_max: float | None = None
+    tmax_min: float | None = None
+    tmax_max: float | None = None
+    tmin_min: float | None = None
+    tmin_max: float | None = None
+    temperature_min: float | None = None
+    temperature_max: float | None = None
+    updated_at: Optional[datetime] = None
+
 ######### Weather tab model End ############## 
 
 
@@ -1918,7 +1969,58 @@ class Pastrun(Pastrunbase, table=True):
     owner_id:int
     status: Optional[int] = None
     odate:  Optional[str] = None
+    queued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    worker: Optional[str] = None
+    batch_id: Optional[int] = None
+    grid_id: Optional[int] = None
    
+
+# Parameter sweep whose members are pastruns rows with this batch_id
+class SimulationBatch(SQLModel, table=True):
+    __tablename__ = 'simulation_batch'
+    id: int | None = Field(default=None, primary_key=True)
+    owner_id: int | None = Field(default=None, foreign_key="user.id", nullable=False)
+    created_at: Optional[datetime] = None
+    members: int = 0
+    parameters: Optional[str] = None
+
+
+# Results of a run, computed once when its outputs are ingested
+class SimulationSummary(SQLModel, table=True):
+    __tablename__ = 'simulation_summary'
+    sim_id: int = Field(primary_key=True, foreign_key="pastruns.id")
+    crop: str
+    yield_: Optional[float] = Field(default=None, sa_column=Column("yield", Float))
+    total_biomass: Optional[float] = None
+    nitrogen_uptake: Optional[float] = None
+    plant_density: Optional[float] = None
+    sowing_date: Optional[date] = None
+    emergence_date: Optional[date] = None
+    tasseled_date: Optional[date] = None
+    silked_date: Optional[date] = None
+    maturity_date: Optional[date] = None
+    harvest_date: Optional[date] = None
+    rstage_dates: Optional[dict] = Field(default=None, sa_column=Column(JSONB))
+    total_n_applied: Optional[float] = None
+    total_irrigation: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+
+# Selection of completed runs to compare: explicit ids and/or a pastruns filter
+class RunComparison(BaseModel):
+    ids: Optional[List[int]] = None
+    batch_id: Optional[int] = None
+    treatment: Optional[str] = None
+    site: Optional[str] = None
+    tempVar: Optional[int] = None
+    rainVar: Optional[int] = None
+    CO2Var: Optional[int] = None
+    baseline: Optional[int] = None
+    variables: List[str] = ["LAI", "biomass"]
+    percentiles: List[float] = [5, 25, 50, 75, 95]
+
 def upgrade():
     op.alter_column('pastruns', 'status', nullable=True)
 def downgrade():
@@ -1968,6 +2070,63 @@ class Geometry(SQLModel, table=True):
     simID: Optional[int] = None
 
 
+# Nodes of a 2DSOIL grid, stored once per .grd content and shared by the
+# runs whose pastruns.grid_id points at it
+class SoilGrid(SQLModel, table=True):
+    __tablename__ = "soil_grid"
+    id: int | None = Field(default=None, primary_key=True)
+    content_hash: str = Field(max_length=64, unique=True)
+    node_count: int
+    elements: Optional[bytes] = None
+    created_at: Optional[datetime] = None
+
+
+class GridNode(SQLModel, table=True):
+    __tablename__ = "grid_node"
+    grid_id: int = Field(foreign_key="soil_grid.id", primary_key=True)
+    nodeNum: int = Field(primary_key=True)
+    X: float
+    Y: float
+    Layer: Optional[int] = None
+    Area: Optional[float] = None
+
+
+# NRCS Soil Data Access lookups cached per map unit and per lon/lat tile
+class NrcsSoilProfile(SQLModel, table=True):
+    __tablename__ = "nrcs_soil_profile"
+    mukey: str = Field(primary_key=True)
+    horizons: Optional[list] = Field(default=None, sa_column=Column(JSONB))
+    fetched_at: Optional[datetime] = None
+
+
+class NrcsSoilTile(SQLModel, table=True):
+    __tablename__ = "nrcs_soil_tile"
+    lon: float = Field(primary_key=True)
+    lat: float = Field(primary_key=True)
+    mukey: Optional[str] = None
+    fetched_at: Optional[datetime] = None
+
+
+# Row range of each timestep of a per-node output in the run's archive
+class SoilNodeIndex(SQLModel, table=True):
+    __tablename__ = "soil_node_index"
+    sim_id: int = Field(foreign_key="pastruns.id", primary_key=True)
+    output: str = Field(max_length=3, primary_key=True)
+    Date_Time: datetime = Field(primary_key=True)
+    row_start: int
+    row_count: int
+
+
+class SoilNodeArray(SQLModel, table=True):
+    __tablename__ = "soil_node_arrays"
+    sim_id: int = Field(primary_key=True)
+    output: str = Field(primary_key=True)
+    Date_Time: datetime = Field(primary_key=True)
+    variables: List[str] = Field(sa_column=Column(ARRAY(Text), nullable=False))
+    node_count: int
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
 # --- Auto-generated SQLModel classes from cropOutput.db.sql ---
 
 
@@ -1981,7 +2140,7 @@ class G01Maize(SQLModel, table=True):
     __tablename__ = "g01_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     g01_maize_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     jday: int | None = None
     Leaves: float | None = None
     MaturLvs: int | None = None
@@ -2027,7 +2186,7 @@ class G03Maize(SQLModel, table=True):
     __tablename__ = "g03_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     g03_maize_id: int | None = Field(default=None)
-    Date_Time: str |None = None
+    Date_Time: datetime | None = None
     X: Optional[float] = None
     Y: Optional[float] = None
     hNew: Optional[float] = None
@@ -2045,7 +2204,7 @@ class G04Maize(SQLModel, table=True):
     __tablename__ = "g04_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     g04_maize_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Node: float | None = None
@@ -2062,7 +2221,7 @@ class G05Maize(SQLModel, table=True):
     __tablename__ = "g05_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     g05_maize_id: int = Field(primary_key=True)
-    Date_Time: str | None=None
+    Date_Time: datetime | None = None
     PSoilEvap: float | None = None
     ASoilEVap: float | None = None
     PET_PEN: float | None = None
@@ -2091,7 +2250,7 @@ class G07Maize(SQLModel, table=True):
     __tablename__ = "g07_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     g07_maize_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Humus_N: float | None = None
@@ -2107,7 +2266,7 @@ class PlantStressMaize(SQLModel, table=True):
     __tablename__ = "plantStress_maize"
     id: Optional[int] = Field(default=None, primary_key=True)
     plantStress_maize_id: int | None = Field(default=None)
-    Date_Time: str | None=None
+    Date_Time: datetime | None = None
     waterstress: float | None = None
     N_stress: float | None = None
     Shade_Stress: float | None = None
@@ -2120,7 +2279,7 @@ class G01Potato(SQLModel, table=True):
     __tablename__ = "g01_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     g01_potato_id: int | None = Field(default=None)
-    Date_Time: str
+    Date_Time: datetime
     jday: int
     LA_pl: float | None = None
     LAI: float | None = None
@@ -2156,7 +2315,7 @@ class G03Potato(SQLModel, table=True):
     __tablename__ = "g03_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     g03_potato_id: int | None = Field(default=None)
-    Date_Time: str |None= None
+    Date_Time: datetime | None = None
     X: Optional[float] = None
     Y: Optional[float] = None
     hNew: Optional[float] = None
@@ -2176,7 +2335,7 @@ class G04Potato(SQLModel, table=True):
     __tablename__ = "g04_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     g04_potato_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Node: int | None = None
@@ -2193,7 +2352,7 @@ class G05Potato(SQLModel, table=True):
     __tablename__ = "g05_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     g05_potato_id: int | None = Field(default=None)
-    Date_Time: str
+    Date_Time: datetime
     PSoilEvap: float | None = None
     ASoilEVap: float | None = None
     PET_PEN: float | None = None
@@ -2223,7 +2382,7 @@ class G07Potato(SQLModel, table=True):
     __tablename__ = "g07_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     g07_potato_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Humus_N: float | None = None
@@ -2240,7 +2399,7 @@ class NitrogenPotato(SQLModel, table=True):
     __tablename__ = "nitrogen_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     nitrogen_potato_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     tot_N: float | None = None
     leaf_N: float | None = None
     stem_N: float | None = None
@@ -2262,7 +2421,7 @@ class PlantStressPotato(SQLModel, table=True):
     __tablename__ = "plantStress_potato"
     id: Optional[int] = Field(default=None, primary_key=True)
     plantStress_potato_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     waterstressfactor: float | None = None
     PSIEffect_leaf: int | None = None
     NEffect_leaf: float | None = None
@@ -2283,7 +2442,7 @@ class G01Cotton(SQLModel, table=True):
     __tablename__ = "g01_cotton"
     id: Optional[int] = Field(default=None, primary_key=True)
     g01_cotton_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     PlantH: float | None = None
     LAI: float | None = None
     LInt: float | None = None
@@ -2345,7 +2504,7 @@ class G03Cotton(SQLModel, table=True):
     __tablename__ = "g03_cotton"
     id: Optional[int] = Field(default=None, primary_key=True)
     g03_cotton_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     hNew: float | None = None
@@ -2363,7 +2522,7 @@ class G04Cotton(SQLModel, table=True):
     __tablename__ = "g04_cotton"
     id: Optional[int] = Field(default=None, primary_key=True)
     g04_cotton_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Node: int | None = None
@@ -2380,7 +2539,7 @@ class G05Cotton(SQLModel, table=True):
     __tablename__ = "g05_cotton"
     id: Optional[int] = Field(default=None, primary_key=True)
     g05_cotton_id: int | None = Field(default=None)
-    Date_Time: str
+    Date_Time: datetime
     PSoilEvap: float | None = None
     ASoilEVap: float | None = None
     PET_PEN: float | None = None
@@ -2410,7 +2569,7 @@ class G07Cotton(SQLModel, table=True):
     __tablename__ = "g07_cotton"
     id: Optional[int] = Field(default=None, primary_key=True)
     g07_cotton_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Humus_N: float | None = None
@@ -2442,7 +2601,7 @@ class G01Soybean(SQLModel, table=True):
     __tablename__ = "g01_soybean"
     id: Optional[int] = Field(default=None, primary_key=True)
     g01_soybean_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     jday: int | None = None
     RSTAGE: float | None = None
     VSTAGE: float | None = None
@@ -2474,7 +2633,7 @@ class G03Soybean(SQLModel, table=True):
     __tablename__ = "g03_soybean"
     id: Optional[int] = Field(default=None, primary_key=True)
     g03_soybean_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     hNew: float | None = None
@@ -2492,7 +2651,7 @@ class G04Soybean(SQLModel, table=True):
     __tablename__ = "g04_soybean"
     id: Optional[int] = Field(default=None, primary_key=True)
     g04_soybean_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Node: int | None = None
@@ -2508,7 +2667,7 @@ class G05Soybean(SQLModel, table=True):
     __tablename__ = "g05_soybean"
     id: Optional[int] = Field(default=None, primary_key=True)
     g05_soybean_id: int = Field(primary_key=True)
-    Date_Time: str
+    Date_Time: datetime
     PSoilEvap: float | None = None
     ASoilEVap: float | None = None
     PET_PEN: float | None = None
@@ -2537,7 +2696,7 @@ class G07Soybean(SQLModel, table=True):
     __tablename__ = "g07_soybean"
     id: Optional[int] = Field(default=None, primary_key=True)
     g07_soybean_id: int | None = Field(default=None)
-    Date_Time: str | None = None
+    Date_Time: datetime | None = None
     X: float | None = None
     Y: float | None = None
     Humus_N: float | None = None
@@ -2586,7 +2745,7 @@ class G03Fallow(SQLModel, table=True):
     __tablename__ = "g03_fallow"
     id: Optional[int] = Field(default=None, primary_key=True)
     g03_fallow_id:int | None = Field(default=None)
-    Date_Time: Optional[float] = None
+    Date_Time: datetime | None = None
     X: Optional[float] = None
     Y: Optional[float] = None
     hNew: Optional[float] = None
@@ -2604,7 +2763,7 @@ class G05Fallow(SQLModel, table=True):
     __tablename__ = "g05_fallow"
     id: Optional[int] = Field(default=None, primary_key=True)
     g05_fallow_id: int | None = Field(default=None)
-    Date_Time: float | None = None
+    Date_Time: datetime | None = None
     PSoilEvap: float | None = None
     ASoilEVap: float | None = None
     PET_PEN: float | None = None
@@ -2633,7 +2792,7 @@ class G07Fallow(SQLModel, table=True):
     __tablename__ = "g07_fallow"
     id: Optional[int] = Field(default=None, primary_key=True)
     g07_fallow_id: int | None = Field(default=None)
-    Date_Time: str
+    Date_Time: datetime
     X: Optional[float] = None
     Y: Optional[float] = None
     Humus_N: Optional[float] = None
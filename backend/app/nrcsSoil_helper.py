@@ -0,0 +1,279 @@
+import argparse
+import json
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import pandas as pd
+import requests
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SDM columns of a horizon kept in the cache, as named by profile_query
+horizon_columns = ["depth", "OM", "sand", "silt", "clay", "bd", "th33"]
+
+# Layer fields filled from a horizon, the others are model defaults
+layer_fields = {"Bottom_depth": "depth", "OM_pct": "OM", "Sand": "sand", "Silt": "silt", "Clay": "clay",
+                "BD": "bd", "TH33": "th33"}
+
+layer_defaults = {
+    "NO3": 25, "NH4": 4, "HnNew": -200, "initType": "m", "Tmpr": 25, "TH1500": 0.1, "kl": -0.035,
+    "kh": 0.00007, "km": 0.07, "kn": 0.2, "kd": 0.00001, "fe": 0.6, "fh": 0.2, "r0": 10.0, "rL": 50.0,
+    "rm": 10.0, "fa": 0.1, "nq": 8, "cs": 0.00001, "CO2": 400, "O2": 206000, "N2O": 0,
+}
+
+layer_order = ["Bottom_depth", "OM_pct", "NO3", "NH4", "HnNew", "initType", "Tmpr", "Sand", "Silt", "Clay",
+               "BD", "TH33", "TH1500", "kl", "kh", "km", "kn", "kd", "fe", "fh", "r0", "rL", "rm", "fa", "nq",
+               "cs", "CO2", "O2", "N2O"]
+
+
+def sdm_soap_body(query: str) -> str:
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+            <soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" xmlns:sdm="http://SDMDataAccess.nrcs.usda.gov/Tabular/SDMTabularService.asmx">
+            <soap:Header/>
+            <soap:Body>
+                <sdm:RunQuery>
+                    <sdm:Query>{query}
+                    </sdm:Query>
+                </sdm:RunQuery>
+            </soap:Body>
+            </soap:Envelope>"""
+
+
+def mukey_query(lon: float, lat: float) -> str:
+    return f"SELECT * from SDA_Get_Mukey_from_intersection_with_WktWgs84('point({lon} {lat})')"
+
+
+def profile_query(mukeys: list) -> str:
+    keys = ", ".join(f"'{mukey}'" for mukey in mukeys)
+    return f"""SELECT co.cokey as cokey, ch.chkey as chkey, comppct_r as prcent, slope_r, slope_h as slope, hzname, hzdepb_r as depth,
+                                awc_r as awc, claytotal_r as clay, silttotal_r as silt, sandtotal_r as sand, om_r as OM, dbthirdbar_r as dbthirdbar,
+                                wthirdbar_r/100 as th33, (dbthirdbar_r-(wthirdbar_r/100)) as bd FROM sacatalog sc
+                                FULL OUTER JOIN legend lg  ON sc.areasymbol=lg.areasymbol
+                                FULL OUTER JOIN mapunit mu ON lg.lkey=mu.lkey
+                                FULL OUTER JOIN component co ON mu.mukey=co.mukey
+                                FULL OUTER JOIN chorizon ch ON co.cokey=ch.cokey
+                                FULL OUTER JOIN chtexturegrp ctg ON ch.chkey=ctg.chkey
+                                FULL OUTER JOIN chtexture ct ON ctg.chtgkey=ct.chtgkey
+                                FULL OUTER JOIN copmgrp pmg ON co.cokey=pmg.cokey
+                                FULL OUTER JOIN corestrictions rt ON co.cokey=rt.cokey
+                                WHERE mu.mukey IN ({keys}) order by co.cokey, ch.chkey, prcent, depth"""
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sdm_tables(content: bytes) -> pd.DataFrame:
+    '''
+    Rows of the Table elements of an SDM RunQuery response. Null values are
+    left out of the response and come back as NaN.
+    Output:
+        DataFrame of strings, empty when the query returned no rows
+    '''
+    rows = [{_local_name(field.tag): field.text for field in element}
+            for element in ET.fromstring(content).iter() if _local_name(element.tag) == "Table"]
+    return pd.DataFrame(rows)
+
+
+def run_sdm_query(query: str) -> pd.DataFrame:
+    '''
+    Run a query on the SDM tabular service.
+    Raises requests.RequestException or ET.ParseError.
+    '''
+    response = requests.post(settings.NRCS_SDM_URL, data=sdm_soap_body(query),
+                             headers={'content-type': 'text/xml'}, timeout=settings.NRCS_SDM_TIMEOUT)
+    response.raise_for_status()
+    return parse_sdm_tables(response.content)
+
+
+def select_horizons(soil_df: pd.DataFrame) -> list:
+    '''
+    Horizons of the main component, the way the profile lookup has always
+    picked them: rows with a chkey and no missing value, of the component
+    with the largest percentage, by depth.
+    Output:
+        list of {column: float} for horizon_columns
+    '''
+    soil_df = soil_df.dropna(axis=1, how='all')
+    if "chkey" not in soil_df.columns:
+        return []
+    soil_df = soil_df[soil_df.chkey.notnull()].drop_duplicates()
+    soil_df = soil_df.astype({'prcent': float, 'depth': float})
+    soil_df = soil_df[soil_df.prcent == soil_df.prcent.max()].sort_values(by=['depth']).dropna()
+    horizons = soil_df.reindex(columns=horizon_columns).apply(pd.to_numeric, errors='coerce')
+    return horizons.astype(object).where(horizons.notna(), None).to_dict('records')
+
+
+def fetch_sdm_mukeys(lon: float, lat: float) -> list:
+    '''
+    Map unit keys at a point, sorted.
+    '''
+    tables = run_sdm_query(mukey_query(lon, lat))
+    if tables.empty:
+        return []
+    return sorted({str(value) for value in tables.iloc[:, 0].dropna() if str(value).isdigit()})
+
+
+def fetch_sdm_horizons(mukeys: list) -> Optional[list]:
+    '''
+    Horizons of the map units, None when SDM has no data for them.
+    '''
+    tables = run_sdm_query(profile_query(mukeys))
+    if tables.empty:
+        return None
+    return select_horizons(tables)
+
+
+def soil_layers(horizons: list) -> list:
+    '''
+    Soil table rows of the NRCS lookup from cached horizons.
+    '''
+    return [{field: horizon[layer_fields[field]] if field in layer_fields else layer_defaults[field]
+             for field in layer_order} for horizon in horizons]
+
+
+def tile_key(lon: float, lat: float) -> tuple:
+    '''
+    Rounded lon/lat of the cache tile holding a point.
+    '''
+    decimals = settings.NRCS_TILE_DECIMALS
+    return round(float(lon), decimals), round(float(lat), decimals)
+
+
+def read_tile_profile(tile: tuple, session: Any) -> Optional[dict]:
+    '''
+    Cached map unit of a tile and its horizons.
+    Output:
+        dict with mukey, horizons and fetched_at (the older of the tile and
+        profile dates); None when the tile or its profile is not cached
+    '''
+    row = session.execute(text("""
+        SELECT t.mukey, p.horizons, LEAST(t.fetched_at, COALESCE(p.fetched_at, t.fetched_at)) AS fetched_at,
+               t.mukey IS NULL OR p.mukey IS NOT NULL AS complete
+          FROM nrcs_soil_tile t LEFT JOIN nrcs_soil_profile p ON p.mukey = t.mukey
+         WHERE t.lon = :lon AND t.lat = :lat
+    """), {'lon': tile[0], 'lat': tile[1]}).fetchone()
+    if row is None or not row.complete:
+        return None
+    return {'mukey': row.mukey, 'horizons': row.horizons, 'fetched_at': row.fetched_at}
+
+
+def read_mukey_profile(mukey: str, session: Any) -> Optional[dict]:
+    row = session.execute(text("""SELECT horizons, fetched_at FROM nrcs_soil_profile WHERE mukey = :mukey"""),
+                          {'mukey': mukey}).fetchone()
+    return None if row is None else {'mukey': mukey, 'horizons': row.horizons, 'fetched_at': row.fetched_at}
+
+
+def store_tile(tile: tuple, mukey: Optional[str], session: Any) -> None:
+    session.execute(text("""
+        INSERT INTO nrcs_soil_tile (lon, lat, mukey, fetched_at) VALUES (:lon, :lat, :mukey, now())
+        ON CONFLICT (lon, lat) DO UPDATE SET mukey = EXCLUDED.mukey, fetched_at = EXCLUDED.fetched_at
+    """), {'lon': tile[0], 'lat': tile[1], 'mukey': mukey})
+
+
+def store_profile(mukey: str, horizons: Optional[list], session: Any) -> None:
+    session.execute(text("""
+        INSERT INTO nrcs_soil_profile (mukey, horizons, fetched_at) VALUES (:mukey, CAST(:horizons AS jsonb), now())
+        ON CONFLICT (mukey) DO UPDATE SET horizons = EXCLUDED.horizons, fetched_at = EXCLUDED.fetched_at
+    """), {'mukey': mukey, 'horizons': None if horizons is None else json.dumps(horizons)})
+
+
+def is_fresh(entry: Optional[dict], now: Optional[datetime] = None) -> bool:
+    if entry is None:
+        return False
+    now = now or datetime.now()
+    return entry['fetched_at'] >= now - timedelta(days=settings.NRCS_CACHE_TTL_DAYS)
+
+
+def lookup_horizons(lon: float, lat: float, session: Any, refresh: bool = False) -> tuple:
+    '''
+    Horizons of the main soil component at a point. The tile of the point
+    and its map unit are cached; SDM is asked only for tiles not cached or
+    older than NRCS_CACHE_TTL_DAYS, and for the profile of a map unit not
+    cached yet. When SDM cannot be reached, or with NRCS_OFFLINE, a stale
+    entry is used. Commits what it fetched.
+    Input:
+        refresh: ask SDM even for a fresh tile
+    Output:
+        (list of horizons or None when there is no data, source: 'cache',
+        'sdm', 'stale' or 'none')
+    '''
+    tile = tile_key(lon, lat)
+    cached = read_tile_profile(tile, session)
+    if cached is not None and (settings.NRCS_OFFLINE or (not refresh and is_fresh(cached))):
+        return cached['horizons'], 'cache'
+    if settings.NRCS_OFFLINE:
+        return None, 'none'
+    try:
+        mukeys = fetch_sdm_mukeys(lon, lat)
+        mukey = ",".join(mukeys) if mukeys else None
+        profile = read_mukey_profile(mukey, session) if mukey is not None else None
+        if mukey is not None and (refresh or not is_fresh(profile)):
+            profile = {'horizons': fetch_sdm_horizons(mukeys)}
+            store_profile(mukey, profile['horizons'], session)
+        store_tile(tile, mukey, session)
+        session.commit()
+    except (requests.RequestException, ET.ParseError, KeyError, ValueError, TypeError) as e:
+        # An unreachable service or an answer missing columns or holding
+        # values that do not parse; the caller falls back to default soil
+        session.rollback()
+        logger.warning(f"SDM lookup at {lon} {lat} failed: {e}")
+        if cached is not None:
+            return cached['horizons'], 'stale'
+        return None, 'none'
+    return (profile['horizons'] if profile is not None else None), 'sdm'
+
+
+def prewarm(points: list, session: Any, refresh: bool = False) -> dict:
+    '''
+    Fill the cache for a list of (lon, lat) points, one SDM lookup per tile.
+    Output:
+        count of points per source
+    '''
+    counts: dict = {}
+    seen = set()
+    for lon, lat in points:
+        tile = tile_key(lon, lat)
+        if tile in seen:
+            source = 'cache'
+        else:
+            seen.add(tile)
+            source = lookup_horizons(lon, lat, session, refresh)[1]
+        counts[source] = counts.get(source, 0) + 1
+    return counts
+
+
+def main() -> None:
+    from sqlmodel import Session
+
+    from app.core.db import engine
+
+    parser = argparse.ArgumentParser(description="Pre-warm the NRCS soil profile cache")
+    parser.add_argument("sites", nargs="*", type=int, help="site ids")
+    parser.add_argument("--all-sites", action="store_true", help="every site with coordinates")
+    parser.add_argument("--csv", help="CSV file with lon and lat columns")
+    parser.add_argument("--refresh", action="store_true", help="ask SDM even for fresh tiles")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with Session(engine) as session:
+        points = []
+        if args.sites or args.all_sites:
+            rows = session.execute(text("""
+                SELECT rlon, rlat FROM site
+                 WHERE rlon IS NOT NULL AND rlat IS NOT NULL AND (:all OR id = ANY(:ids))
+            """), {'all': args.all_sites, 'ids': args.sites}).fetchall()
+            points += [(row[0], row[1]) for row in rows]
+        if args.csv:
+            frame = pd.read_csv(args.csv)
+            points += list(zip(frame["lon"], frame["lat"]))
+        counts = prewarm(points, session, args.refresh)
+    logger.info(f"NRCS cache pre-warmed for {len(points)} points: {counts}")
+
+
+if __name__ == "__main__":
+    main()
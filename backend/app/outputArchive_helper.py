@@ -0,0 +1,155 @@
+import logging
+import os
+import shutil
+from typing import Any, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+currentDir = os.getcwd()
+classimDir = os.path.join(currentDir, 'executables')
+archiveDir = settings.OUTPUT_ARCHIVE_DIR or os.path.join(classimDir, 'archive')
+
+# Small enough that a time-filtered read skips most of a season
+archive_row_group_rows = 65536
+
+
+def archive_path(sim_id: Any) -> str:
+    '''
+    Directory holding the Parquet files of one run.
+    '''
+    sim_id = int(sim_id)
+    return os.path.join(archiveDir, f"{sim_id % 1000:03d}", str(sim_id))
+
+
+def archive_file(sim_id: Any, table_name: str) -> str:
+    return os.path.join(archive_path(sim_id), f"{table_name}.parquet")
+
+
+class OutputArchive:
+    '''
+    Parquet copy of the outputs of one run, written while the run is
+    ingested. Files go to a staging directory and are published with one
+    rename after the database transaction commits, so a failed ingest
+    leaves no partial archive behind.
+    '''
+
+    def __init__(self, sim_id: Any):
+        self.final = archive_path(sim_id)
+        self.staging = self.final + ".tmp"
+        self.tables: list = []
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def add(self, table_name: str, g_df: pd.DataFrame) -> None:
+        '''
+        Write one output table. The frame is the one loaded into the
+        cropOutput table; its simulation id column is dropped.
+        '''
+        frame = g_df.drop(columns=[table_name + "_id"], errors="ignore")
+        if "Date_Time" in frame.columns:
+            frame = frame.sort_values("Date_Time", kind="stable")
+        os.makedirs(self.staging, exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table, os.path.join(self.staging, f"{table_name}.parquet"),
+                       compression="zstd", row_group_size=archive_row_group_rows)
+        self.tables.append(table_name)
+
+    def publish(self) -> None:
+        if not self.tables:
+            return
+        shutil.rmtree(self.final, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.final), exist_ok=True)
+        os.rename(self.staging, self.final)
+        logger.info(f"Archived {', '.join(self.tables)} to {self.final}")
+
+    def discard(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def delete_archive(sim_id: Any) -> None:
+    '''
+    Remove the Parquet files of a run.
+    '''
+    shutil.rmtree(archive_path(sim_id), ignore_errors=True)
+
+
+def read_archive_table(sim_id: Any, table_name: str, columns: Optional[list] = None,
+                       start: Any = None, end: Any = None) -> Optional[pa.Table]:
+    '''
+    Columns of an archived output table, optionally between two timestamps.
+    Only the requested columns and the row groups overlapping the window are
+    read from disk.
+    Input:
+        sim_id: pastrun id
+        table_name: cropOutput table name, e.g. g01_maize
+        columns: column names, None for all; Date_Time is always included
+        start, end: optional inclusive Date_Time bounds
+    Output:
+        pyarrow Table, None when the run has no archive for the table
+    Raises KeyError for unknown columns.
+    '''
+    path = archive_file(sim_id, table_name)
+    if not os.path.exists(path):
+        return None
+    schema = pq.read_schema(path)
+    if columns:
+        unknown = [col for col in columns if col not in schema.names]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        if "Date_Time" in schema.names and "Date_Time" not in columns:
+            columns = ["Date_Time"] + list(columns)
+    filters = []
+    if "Date_Time" in schema.names:
+        if start is not None:
+            filters.append(("Date_Time", ">=", pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            filters.append(("Date_Time", "<=", pd.Timestamp(end).to_pydatetime()))
+    return pq.read_table(path, columns=columns or None, filters=filters or None)
+
+
+def read_archive_rows(sim_id: Any, table_name: str, columns: list, row_start: int,
+                      row_count: int) -> Optional[pa.Table]:
+    '''
+    A contiguous range of rows of an archived output table. Only the row
+    groups holding the range are read.
+    Input:
+        row_start, row_count: position in the file, which is sorted by Date_Time
+    Output:
+        pyarrow Table, None when the run has no archive for the table
+    Raises KeyError for unknown columns.
+    '''
+    path = archive_file(sim_id, table_name)
+    if not os.path.exists(path):
+        return None
+    parquet = pq.ParquetFile(path)
+    unknown = [col for col in columns if col not in parquet.schema_arrow.names]
+    if unknown:
+        raise KeyError(", ".join(unknown))
+    groups = []
+    first_row = group_start = 0
+    for group in range(parquet.metadata.num_row_groups):
+        group_rows = parquet.metadata.row_group(group).num_rows
+        if group_start + group_rows > row_start and group_start < row_start + row_count:
+            if not groups:
+                first_row = group_start
+            groups.append(group)
+        group_start += group_rows
+    if not groups:
+        return parquet.schema_arrow.empty_table().select(columns)
+    table = parquet.read_row_groups(groups, columns=columns)
+    return table.slice(row_start - first_row, row_count)
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    '''
+    Serialize a table as an Arrow IPC stream.
+    '''
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
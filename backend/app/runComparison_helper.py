@@ -0,0 +1,159 @@
+from typing import Any, Optional
+
+from sqlalchemy.sql import text
+
+from app.simulationSummary_helper import store_simulation_summary
+
+# Summary values aggregated across runs
+summary_metrics = ["yield", "total_biomass", "nitrogen_uptake"]
+
+# g01 column holding the plant biomass of each crop
+biomass_columns = {"maize": "shootDM", "potato": "totalDM", "soybean": "totalDM", "cotton": "PlantDM"}
+
+# Spread of the daily values across runs
+daily_fractions = [0.1, 0.9]
+
+
+def select_comparison_runs(request: Any, owner_id: int, session: Any) -> list:
+    '''
+    Completed runs of a user matching a RunComparison selection.
+    Output:
+        list of (id, treatment, site, tempVar, rainVar, CO2Var), ordered by id
+    '''
+    query = text("""
+        SELECT id, treatment, site, "tempVar", "rainVar", "CO2Var" FROM pastruns
+         WHERE owner_id = :owner AND status = 101
+           AND (CAST(:ids AS integer[]) IS NULL OR id = ANY(:ids))
+           AND (CAST(:batch_id AS integer) IS NULL OR batch_id = :batch_id)
+           AND (CAST(:treatment AS varchar) IS NULL OR treatment = :treatment)
+           AND (CAST(:site AS varchar) IS NULL OR site = :site)
+           AND (CAST(:temp AS integer) IS NULL OR "tempVar" = :temp)
+           AND (CAST(:rain AS integer) IS NULL OR "rainVar" = :rain)
+           AND (CAST(:co2 AS integer) IS NULL OR "CO2Var" = :co2)
+         ORDER BY id
+    """)
+    return session.execute(query, {
+        'owner': owner_id, 'ids': request.ids, 'batch_id': request.batch_id, 'treatment': request.treatment,
+        'site': request.site, 'temp': request.tempVar, 'rain': request.rainVar, 'co2': request.CO2Var,
+    }).fetchall()
+
+
+def ensure_summaries(ids: list, session: Any) -> None:
+    '''
+    Store the summary of runs ingested before simulation_summary existed.
+    '''
+    query = text("""
+        SELECT id FROM unnest(CAST(:ids AS integer[])) AS id
+         WHERE NOT EXISTS (SELECT 1 FROM simulation_summary s WHERE s.sim_id = id)
+    """)
+    for (sim_id,) in session.execute(query, {'ids': ids}).fetchall():
+        store_simulation_summary(sim_id, session)
+
+
+def summary_statistics(ids: list, percentiles: list, session: Any) -> dict:
+    '''
+    Distribution of the summary metrics across runs, one query.
+    Output:
+        {metric: {count, mean, std, min, max, percentiles: {p: value}}}
+    '''
+    fractions = [p / 100 for p in percentiles]
+    aggregates = ", ".join(
+        f"count({m}), avg({m}), stddev_samp({m}), min({m}), max({m}), "
+        f"percentile_cont(CAST(:fractions AS float8[])) WITHIN GROUP (ORDER BY {m})"
+        for m in summary_metrics)
+    row = session.execute(text(f"""SELECT {aggregates} FROM simulation_summary WHERE sim_id = ANY(:ids)"""),
+                          {'ids': ids, 'fractions': fractions}).fetchone()
+    result = {}
+    for i, metric in enumerate(summary_metrics):
+        count, mean, std, low, high, values = row[i * 6:(i + 1) * 6]
+        result[metric] = {"count": count, "mean": mean, "std": std, "min": low, "max": high,
+                          "percentiles": dict(zip(percentiles, values or [None] * len(percentiles)))}
+    return result
+
+
+def run_deltas(ids: list, baseline: Optional[int], session: Any) -> list:
+    '''
+    Summary of every run and its difference to the baseline run.
+    Output:
+        list of dicts with the summary metrics, and delta_<metric> and
+        delta_<metric>_pct when there is a baseline
+    '''
+    deltas = ", ".join(f"s.{m} - b.{m} AS delta_{m}, "
+                       f"CAST(round(CAST(100 * (s.{m} - b.{m}) / NULLIF(b.{m}, 0) AS numeric), 2) AS float8) AS delta_{m}_pct"
+                       for m in summary_metrics)
+    query = text(f"""
+        SELECT s.sim_id, s.crop, {", ".join(f"s.{m}" for m in summary_metrics)}, {deltas}
+          FROM simulation_summary s
+          LEFT JOIN simulation_summary b ON b.sim_id = :baseline
+         WHERE s.sim_id = ANY(:ids)
+         ORDER BY s.sim_id
+    """)
+    rows = session.execute(query, {'ids': ids, 'baseline': baseline}).fetchall()
+    result = []
+    for row in rows:
+        values = dict(row._mapping)
+        if baseline is None:
+            values = {key: value for key, value in values.items() if not key.startswith("delta_")}
+        result.append(values)
+    return result
+
+
+def output_columns(table_name: str, session: Any) -> set:
+    query = text("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table_name
+    """)
+    return {row[0] for row in session.execute(query, {'table_name': table_name})}
+
+
+def daily_statistics(crop: str, ids: list, variables: list, baseline: Optional[int], session: Any) -> Optional[dict]:
+    '''
+    Daily mean and spread of g01 variables across the runs of one crop. Each
+    run contributes its daily mean; the runs are then aggregated per day,
+    all in one query.
+    Input:
+        crop: crop of every run in ids
+        variables: g01 columns; 'biomass' stands for the crop's biomass column
+        baseline: optional run whose daily values and differences are added
+    Output:
+        {"dates": [...], variable: {"runs", "mean", "std", "min", "max", "p10",
+        "p90"[, "baseline", "delta"]}}, None if a variable is not a column
+    '''
+    table_name = f"g01_{crop}"
+    columns = [biomass_columns.get(crop) if var == "biomass" else var for var in variables]
+    available = output_columns(table_name, session)
+    if not available or any(col not in available for col in columns):
+        return None
+    daily = ", ".join(f'avg("{col}") AS v{i}' for i, col in enumerate(columns))
+    aggregates = ", ".join(
+        f"count(d.v{i}), avg(d.v{i}), stddev_samp(d.v{i}), min(d.v{i}), max(d.v{i}), "
+        f"percentile_cont(CAST(:fractions AS float8[])) WITHIN GROUP (ORDER BY d.v{i}), max(b.v{i})"
+        for i in range(len(columns)))
+    query = text(f"""
+        WITH daily AS (
+            SELECT "{table_name}_id" AS sim_id, date_trunc('day', "Date_Time") AS day, {daily}
+              FROM "{table_name}"
+             WHERE "{table_name}_id" = ANY(:all_ids)
+             GROUP BY 1, 2)
+        SELECT d.day, {aggregates}
+          FROM daily d
+          LEFT JOIN daily b ON b.sim_id = :baseline AND b.day = d.day
+         WHERE d.sim_id = ANY(:ids)
+         GROUP BY d.day
+         ORDER BY d.day
+    """)
+    all_ids = list(ids) + ([baseline] if baseline is not None else [])
+    rows = session.execute(query, {'ids': ids, 'all_ids': all_ids, 'baseline': baseline,
+                                   'fractions': daily_fractions}).fetchall()
+    result = {"dates": [row[0].date().isoformat() for row in rows]}
+    for i, var in enumerate(variables):
+        stats = [row[1 + i * 7:1 + (i + 1) * 7] for row in rows]
+        values = {"runs": [s[0] for s in stats], "mean": [s[1] for s in stats], "std": [s[2] for s in stats],
+                  "min": [s[3] for s in stats], "max": [s[4] for s in stats],
+                  "p10": [s[5][0] if s[5] else None for s in stats],
+                  "p90": [s[5][1] if s[5] else None for s in stats]}
+        if baseline is not None:
+            values["baseline"] = [s[6] for s in stats]
+            values["delta"] = [s[1] - s[6] if s[1] is not None and s[6] is not None else None for s in stats]
+        result[var] = values
+    return result
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import re
+import resource
+import time
+from typing import Any, Callable, Optional
+
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+progress_re = re.compile(rb"[-+]?\d*\.\d+|\d+")
+
+
+class RunResult:
+    '''
+    Outcome of a supervised executable.
+    '''
+    def __init__(self, returncode, stderr, timed_out=False, elapsed=0.0):
+        self.returncode = returncode
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+
+class ProgressThrottle:
+    '''
+    Forward model progress to a callback at most once per min_interval seconds,
+    and only when the value moved by at least min_delta percent. The last value
+    seen is always flushed when the run ends.
+    '''
+    def __init__(self, callback: Callable[[int], Any], min_interval=1.0, min_delta=1):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.last_value = None
+        self.last_time = 0.0
+        self.pending = None
+
+    def update(self, value: int):
+        now = time.monotonic()
+        if self.last_value is not None and abs(value - self.last_value) < self.min_delta:
+            return
+        if self.last_value is None or now - self.last_time >= self.min_interval:
+            self._send(value, now)
+        else:
+            self.pending = value
+
+    def flush(self):
+        if self.pending is not None and self.pending != self.last_value:
+            self._send(self.pending, time.monotonic())
+
+    def _send(self, value, now):
+        self.pending = None
+        self.last_value = value
+        self.last_time = now
+        try:
+            self.callback(value)
+        except Exception as e:
+            logger.error(f"Progress callback failed: {e}")
+
+
+def set_run_status(status: int, simulation_id: int, session: Any) -> None:
+    '''
+    Single UPDATE of pastruns.status, used for the frequent progress writes.
+    Input:
+        status
+        simulation_id
+    '''
+    session.execute(text("""UPDATE pastruns SET status = :status WHERE id = :id"""),
+                    {'status': status, 'id': simulation_id})
+    session.commit()
+
+
+def _limit_memory(memory_limit_mb):
+    '''
+    Returns a preexec_fn that caps the child's address space.
+    '''
+    def apply():
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return apply
+
+
+async def _run(args, cwd, timeout, memory_limit_mb, on_progress):
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        preexec_fn=_limit_memory(memory_limit_mb) if memory_limit_mb else None,
+        limit=1024 * 1024)
+
+    throttle = ProgressThrottle(on_progress) if on_progress else None
+
+    async def read_stdout():
+        async for line in proc.stdout:
+            if throttle is not None and b'Progress' in line:
+                prog = progress_re.findall(line)
+                if prog:
+                    throttle.update(int(float(prog[0])))
+
+    async def read_stderr():
+        return await proc.stderr.read()
+
+    timed_out = False
+    stderr = b''
+    try:
+        _, stderr, _ = await asyncio.wait_for(
+            asyncio.gather(read_stdout(), read_stderr(), proc.wait()),
+            timeout=timeout or None)
+    except asyncio.TimeoutError:
+        timed_out = True
+        proc.kill()
+        await proc.wait()
+        logger.warning(f"{args[0]} killed after {timeout}s wall-clock limit")
+    finally:
+        if throttle is not None:
+            throttle.flush()
+    return RunResult(proc.returncode, stderr, timed_out, time.monotonic() - started)
+
+
+def run_supervised(args: list, cwd: Optional[str] = None, timeout: Optional[float] = None,
+                   memory_limit_mb: Optional[int] = None,
+                   on_progress: Optional[Callable[[int], Any]] = None) -> RunResult:
+    '''
+    Run an executable to completion without polling.
+    Input:
+        args - command line
+        cwd - working directory
+        timeout - wall-clock limit in seconds (None/0 for no limit)
+        memory_limit_mb - RLIMIT_AS for the child (None/0 for no limit)
+        on_progress - called with the integer of "Progress" stdout lines, throttled
+    Output:
+        RunResult with returncode, stderr, timed_out and elapsed seconds
+    '''
+    return asyncio.run(_run(args, cwd, timeout, memory_limit_mb, on_progress))
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from app.dbsupport_helper import (
+    read_dispersivity_table,
+    read_irrigationDB,
+    read_operationsDB_id,
+    read_simulation_context,
+    readOpDetails_batch,
+)
+
+
+@dataclass(frozen=True)
+class SimulationInputs:
+    '''
+    Everything the treatment-dependent input writers read from the database
+    for one run, fetched once by load_simulation_inputs.
+    '''
+    crop: str
+    experiment: str
+    treatmentname: str
+    exid: Optional[int]
+    tid: Optional[int]
+    o_t_exid: Optional[int]
+    operations: tuple
+    op_details: Mapping[int, tuple]
+    site: Optional[tuple]
+    max_soil_depth: Any
+    irrigation: tuple
+    dispersivity: Mapping[str, tuple]
+
+    def details(self, operationid: int) -> list:
+        '''
+        Same rows as readOpDetails(operationid, name, session).
+        '''
+        return list(self.op_details.get(operationid, ()))
+
+    def texture_dispersivity(self, texture: str) -> Any:
+        '''
+        Same value as read_dispersivityDB(texture, session).
+        '''
+        if texture == "":
+            return ()
+        return self.dispersivity.get(texture)
+
+
+def load_simulation_inputs(crop: str, experiment: str, treatmentname: str, site: str, soilname: str,
+                           session: Any, current_user_id) -> SimulationInputs:
+    '''
+    Fetch the treatment, operation, site and soil values of a run in a fixed
+    number of queries (ids and scalars, operations, one per operation type,
+    irrigation classes and dispersivity) instead of one per operation.
+    Input:
+        crop, experiment, treatmentname: parts of pastruns.treatment
+        site, soilname
+    Output:
+        SimulationInputs
+    '''
+    context = read_simulation_context(crop, experiment, treatmentname, site, soilname, session, current_user_id)
+    operations = tuple(tuple(op) for op in read_operationsDB_id(context['tid'], session)) \
+        if context['tid'] is not None else ()
+    op_details = readOpDetails_batch(list(operations), session)
+    site_tuple = None
+    if context['site_id'] is not None:
+        site_tuple = (context['site_id'], context['rlat'], context['rlon'], context['altitude'])
+    irrigation = tuple(tuple(row) for row in read_irrigationDB(context['o_t_exid'], session)) \
+        if context['o_t_exid'] is not None else ()
+    return SimulationInputs(
+        crop=crop,
+        experiment=experiment,
+        treatmentname=treatmentname,
+        exid=context['exid'],
+        tid=context['tid'],
+        o_t_exid=context['o_t_exid'],
+        operations=operations,
+        op_details=MappingProxyType({opID: tuple(rows) for opID, rows in op_details.items()}),
+        site=site_tuple,
+        max_soil_depth=context['max_depth'],
+        irrigation=irrigation,
+        dispersivity=MappingProxyType(read_dispersivity_table(session)),
+    )
@@ -0,0 +1,165 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy.sql import text
+
+from app.dbsupport_helper import (
+    getCottonAgronomicData,
+    getMaizeAgronomicData,
+    getMaturityDate,
+    getPotatoAgronomicData,
+    getSoybeanAgronomicData,
+    read_experimentDB_id,
+    read_operationsDB_id,
+    read_treatmentDB_id,
+    readOpDetails_batch,
+)
+
+# g01_maize "Note" values of the development stages kept in the summary
+maize_stages = {"Emerged": "emergence_date", "Tasseled": "tasseled_date",
+                "Silked": "silked_date", "Matured": "maturity_date"}
+
+# Soybean reproductive stages R1..R8
+soybean_rstages = range(1, 9)
+
+summary_columns = ["sim_id", "crop", "yield", "total_biomass", "nitrogen_uptake", "plant_density",
+                   "sowing_date", "emergence_date", "tasseled_date", "silked_date", "maturity_date",
+                   "harvest_date", "rstage_dates", "total_n_applied", "total_irrigation"]
+
+
+def _op_date(value: Any) -> Optional[Any]:
+    # operations.odate is month/day/year text
+    try:
+        return datetime.strptime(value, '%m/%d/%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def read_maize_stage_dates(sim_id: int, session: Any) -> dict:
+    '''
+    First date of every maize development stage, one grouped query.
+    Output:
+        {summary column: date}
+    '''
+    query = text("""
+        SELECT "Note", min("Date_Time") FROM g01_maize
+         WHERE g01_maize_id = :id AND "Note" = ANY(:notes)
+         GROUP BY "Note"
+    """)
+    rows = session.execute(query, {'id': sim_id, 'notes': list(maize_stages)}).fetchall()
+    return {maize_stages[note]: stamp.date() for note, stamp in rows if stamp is not None}
+
+
+def read_soybean_rstage_dates(sim_id: int, session: Any) -> dict:
+    '''
+    First date at or past each reproductive stage, as getSoybeanDevDate.
+    Output:
+        {"R1": 'YYYY-MM-DD', ...} for the stages reached
+    '''
+    query = text("""
+        SELECT s.stage, (SELECT min("Date_Time") FROM g01_soybean
+                          WHERE g01_soybean_id = :id AND "RSTAGE" >= s.stage)
+          FROM unnest(CAST(:stages AS integer[])) AS s(stage)
+    """)
+    rows = session.execute(query, {'id': sim_id, 'stages': list(soybean_rstages)}).fetchall()
+    return {f"R{stage}": stamp.date().isoformat() for stage, stamp in rows if stamp is not None}
+
+
+def compute_simulation_summary(sim_id: int, session: Any) -> dict:
+    '''
+    Yield, biomass, N uptake, phenology dates and management totals of a run,
+    from its treatment and its g01 output. Values match what
+    read_exp_data computed on every view.
+    Input:
+        sim_id = simulation id
+    Output:
+        dict with summary_columns keys
+    '''
+    treatment = session.execute(text("""SELECT treatment FROM pastruns WHERE id = :id"""),
+                                {'id': sim_id}).scalar()
+    cropname, experiment, treatmentname = treatment.split('/')[:3]
+    exid = read_experimentDB_id(cropname, experiment, session)
+    tid = read_treatmentDB_id(exid, treatmentname, session)
+    operations = read_operationsDB_id(tid, session)
+    details = readOpDetails_batch(operations, session)
+
+    summary = dict.fromkeys(summary_columns)
+    summary.update(sim_id=sim_id, crop=cropname, total_n_applied=0.0, total_irrigation=0.0)
+    plantDensity = None
+    HarvestDate = None
+    for opID, name, odate in operations:
+        if name == 'Simulation Start':
+            plantDensity = details[opID][0][3]
+        elif name == 'Sowing':
+            summary['sowing_date'] = _op_date(odate)
+        elif name == 'Emergence':
+            summary['emergence_date'] = _op_date(odate)
+        elif name == 'Harvest':
+            HarvestDate = odate
+            summary['harvest_date'] = _op_date(odate)
+        elif name == 'Fertilizer':
+            for row in details[opID]:
+                if row[5] == "Nitrogen (N)":
+                    summary['total_n_applied'] += float(row[6])
+        elif name == 'Irrigation':
+            for row in details[opID]:
+                if row[3] == "Sprinkler":
+                    summary['total_irrigation'] += float(row[4])
+
+    MaturityDate = "N/A"
+    if cropname == "maize":
+        summary.update(read_maize_stage_dates(sim_id, session))
+        if summary['maturity_date'] is not None:
+            MaturityDate = summary['maturity_date'].strftime('%m/%d/%Y')
+        agroDataTuple = getMaizeAgronomicData(sim_id, MaturityDate if MaturityDate != "N/A" else HarvestDate, session)
+    elif cropname == "potato":
+        MaturityDate = getMaturityDate(sim_id, session)
+        agroDataTuple = getPotatoAgronomicData(sim_id, HarvestDate, session)
+    elif cropname == "soybean":
+        rstages = read_soybean_rstage_dates(sim_id, session)
+        summary['rstage_dates'] = json.dumps(rstages)
+        if "R7" in rstages:
+            MaturityDate = datetime.fromisoformat(rstages["R7"]).strftime('%m/%d/%Y')
+        agroDataTuple = getSoybeanAgronomicData(sim_id, HarvestDate, session)
+    elif cropname == "cotton":
+        agroDataTuple = getCottonAgronomicData(sim_id, session)
+    else:
+        # fallow runs have no crop output
+        agroDataTuple = None
+    if cropname != "maize":
+        summary['maturity_date'] = _op_date(MaturityDate)
+
+    if plantDensity is not None:
+        summary['plant_density'] = float(plantDensity)
+    if plantDensity is not None and agroDataTuple is not None:
+        summary['yield'] = round(float(agroDataTuple[0] or 0) * float(plantDensity) * 10, 2)
+        summary['total_biomass'] = round(float(agroDataTuple[1] or 0) * float(plantDensity) * 10, 2)
+        summary['nitrogen_uptake'] = round(float(agroDataTuple[2] or 0) * float(plantDensity) * 10, 2)
+    return summary
+
+
+def store_simulation_summary(sim_id: int, session: Any) -> dict:
+    '''
+    Compute the summary of a run and upsert it into simulation_summary. Commits.
+    '''
+    summary = compute_simulation_summary(int(sim_id), session)
+    columns = ", ".join(summary_columns)
+    values = ", ".join(f"CAST(:{col} AS jsonb)" if col == "rstage_dates" else f":{col}"
+                       for col in summary_columns)
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in summary_columns if col != "sim_id")
+    session.execute(text(f"""
+        INSERT INTO simulation_summary ({columns}) VALUES ({values})
+        ON CONFLICT (sim_id) DO UPDATE SET {updates}, created_at = now()
+    """), summary)
+    session.commit()
+    return summary
+
+
+def read_simulation_summary(sim_id: int, session: Any) -> Optional[dict]:
+    '''
+    Stored summary of a run, None if it has none yet.
+    '''
+    query = text(f"""SELECT {", ".join(summary_columns)} FROM simulation_summary WHERE sim_id = :id""")
+    row = session.execute(query, {'id': sim_id}).fetchone()
+    return dict(row._mapping) if row is not None else None
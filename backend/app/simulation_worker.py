@@ -0,0 +1,432 @@
+"""
+Out-of-process simulation workers.
+
+Seasonal runs are queued on the pastruns table itself: a run waiting for a
+worker has status STATUS_QUEUED and a queued_at timestamp. Each worker is a
+separate process with its own database session that claims the oldest queued
+run with SELECT ... FOR UPDATE SKIP LOCKED, so several workers (and several
+nodes) can drain the same queue without handing out a run twice. The API
+process only inserts/updates rows and never runs a model itself.
+
+Workers normally run as their own service (the worker service of
+docker-compose.yml), settings.SIMULATION_WORKER_PROCESSES per node:
+
+    python -m app.simulation_worker --workers 4
+
+The FastAPI lifespan (see app.main) can also embed a pool of
+settings.SIMULATION_WORKERS processes in every API process; it is off by
+default, since each uvicorn/gunicorn worker would start its own pool.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Any
+
+from sqlalchemy.sql import text
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+# pastruns.status values used by the queue. 0-100 is the model progress that
+# prepare_and_execute reports while the executable is running.
+STATUS_COMPLETED = 101
+STATUS_QUEUED = 1000
+STATUS_STARTED = 1001
+
+HOSTNAME = socket.gethostname()
+
+
+def worker_name(pid: int | None = None) -> str:
+    '''
+    Name recorded in pastruns.worker for the run a worker process owns.
+    Input:
+        pid (defaults to the current process)
+    Output:
+        "<hostname>:<pid>"
+    '''
+    return f"{HOSTNAME}:{pid or os.getpid()}"
+
+
+def enqueue_simulation(simulation_id: int, session: Session) -> bool:
+    '''
+    Put a pastruns record on the simulation queue.
+    Input:
+        simulation_id
+    Output:
+        True if the run was queued, False if it is already queued or running
+    '''
+    query = text("""
+        UPDATE pastruns
+           SET status = :queued, queued_at = now(), started_at = NULL,
+               finished_at = NULL, worker = NULL
+         WHERE id = :id
+           AND COALESCE(status, -1) NOT IN (:queued, :started)
+           AND NOT (COALESCE(status, -1) BETWEEN 0 AND 100
+                    AND worker IS NOT NULL AND finished_at IS NULL)
+        RETURNING id
+    """)
+    row = session.execute(query, {'id': simulation_id, 'queued': STATUS_QUEUED,
+                                   'started': STATUS_STARTED}).fetchone()
+    session.commit()
+    return row is not None
+
+
+def enqueue_batch(batch_id: int, session: Session) -> int:
+    '''
+    Put every member of a simulation batch on the queue.
+    Input:
+        batch_id
+    Output:
+        number of members queued
+    '''
+    query = text("""
+        UPDATE pastruns
+           SET status = :queued, queued_at = now(), started_at = NULL,
+               finished_at = NULL, worker = NULL
+         WHERE batch_id = :batch_id
+           AND COALESCE(status, -1) NOT IN (:queued, :started)
+        RETURNING id
+    """)
+    rows = session.execute(query, {'batch_id': batch_id, 'queued': STATUS_QUEUED,
+                                   'started': STATUS_STARTED}).fetchall()
+    session.commit()
+    return len(rows)
+
+
+def batch_progress(batch_id: int, session: Session) -> dict[str, Any]:
+    '''
+    Aggregated state of the members of a simulation batch. Failed runs are
+    deleted from pastruns, so members without a row count as failed and the
+    batch size recorded in simulation_batch is the denominator.
+    Input:
+        batch_id
+    Output:
+        dict with member counts per state and the overall progress in percent
+        (finished members count as 100, running members with their status)
+    '''
+    query = text("""
+        SELECT
+            b.members,
+            count(p.id) FILTER (WHERE p.status = :queued) AS queued,
+            count(p.id) FILTER (WHERE p.status = :started
+                                OR (p.status BETWEEN 0 AND 100 AND p.finished_at IS NULL)) AS running,
+            count(p.id) FILTER (WHERE p.status = :completed) AS completed,
+            count(p.id) FILTER (WHERE p.finished_at IS NOT NULL
+                                AND COALESCE(p.status, -1) <> :completed) AS failed_rows,
+            count(p.id) AS existing,
+            coalesce(sum(CASE
+                WHEN p.finished_at IS NOT NULL OR p.status = :completed THEN 100
+                WHEN p.status BETWEEN 0 AND 100 THEN p.status
+                ELSE 0 END), 0) AS progress_sum,
+            min(p.queued_at) AS queued_at,
+            max(p.finished_at) AS finished_at
+        FROM simulation_batch b
+        LEFT JOIN pastruns p ON p.batch_id = b.id
+        WHERE b.id = :batch_id
+        GROUP BY b.id, b.members
+    """)
+    row = session.execute(query, {'batch_id': batch_id, 'queued': STATUS_QUEUED, 'started': STATUS_STARTED,
+                                  'completed': STATUS_COMPLETED}).mappings().one()
+    return batch_state(dict(row))
+
+
+def batch_state(counts: dict[str, Any]) -> dict[str, Any]:
+    '''
+    Batch progress from the row counts of batch_progress.
+    Input:
+        counts: members (batch size), existing (member rows left), queued,
+                running, completed, failed_rows, progress_sum, queued_at, finished_at
+    '''
+    members = max(counts["members"], counts["existing"])
+    deleted = members - counts["existing"]
+    failed = counts["failed_rows"] + deleted
+    # Deleted (failed) members are finished and count as 100
+    progress = (float(counts["progress_sum"]) + 100 * deleted) / members if members else 0.0
+    return {
+        "members": members,
+        "queued": counts["queued"],
+        "running": counts["running"],
+        "completed": counts["completed"],
+        "failed": failed,
+        "progress": round(progress, 1),
+        "queued_at": counts["queued_at"],
+        "finished_at": counts["finished_at"],
+        "done": members > 0 and counts["completed"] + failed == members,
+    }
+
+
+def claim_next_simulation(session: Session, worker: str) -> tuple[int, int] | None:
+    '''
+    Atomically take the oldest queued run for this worker.
+    Input:
+        worker name
+    Output:
+        (pastrun id, owner_id) or None when the queue is empty
+    '''
+    query = text("""
+        UPDATE pastruns
+           SET status = :started, started_at = now(), worker = :worker
+         WHERE id = (
+                SELECT id FROM pastruns
+                 WHERE status = :queued
+                 ORDER BY queued_at, id
+                 FOR UPDATE SKIP LOCKED
+                 LIMIT 1)
+        RETURNING id, owner_id
+    """)
+    row = session.execute(query, {'started': STATUS_STARTED, 'queued': STATUS_QUEUED,
+                                  'worker': worker}).fetchone()
+    session.commit()
+    if row is None:
+        return None
+    return row[0], row[1]
+
+
+def finish_simulation(simulation_id: int, session: Session, failed: bool = False) -> None:
+    '''
+    Stamp the end of a run. Failed runs get a NULL status, which the frontend
+    reports as "Failed".
+    Input:
+        simulation_id
+        failed
+    '''
+    if failed:
+        query = text("""UPDATE pastruns SET status = NULL, finished_at = now() WHERE id = :id""")
+    else:
+        query = text("""UPDATE pastruns SET finished_at = now() WHERE id = :id""")
+    session.execute(query, {'id': simulation_id})
+    session.commit()
+
+
+def fail_worker_runs(worker: str, session: Session) -> int:
+    '''
+    Mark the unfinished run owned by a dead worker process as failed.
+    Input:
+        worker name
+    Output:
+        number of runs marked failed
+    '''
+    query = text("""
+        UPDATE pastruns SET status = NULL, finished_at = now()
+         WHERE worker = :worker AND finished_at IS NULL
+        RETURNING id
+    """)
+    rows = session.execute(query, {'worker': worker}).fetchall()
+    session.commit()
+    return len(rows)
+
+
+def worker_alive(worker: str) -> bool:
+    '''
+    Whether the process named in pastruns.worker still runs on this host.
+    Input:
+        worker name ("<hostname>:<pid>")
+    '''
+    host, _, pid = worker.rpartition(':')
+    if host != HOSTNAME or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def requeue_orphaned_simulations(session: Session) -> list[int]:
+    '''
+    Runs that were started on this host by a worker process that no longer
+    exists were lost when it stopped. Remove whatever they ingested and put
+    them back on the queue. Runs of live workers, e.g. those of another pool
+    on the same host, are left alone.
+    Output:
+        ids of the requeued runs
+    '''
+    from app.dbsupport_helper import delete_cropOutputSim
+
+    query = text("""
+        SELECT id, treatment, worker FROM pastruns
+         WHERE worker LIKE :host AND finished_at IS NULL
+           AND status IS NOT NULL AND status <> :completed
+    """)
+    rows = session.execute(query, {'host': f"{HOSTNAME}:%", 'completed': STATUS_COMPLETED}).fetchall()
+    requeued = []
+    for sim_id, treatment, worker in rows:
+        if worker_alive(worker):
+            continue
+        delete_cropOutputSim(str(sim_id), treatment.split('/')[0], session)
+        if enqueue_simulation(sim_id, session):
+            requeued.append(sim_id)
+    if requeued:
+        logger.info(f"Requeued orphaned simulations: {requeued}")
+    return requeued
+
+
+def queue_stats(session: Session) -> dict[str, Any]:
+    '''
+    Queue depth, running runs and wait/run times over the last day.
+    Output:
+        dict of statistics
+    '''
+    query = text("""
+        SELECT
+            count(*) FILTER (WHERE status = :queued) AS queued,
+            count(*) FILTER (WHERE worker IS NOT NULL AND finished_at IS NULL
+                             AND status IS NOT NULL AND status <> :queued) AS running,
+            extract(epoch FROM now() - min(queued_at) FILTER (WHERE status = :queued)) AS oldest_queued,
+            avg(extract(epoch FROM started_at - queued_at))
+                FILTER (WHERE started_at > now() - interval '1 day') AS avg_wait,
+            avg(extract(epoch FROM finished_at - started_at))
+                FILTER (WHERE finished_at > now() - interval '1 day') AS avg_run,
+            count(*) FILTER (WHERE finished_at > now() - interval '1 hour') AS finished_last_hour
+        FROM pastruns
+    """)
+    row = session.execute(query, {'queued': STATUS_QUEUED}).mappings().one()
+    oldest = row['oldest_queued']
+    return {
+        "queued": row['queued'],
+        "running": row['running'],
+        "oldest_queued_seconds": round(float(oldest), 1) if oldest is not None else None,
+        "avg_wait_seconds": round(float(row['avg_wait']), 1) if row['avg_wait'] is not None else None,
+        "avg_run_seconds": round(float(row['avg_run']), 1) if row['avg_run'] is not None else None,
+        "finished_last_hour": row['finished_last_hour'],
+        "workers_per_node": settings.SIMULATION_WORKERS or settings.SIMULATION_WORKER_PROCESSES,
+    }
+
+
+def run_simulation(simulation_id: int, owner_id: int) -> None:
+    '''
+    Run one claimed simulation in the current process with a fresh session.
+    '''
+    # Imported here so the API process does not pull the route module in
+    # through this module and to keep spawn start-up cheap.
+    from app.api.routes.seasonal import prepare_and_execute
+
+    failed = False
+    with Session(engine) as session:
+        try:
+            if not prepare_and_execute(simulation_id, session, owner_id):
+                failed = True
+                logger.error(f"Simulation {simulation_id} failed, see the messages above")
+        except BaseException as e:
+            failed = True
+            logger.exception(f"Simulation {simulation_id} failed: {e}")
+        finally:
+            try:
+                finish_simulation(simulation_id, session, failed)
+            except Exception as e:
+                logger.error(f"Could not record end of simulation {simulation_id}: {e}")
+
+
+def worker_loop(poll_seconds: float, stop_event: Any = None) -> None:
+    '''
+    Body of a worker process: claim, run, repeat until stopped.
+    '''
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    name = worker_name()
+    logger.info(f"Simulation worker {name} started")
+    while stop_event is None or not stop_event.is_set():
+        try:
+            with Session(engine) as session:
+                claimed = claim_next_simulation(session, name)
+        except Exception as e:
+            logger.error(f"Worker {name} could not poll the queue: {e}")
+            claimed = None
+        if claimed is None:
+            if stop_event is not None:
+                stop_event.wait(poll_seconds)
+            else:
+                time.sleep(poll_seconds)
+            continue
+        simulation_id, owner_id = claimed
+        logger.info(f"Worker {name} running simulation {simulation_id}")
+        run_simulation(simulation_id, owner_id)
+    logger.info(f"Simulation worker {name} stopped")
+
+
+class SimulationWorkerPool:
+    '''
+    Fixed-size pool of worker processes for one node. A monitor thread
+    replaces workers that die and fails the run they were holding.
+    '''
+
+    def __init__(self, workers: int | None = None, poll_seconds: float | None = None):
+        self.workers = settings.SIMULATION_WORKERS if workers is None else workers
+        self.poll_seconds = settings.SIMULATION_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._processes: list[Any] = []
+        self._monitor: threading.Thread | None = None
+
+    def _spawn(self) -> Any:
+        process = self._ctx.Process(target=worker_loop, args=(self.poll_seconds, self._stop),
+                                    name="simulation-worker", daemon=False)
+        process.start()
+        return process
+
+    def start(self) -> None:
+        if self.workers <= 0:
+            logger.info("Simulation worker pool disabled (SIMULATION_WORKERS=0)")
+            return
+        with Session(engine) as session:
+            requeue_orphaned_simulations(session)
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        self._monitor = threading.Thread(target=self._watch, name="simulation-pool-monitor", daemon=True)
+        self._monitor.start()
+        logger.info(f"Started {self.workers} simulation workers")
+
+    def _watch(self) -> None:
+        while not self._stop.wait(5):
+            for i, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                name = worker_name(process.pid)
+                logger.warning(f"Simulation worker {name} exited with {process.exitcode}, restarting")
+                try:
+                    with Session(engine) as session:
+                        fail_worker_runs(name, session)
+                except Exception as e:
+                    logger.error(f"Could not fail runs of worker {name}: {e}")
+                self._processes[i] = self._spawn()
+
+    def stop(self, timeout: float = 30) -> None:
+        '''
+        Ask the workers to stop after their current run. Workers still busy
+        after the timeout are terminated; their runs are requeued on the next
+        start of this node.
+        '''
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run CLASSIM simulation workers")
+    parser.add_argument("--workers", type=int, default=settings.SIMULATION_WORKER_PROCESSES)
+    parser.add_argument("--poll", type=float, default=settings.SIMULATION_POLL_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    pool = SimulationWorkerPool(max(args.workers, 1), args.poll)
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
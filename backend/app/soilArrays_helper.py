@@ -0,0 +1,135 @@
+import logging
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+# 2DSOIL outputs with one row per node per timestep
+node_outputs = ["g03", "g04", "g07"]
+
+# Columns that locate a row rather than carry a value
+node_key_columns = ["Date_Time", "X", "Y", "Node"]
+
+array_dtype = np.dtype("<f4")
+
+
+def node_output(table_name: str) -> Optional[str]:
+    '''
+    'g03', 'g04' or 'g07' for a per-node output table, None otherwise.
+    '''
+    prefix = table_name.split("_")[0]
+    return prefix if prefix in node_outputs else None
+
+
+def node_positions(grd_df: pd.DataFrame, g_df: pd.DataFrame) -> np.ndarray:
+    '''
+    Array position of every output row: nodeNum - 1 of the .grd node at the
+    same X, Y (-1 when there is none). grid_node rows carry the same nodeNum,
+    so position i of a stored array is the grid node with nodeNum i + 1.
+    '''
+    nodes = grd_df[["X", "Y", "nodeNum"]].drop_duplicates(subset=["X", "Y"])
+    index = pd.MultiIndex.from_frame(nodes[["X", "Y"]])
+    found = index.get_indexer(pd.MultiIndex.from_frame(g_df[["X", "Y"]]))
+    numbers = nodes["nodeNum"].to_numpy(dtype=np.int64)
+    return np.where(found >= 0, numbers[found] - 1, -1)
+
+
+def pack_node_frame(table_name: str, g_df: pd.DataFrame, grd_df: pd.DataFrame, simulation: Any) -> list:
+    '''
+    Turn the rows of a per-node output into one record per timestep.
+    Input:
+        table_name: g03/g04/g07 output table
+        g_df: frame shaped by prepare_output_frame
+        grd_df: nodes as read by read_grd
+        simulation: pastrun id
+    Output:
+        list of (sim_id, output, Date_Time, variables, node_count, data) where
+        data is a little-endian float32 (variables x nodes) matrix, NaN for
+        nodes missing at that timestep
+    '''
+    variables = [col for col in g_df.columns
+                 if col not in node_key_columns and col != table_name + "_id"]
+    positions = node_positions(grd_df, g_df)
+    node_count = int(grd_df["nodeNum"].max()) if len(grd_df) else 0
+    codes, stamps = pd.factorize(g_df["Date_Time"], sort=True)
+    values = np.full((len(stamps), len(variables), node_count), np.nan, dtype=array_dtype)
+    keep = positions >= 0
+    if (~keep).any():
+        logger.warning(f"{table_name}: {int((~keep).sum())} rows at coordinates that are not .grd nodes")
+    matrix = g_df[variables].to_numpy(dtype=np.float64)[keep]
+    values[codes[keep], :, positions[keep]] = matrix
+    output = node_output(table_name)
+    sim_id = int(simulation)
+    return [(sim_id, output, stamp.to_pydatetime(), variables, node_count, values[t].tobytes())
+            for t, stamp in enumerate(pd.DatetimeIndex(stamps))]
+
+
+def copy_node_arrays(records: list, session: Any) -> int:
+    '''
+    Load packed timesteps into soil_node_arrays with COPY. The caller owns
+    the transaction.
+    '''
+    if not records:
+        return 0
+    dbapi_conn = session.connection().connection.driver_connection
+    with dbapi_conn.cursor() as cur:
+        with cur.copy('COPY soil_node_arrays (sim_id, output, "Date_Time", variables, node_count, data) '
+                      'FROM STDIN') as copy:
+            for record in records:
+                copy.write_row(record)
+    return len(records)
+
+
+def _unpack(variables, node_count, data) -> np.ndarray:
+    return np.frombuffer(data, dtype=array_dtype).reshape(len(variables), node_count)
+
+
+def read_node_snapshot(sim_id: int, output: str, date_time: Any, session: Any) -> Optional[dict]:
+    '''
+    Values of every node at one timestep, a single row fetch.
+    Input:
+        sim_id: pastrun id
+        output: 'g03', 'g04' or 'g07'
+        date_time: timestamp of the step
+    Output:
+        {variable: float32 array indexed by nodeNum - 1}, None if the step is not stored
+    '''
+    query = text("""
+        SELECT variables, node_count, data FROM soil_node_arrays
+         WHERE sim_id = :sim_id AND output = :output AND "Date_Time" = :date_time
+    """)
+    row = session.execute(query, {'sim_id': sim_id, 'output': output, 'date_time': date_time}).fetchone()
+    if row is None:
+        return None
+    values = _unpack(row[0], row[1], row[2])
+    return {name: values[i] for i, name in enumerate(row[0])}
+
+
+def read_node_series(sim_id: int, output: str, session: Any, start: Any = None, end: Any = None) -> tuple:
+    '''
+    Stored timesteps of a run as one array.
+    Input:
+        sim_id: pastrun id
+        output: 'g03', 'g04' or 'g07'
+        start, end: optional inclusive timestamp bounds
+    Output:
+        (timestamps as datetime64 array, variables, float32 array of shape
+        (timesteps, variables, nodes))
+    '''
+    query = text("""
+        SELECT "Date_Time", variables, node_count, data FROM soil_node_arrays
+         WHERE sim_id = :sim_id AND output = :output
+           AND (CAST(:start AS timestamp) IS NULL OR "Date_Time" >= :start)
+           AND (CAST(:end AS timestamp) IS NULL OR "Date_Time" <= :end)
+         ORDER BY "Date_Time"
+    """)
+    rows = session.execute(query, {'sim_id': sim_id, 'output': output, 'start': start, 'end': end}).fetchall()
+    if not rows:
+        return np.array([], dtype="datetime64[s]"), [], np.empty((0, 0, 0), dtype=array_dtype)
+    variables = list(rows[0][1])
+    stamps = np.array([row[0] for row in rows], dtype="datetime64[s]")
+    values = np.stack([_unpack(row[1], row[2], row[3]) for row in rows])
+    return stamps, variables, values
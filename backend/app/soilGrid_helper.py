@@ -0,0 +1,205 @@
+import hashlib
+import io
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+# Line that ends the node block of a 2DSOIL .grd file
+grd_element_marker = "ELEMENT INFORMATION"
+
+# Non-blank lines before the node column names
+grd_header_lines = 3
+
+grd_column_names = {'n': 'nodeNum', 'x': 'X', 'y': 'Y', 'MatNum': 'Layer'}
+
+grid_node_columns = ["nodeNum", "X", "Y", "Layer", "Area"]
+
+# Node numbers of the corners of an element, as named in the element block
+grd_corner_names = ["i", "j", "k", "l"]
+
+element_dtype = np.dtype("<i4")
+
+
+def read_grd(grdFile: str) -> tuple:
+    '''
+    Node table of a 2DSOIL .grd file and the hash of the file. The file is
+    read once, line by line: the node block is parsed up to the ELEMENT
+    INFORMATION marker, the rest only goes through the hash.
+    Input:
+        grdFile: path of the .grd file
+    Output:
+        (DataFrame with nodeNum, X, Y, Layer and any other node columns,
+        sha256 hex digest of the file)
+    '''
+    digest = hashlib.sha256()
+    names = None
+    node_lines = []
+    skipped = 0
+    with open(grdFile, 'rb') as gf:
+        for raw in gf:
+            digest.update(raw)
+            line = raw.decode('utf-8', errors='replace')
+            if grd_element_marker in line:
+                break
+            if not line.strip():
+                continue
+            if skipped < grd_header_lines:
+                skipped += 1
+            elif names is None:
+                names = line.split()
+            else:
+                node_lines.append(line)
+        for block in iter(lambda: gf.read(1 << 20), b''):
+            digest.update(block)
+    if names is None:
+        raise ValueError(f"{grdFile}: no node block")
+    nodes = pd.read_csv(io.StringIO("".join(node_lines)), sep=r'\s+', header=None, names=names,
+                        index_col=False)
+    return nodes.rename(columns=grd_column_names), digest.hexdigest()
+
+
+def read_grd_elements(grdFile: str) -> np.ndarray:
+    '''
+    Element block of a 2DSOIL .grd file: the lines after the ELEMENT
+    INFORMATION marker up to the next section.
+    Output:
+        int32 array (elements x 4) of corner node numbers; a triangle
+        repeats its third corner
+    '''
+    names = None
+    element_lines = []
+    in_block = False
+    with open(grdFile, 'r', errors='replace') as gf:
+        for line in gf:
+            if not in_block:
+                in_block = grd_element_marker in line
+                continue
+            tokens = line.split()
+            if not tokens:
+                continue
+            if '***' in line or not tokens[0].lstrip('-').isdigit():
+                if element_lines or '***' in line:
+                    break
+                names = tokens
+                continue
+            element_lines.append(line)
+    if not element_lines:
+        return np.empty((0, 4), dtype=element_dtype)
+    table = pd.read_csv(io.StringIO("".join(element_lines)), sep=r'\s+', header=None).to_numpy()
+    if names is not None and all(name in names for name in grd_corner_names):
+        corners = table[:, [names.index(name) for name in grd_corner_names]]
+    elif table.shape[1] >= 5:
+        # Element number first, then the corners
+        corners = table[:, 1:5]
+    else:
+        corners = table[:, :4]
+    if corners.shape[1] == 3:
+        corners = np.column_stack([corners, corners[:, 2]])
+    return corners.astype(element_dtype)
+
+
+def first_timestep(g03_df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Rows of the first timestep of a G03 output, one per node.
+    '''
+    stamps = g03_df['Date_time'].to_numpy()
+    return g03_df[stamps == stamps[0]] if len(stamps) else g03_df
+
+
+def grid_nodes(grd_df: pd.DataFrame, g03_df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Stored nodes of a grid: the .grd nodes with the Area that the G03 output
+    reports for them at its first timestep.
+    Input:
+        grd_df: nodes as read by read_grd
+        g03_df: G03 output as read by read_output_file
+    Output:
+        DataFrame with grid_node_columns
+    '''
+    areas = first_timestep(g03_df)[['X', 'Y', 'Area']].drop_duplicates(subset=['X', 'Y'])
+    nodes = pd.merge(grd_df[['nodeNum', 'X', 'Y', 'Layer']], areas, how='inner', on=['X', 'Y'])
+    return nodes.sort_values('nodeNum')[grid_node_columns]
+
+
+def read_grid_id(content_hash: str, session: Any) -> Optional[int]:
+    return session.execute(text("""SELECT id FROM soil_grid WHERE content_hash = :content_hash"""),
+                           {'content_hash': content_hash}).scalar()
+
+
+def store_grid(content_hash: str, nodes: pd.DataFrame, session: Any, elements: Optional[np.ndarray] = None) -> int:
+    '''
+    Id of the grid with this content hash; the grid and its nodes are
+    written only the first time the hash is seen. The caller commits.
+    Input:
+        content_hash: as returned by read_grd
+        nodes: as returned by grid_nodes
+        elements: as returned by read_grd_elements
+    Output:
+        soil_grid id
+    '''
+    row = session.execute(text("""
+        INSERT INTO soil_grid (content_hash, node_count, elements) VALUES (:content_hash, :node_count, :elements)
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING id
+    """), {'content_hash': content_hash, 'node_count': len(nodes),
+           'elements': None if elements is None else elements.astype(element_dtype).tobytes()}).fetchone()
+    if row is None:
+        return read_grid_id(content_hash, session)
+    grid_id = row[0]
+    columns = ", ".join(f'"{col}"' for col in grid_node_columns)
+    dbapi_conn = session.connection().connection.driver_connection
+    with dbapi_conn.cursor() as cur:
+        with cur.copy(f'COPY grid_node (grid_id, {columns}) FROM STDIN') as copy:
+            for record in nodes[grid_node_columns].itertuples(index=False):
+                copy.write_row((grid_id, int(record[0]), float(record[1]), float(record[2]),
+                                int(record[3]), None if pd.isna(record[4]) else float(record[4])))
+    return grid_id
+
+
+def link_simulation_grid(sim_id: Any, grid_id: int, session: Any) -> None:
+    '''
+    Point a run at its grid. The caller commits.
+    '''
+    session.execute(text("""UPDATE pastruns SET grid_id = :grid_id WHERE id = :sim_id"""),
+                    {'grid_id': grid_id, 'sim_id': int(sim_id)})
+
+
+def read_simulation_grid(sim_id: int, session: Any) -> Optional[int]:
+    '''
+    soil_grid id of a run, None for runs ingested before grids were shared.
+    '''
+    return session.execute(text("""SELECT grid_id FROM pastruns WHERE id = :sim_id"""),
+                           {'sim_id': sim_id}).scalar()
+
+
+def read_grid_nodes(sim_id: int, session: Any) -> pd.DataFrame:
+    '''
+    Nodes of the grid of a run ordered by nodeNum. Runs ingested before grids
+    were shared still read their own geometry rows.
+    Output:
+        DataFrame with grid_node_columns
+    '''
+    grid_id = read_simulation_grid(sim_id, session)
+    columns = ", ".join(f'"{col}"' for col in grid_node_columns)
+    if grid_id is not None:
+        query = text(f"""SELECT {columns} FROM grid_node WHERE grid_id = :id ORDER BY "nodeNum" """)
+        params = {'id': grid_id}
+    else:
+        query = text(f"""SELECT {columns} FROM geometry WHERE "simID" = :id ORDER BY "nodeNum" """)
+        params = {'id': sim_id}
+    return pd.DataFrame(session.execute(query, params).fetchall(), columns=grid_node_columns)
+
+
+def read_grid_elements(grid_id: Optional[int], session: Any) -> np.ndarray:
+    '''
+    Corner node numbers of the elements of a grid, an empty array when the
+    grid was stored without them.
+    '''
+    data = None
+    if grid_id is not None:
+        data = session.execute(text("""SELECT elements FROM soil_grid WHERE id = :id"""), {'id': grid_id}).scalar()
+    if not data:
+        return np.empty((0, 4), dtype=element_dtype)
+    return np.frombuffer(data, dtype=element_dtype).reshape(-1, 4)
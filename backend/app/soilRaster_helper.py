@@ -0,0 +1,177 @@
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import Delaunay, QhullError
+
+from app.core.config import settings
+from app.downsample_helper import SeriesCache
+from app.soilArrays_helper import array_dtype
+from app.soilGrid_helper import read_grid_elements, read_grid_nodes, read_simulation_grid
+from app.soilSnapshot_helper import node_coordinates, read_snapshot
+
+# Barycentric coordinates this far below 0 still count as inside, so pixels
+# on a shared edge are not lost to rounding
+edge_tolerance = 1e-9
+
+
+class RasterWeights(NamedTuple):
+    '''
+    Linear interpolation from the nodes of a grid to a pixel grid: raster =
+    matrix @ node values. Pixel (row, col) is row * width + col, row 0 at
+    the smallest Y.
+    '''
+    matrix: csr_matrix
+    covered: np.ndarray
+    width: int
+    height: int
+    extent: tuple
+
+
+def element_triangles(elements: np.ndarray, node_count: int) -> np.ndarray:
+    '''
+    Triangles of node positions covering the mesh elements: a quadrilateral
+    (i, j, k, l) is split into (i, j, k) and (i, k, l); a triangle repeats a
+    corner or leaves l at 0.
+    Input:
+        elements: corner node numbers as from read_grid_elements
+        node_count: number of node positions
+    Output:
+        int array (triangles x 3) of positions (nodeNum - 1)
+    '''
+    corners = elements.astype(np.int64) - 1
+    quad = (corners[:, 3] >= 0) & (corners[:, 3] != corners[:, 2]) & (corners[:, 3] != corners[:, 0])
+    triangles = np.vstack([corners[:, [0, 1, 2]], corners[quad][:, [0, 2, 3]]])
+    valid = ((triangles >= 0) & (triangles < node_count)).all(axis=1)
+    return triangles[valid]
+
+
+def delaunay_triangles(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    '''
+    Delaunay triangulation of the nodes with coordinates, for grids stored
+    without their elements.
+    Output:
+        int array (triangles x 3) of positions
+    '''
+    known = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if len(known) < 3:
+        return np.empty((0, 3), dtype=np.int64)
+    try:
+        simplices = Delaunay(np.column_stack([x[known], y[known]])).simplices
+    except QhullError:
+        return np.empty((0, 3), dtype=np.int64)
+    return known[simplices]
+
+
+def pixel_centers(extent: tuple, width: int, height: int) -> tuple:
+    '''
+    X of the pixel columns and Y of the pixel rows.
+    '''
+    xmin, xmax, ymin, ymax = extent
+    xs = xmin + (np.arange(width) + 0.5) * (xmax - xmin) / width
+    ys = ymin + (np.arange(height) + 0.5) * (ymax - ymin) / height
+    return xs, ys
+
+
+def interpolation_weights(x: np.ndarray, y: np.ndarray, triangles: np.ndarray, width: int,
+                          height: int) -> RasterWeights:
+    '''
+    Barycentric weights of every pixel center on the three corners of the
+    triangle holding it, over the bounding box of the nodes.
+    Input:
+        x, y: node coordinates by position, NaN where there is no node
+        triangles: positions as from element_triangles or delaunay_triangles
+        width, height: pixel grid
+    Output:
+        RasterWeights with a (pixels x nodes) sparse matrix
+    '''
+    node_count = len(x)
+    extent = (float(np.nanmin(x)), float(np.nanmax(x)), float(np.nanmin(y)), float(np.nanmax(y))) \
+        if node_count and not np.isnan(x).all() else (0.0, 0.0, 0.0, 0.0)
+    xs, ys = pixel_centers(extent, width, height)
+    covered = np.zeros(width * height, dtype=bool)
+    rows, cols, weights = [], [], []
+    for a, b, c in triangles:
+        xa, xb, xc, ya, yb, yc = x[a], x[b], x[c], y[a], y[b], y[c]
+        det = (yb - yc) * (xa - xc) + (xc - xb) * (ya - yc)
+        if not np.isfinite(det) or abs(det) < 1e-12:
+            continue
+        col0, col1 = np.searchsorted(xs, min(xa, xb, xc)), np.searchsorted(xs, max(xa, xb, xc), side="right")
+        row0, row1 = np.searchsorted(ys, min(ya, yb, yc)), np.searchsorted(ys, max(ya, yb, yc), side="right")
+        if col0 >= col1 or row0 >= row1:
+            continue
+        px, py = np.meshgrid(xs[col0:col1], ys[row0:row1])
+        la = ((yb - yc) * (px - xc) + (xc - xb) * (py - yc)) / det
+        lb = ((yc - ya) * (px - xc) + (xa - xc) * (py - yc)) / det
+        lc = 1.0 - la - lb
+        pixels = (np.arange(row0, row1)[:, None] * width + np.arange(col0, col1)[None, :])
+        inside = (la >= -edge_tolerance) & (lb >= -edge_tolerance) & (lc >= -edge_tolerance) & ~covered[pixels]
+        if not inside.any():
+            continue
+        hit = pixels[inside]
+        covered[hit] = True
+        rows.append(np.repeat(hit, 3))
+        cols.append(np.tile([a, b, c], len(hit)))
+        weights.append(np.column_stack([la[inside], lb[inside], lc[inside]]).ravel())
+    if rows:
+        matrix = csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+                            shape=(width * height, node_count))
+    else:
+        matrix = csr_matrix((width * height, node_count))
+    return RasterWeights(matrix, covered, width, height, extent)
+
+
+def render_raster(weights: RasterWeights, values: np.ndarray) -> np.ndarray:
+    '''
+    Raster of one timestep: a single sparse matrix-vector product.
+    Input:
+        values: node values by position, as from read_snapshot
+    Output:
+        little-endian float32 array of height * width pixels, NaN outside the mesh
+    '''
+    node_values = np.zeros(weights.matrix.shape[1], dtype=np.float64)
+    count = min(len(values), len(node_values))
+    node_values[:count] = values[:count]
+    raster = (weights.matrix @ node_values).astype(array_dtype)
+    raster[~weights.covered] = np.nan
+    return raster
+
+
+def build_grid_weights(sim_id: int, grid_id: Optional[int], session: Any, width: int, height: int) -> RasterWeights:
+    nodes = read_grid_nodes(sim_id, session)
+    x, y = node_coordinates(nodes).astype(np.float64).reshape(2, -1)
+    elements = read_grid_elements(grid_id, session)
+    triangles = element_triangles(elements, len(x)) if len(elements) else delaunay_triangles(x, y)
+    return interpolation_weights(x, y, triangles, width, height)
+
+
+def grid_weights(sim_id: int, session: Any) -> RasterWeights:
+    '''
+    Interpolation weights of the grid of a run, built once per grid and
+    pixel size and kept in weights_cache.
+    '''
+    width, height = settings.SOIL_RASTER_WIDTH, settings.SOIL_RASTER_HEIGHT
+    grid_id = read_simulation_grid(sim_id, session)
+    # Runs ingested before grids were shared have their own geometry
+    key = ("grid", grid_id, width, height) if grid_id is not None else ("run", sim_id, width, height)
+    return weights_cache.get_or_create(key, lambda: build_grid_weights(sim_id, grid_id, session, width, height))
+
+
+def read_snapshot_raster(sim_id: int, table_name: str, variable: str, date_time: Any,
+                         session: Any) -> Optional[tuple]:
+    '''
+    One variable of a per-node output at one timestep interpolated onto the
+    pixel grid.
+    Output:
+        (float32 raster, RasterWeights), None if the timestep is not stored
+    Raises KeyError for an unknown variable.
+    '''
+    values = read_snapshot(sim_id, table_name, variable, date_time, session)
+    if values is None:
+        return None
+    weights = grid_weights(sim_id, session)
+    return render_raster(weights, values), weights
+
+
+weights_cache = SeriesCache(settings.SOIL_WEIGHTS_CACHE_ENTRIES)
+raster_cache = SeriesCache(settings.SOIL_RASTER_CACHE_ENTRIES)
@@ -0,0 +1,154 @@
+import os
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy.sql import text
+
+from app.outputArchive_helper import archive_file, read_archive_rows
+from app.soilArrays_helper import array_dtype, node_key_columns, node_output, node_positions, read_node_snapshot
+from app.soilGrid_helper import read_grid_nodes
+
+
+def timestep_index(g_df: pd.DataFrame) -> tuple:
+    '''
+    Row range of every timestep of a per-node output once its rows are
+    sorted by Date_Time, the order the Parquet archive keeps.
+    Input:
+        g_df: frame shaped by prepare_output_frame
+    Output:
+        (datetime64 array of timestamps, row_start array, row_count array)
+    '''
+    stamps = np.sort(g_df["Date_Time"].to_numpy(dtype="datetime64[ns]"), kind="stable")
+    if not len(stamps):
+        return stamps, np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, stamps[1:] != stamps[:-1]])
+    counts = np.diff(np.r_[starts, len(stamps)])
+    return stamps[starts], starts, counts
+
+
+def copy_timestep_index(table_name: str, g_df: pd.DataFrame, simulation: Any, session: Any) -> int:
+    '''
+    Load the timestep index of a per-node output into soil_node_index. The
+    caller owns the transaction.
+    Output:
+        number of timesteps
+    '''
+    output = node_output(table_name)
+    if output is None:
+        return 0
+    stamps, starts, counts = timestep_index(g_df)
+    sim_id = int(simulation)
+    dbapi_conn = session.connection().connection.driver_connection
+    with dbapi_conn.cursor() as cur:
+        with cur.copy('COPY soil_node_index (sim_id, output, "Date_Time", row_start, row_count) FROM STDIN') as copy:
+            for stamp, start, count in zip(pd.DatetimeIndex(stamps), starts, counts):
+                copy.write_row((sim_id, output, stamp.to_pydatetime(), int(start), int(count)))
+    return len(stamps)
+
+
+def _table_columns(table_name: str, session: Any) -> list:
+    query = text("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = :table_name
+         ORDER BY ordinal_position
+    """)
+    return [row[0] for row in session.execute(query, {'table_name': table_name})]
+
+
+def _value_columns(columns: list, table_name: str) -> list:
+    return [col for col in columns if col not in node_key_columns and col not in ("id", table_name + "_id")]
+
+
+def read_timesteps(sim_id: int, table_name: str, session: Any) -> list:
+    '''
+    Timestamps stored for a per-node output of a run, in time order: from
+    the ingest index, else the packed arrays, else the output rows of runs
+    ingested before the index existed.
+    '''
+    output = node_output(table_name)
+    stamps = session.execute(text("""
+        SELECT "Date_Time" FROM soil_node_index WHERE sim_id = :sim_id AND output = :output ORDER BY "Date_Time"
+    """), {'sim_id': sim_id, 'output': output}).scalars().all()
+    if not stamps:
+        stamps = session.execute(text("""
+            SELECT "Date_Time" FROM soil_node_arrays WHERE sim_id = :sim_id AND output = :output ORDER BY "Date_Time"
+        """), {'sim_id': sim_id, 'output': output}).scalars().all()
+    if not stamps and _table_columns(table_name, session):
+        stamps = session.execute(text(f"""
+            SELECT DISTINCT "Date_Time" FROM "{table_name}" WHERE "{table_name}_id" = :sim_id ORDER BY "Date_Time"
+        """), {'sim_id': sim_id}).scalars().all()
+    return list(stamps)
+
+
+def read_snapshot_variables(sim_id: int, table_name: str, session: Any) -> list:
+    '''
+    Value columns of a per-node output: those of the archive when the run
+    has one, else those of the cropOutput table.
+    '''
+    path = archive_file(sim_id, table_name)
+    columns = pq.read_schema(path).names if os.path.exists(path) else _table_columns(table_name, session)
+    return _value_columns(columns, table_name)
+
+
+def _rows_to_positions(frame: pd.DataFrame, variable: str, nodes: pd.DataFrame, node_count: int) -> np.ndarray:
+    values = np.full(node_count, np.nan, dtype=array_dtype)
+    positions = node_positions(nodes, frame)
+    keep = positions >= 0
+    values[positions[keep]] = pd.to_numeric(frame[variable], errors="coerce").to_numpy(dtype=np.float64)[keep]
+    return values
+
+
+def read_snapshot(sim_id: int, table_name: str, variable: str, date_time: Any, session: Any) -> Optional[np.ndarray]:
+    '''
+    Values of one variable at every node of a run at one timestep, indexed
+    like the grid nodes (position nodeNum - 1). The packed arrays are used
+    when stored, then the archive rows the ingest index points at, then the
+    output rows.
+    Input:
+        table_name: per-node output table, e.g. g03_maize
+        date_time: timestamp as listed by read_timesteps
+    Output:
+        little-endian float32 array, NaN for nodes without a value; None if
+        the timestep is not stored
+    Raises KeyError for an unknown variable.
+    '''
+    output = node_output(table_name)
+    snapshot = read_node_snapshot(sim_id, output, date_time, session)
+    if snapshot is not None:
+        if variable not in snapshot:
+            raise KeyError(variable)
+        return snapshot[variable]
+    nodes = read_grid_nodes(sim_id, session)
+    node_count = int(nodes["nodeNum"].max()) if len(nodes) else 0
+    row = session.execute(text("""
+        SELECT row_start, row_count FROM soil_node_index
+         WHERE sim_id = :sim_id AND output = :output AND "Date_Time" = :date_time
+    """), {'sim_id': sim_id, 'output': output, 'date_time': date_time}).fetchone()
+    if row is not None:
+        table = read_archive_rows(sim_id, table_name, ["X", "Y", variable], row[0], row[1])
+        if table is not None:
+            return _rows_to_positions(table.to_pandas(), variable, nodes, node_count)
+    if variable not in _value_columns(_table_columns(table_name, session), table_name):
+        raise KeyError(variable)
+    rows = session.execute(text(f"""
+        SELECT "X", "Y", "{variable}" FROM "{table_name}"
+         WHERE "{table_name}_id" = :sim_id AND "Date_Time" = :date_time
+    """), {'sim_id': sim_id, 'date_time': date_time}).fetchall()
+    if not rows:
+        return None
+    return _rows_to_positions(pd.DataFrame(rows, columns=["X", "Y", variable]), variable, nodes, node_count)
+
+
+def node_coordinates(nodes: pd.DataFrame) -> np.ndarray:
+    '''
+    X then Y of every grid node by position as one little-endian float32
+    array of length 2 * node count; positions without a node are NaN.
+    '''
+    node_count = int(nodes["nodeNum"].max()) if len(nodes) else 0
+    coords = np.full((2, node_count), np.nan, dtype=array_dtype)
+    positions = nodes["nodeNum"].to_numpy(dtype=np.int64) - 1
+    coords[0, positions] = nodes["X"].to_numpy(dtype=np.float64)
+    coords[1, positions] = nodes["Y"].to_numpy(dtype=np.float64)
+    return coords.ravel()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from app.downsample_helper import SeriesCache, downsample, lttb, minmax_buckets
+
+
+def test_lttb_keeps_endpoints_and_spike() -> None:
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500] = 10.0
+    index = lttb(x, y, 20)
+    assert len(index) == 20
+    assert index[0] == 0 and index[-1] == 999
+    assert 500 in index
+
+
+def test_minmax_keeps_extremes_and_skips_missing_values() -> None:
+    stamps = np.arange("2020-05-01T00", "2020-05-11T00", dtype="datetime64[h]")
+    values = np.sin(np.arange(len(stamps)) / 5.0)
+    values[3] = np.nan
+    out_stamps, out_values = downsample(stamps, values, 40, "minmax")
+    assert len(out_values) <= 40
+    assert not np.isnan(out_values).any()
+    assert out_values.max() == np.nanmax(values) and out_values.min() == np.nanmin(values)
+    assert np.all(np.diff(out_stamps.astype(np.int64)) > 0)
+    assert len(minmax_buckets(np.arange(5.0), np.arange(5.0), 40)) == 5
+
+
+def test_series_cache_skips_empty_values() -> None:
+    cache = SeriesCache(4)
+    assert cache.get_or_create(("a",), lambda: None) is None
+    assert cache.get_or_create(("a",), lambda: {}) == {}
+    assert cache.get_or_create(("a",), lambda: {"v": 1}) == {"v": 1}
+    assert cache.get_or_create(("a",), lambda: {"v": 2}) == {"v": 1}
+    assert cache.get_or_create(("b",), lambda: [0], cacheable=lambda value: False) == [0]
+    assert cache.get_or_create(("b",), lambda: [1]) == [1]
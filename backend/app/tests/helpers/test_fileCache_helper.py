@@ -0,0 +1,89 @@
+import os
+
+from app.fileCache_helper import FileCache, cache_key
+
+
+def test_cache_key_depends_on_every_part() -> None:
+    assert cache_key("soi", "abc") == cache_key("soi", "abc")
+    assert cache_key("soi", "abc") != cache_key("soi", "abd")
+    assert cache_key("soi", "abc") != cache_key("nit", "abc")
+
+
+def test_hit_is_linked_into_the_run_folder(tmp_path) -> None:
+    cache = FileCache("test", 10)
+    cache.root = str(tmp_path / "cache")
+    first, second = tmp_path / "1", tmp_path / "2"
+    first.mkdir()
+    second.mkdir()
+
+    def generate():
+        (first / "GasID.gas").write_text("gas")
+        return 42
+
+    key = cache_key("gas", "hash")
+    assert cache.get_or_create(key, str(first), {"gas": "GasID.gas"}, generate) == 42
+    assert cache.get_or_create(key, str(second), {"gas": "GasID.gas"}, lambda: 1 / 0) == 42
+    assert (second / "GasID.gas").read_text() == "gas"
+    assert os.stat(second / "GasID.gas").st_nlink > 1
+
+
+def test_copy_slots_are_not_linked(tmp_path) -> None:
+    cache = FileCache("test", 10)
+    cache.root = str(tmp_path / "cache")
+    (tmp_path / "a.soi").write_text("soil")
+    cache.store("k" * 64, str(tmp_path), {"soi": "a.soi"}, None)
+    dest = tmp_path / "run"
+    dest.mkdir()
+    hit, _ = cache.load("k" * 64, str(dest), {"soi": "a.soi"}, copy_slots=("soi",))
+    assert hit
+    assert os.stat(dest / "a.soi").st_nlink == 1
+
+
+def test_grid_outputs_are_cached_and_linked(tmp_path) -> None:
+    cache = FileCache("test", 10)
+    cache.root = str(tmp_path / "cache")
+    first, second = tmp_path / "1", tmp_path / "2"
+    for run in (first, second):
+        run.mkdir()
+        (run / "layer.dat").write_text("layers")
+
+    def generate():
+        (first / "grid.grd").write_text("grid")
+        (first / "nodal.nod").write_text("nodes")
+        return 1
+
+    key = cache_key("grid", "layers")
+    assert cache.get_or_create_outputs(key, str(first), generate) == 1
+    assert cache.get_or_create_outputs(key, str(second), lambda: 1 / 0) == 1
+    assert sorted(os.listdir(second)) == ["grid.grd", "layer.dat", "nodal.nod"]
+    assert (second / "nodal.nod").read_text() == "nodes"
+    assert os.stat(second / "grid.grd").st_nlink > 1
+    # The input written before the tool ran is not part of the entry
+    assert os.stat(second / "layer.dat").st_nlink == 1
+
+
+def test_failed_grid_run_is_not_cached(tmp_path) -> None:
+    cache = FileCache("test", 10)
+    cache.root = str(tmp_path / "cache")
+
+    def fail():
+        (tmp_path / "grid.grd").write_text("partial")
+        return 0
+
+    key = cache_key("grid", "bad")
+    assert cache.get_or_create_outputs(key, str(tmp_path), fail) == 0
+    assert not os.path.exists(cache.entry_path(key))
+
+
+def test_least_recently_used_outputs_are_evicted(tmp_path) -> None:
+    cache = FileCache("test", 10)
+    cache.root = str(tmp_path / "cache")
+    cache.max_bytes = 1500
+    keys = [cache_key("grid", n) for n in range(3)]
+    for n, key in enumerate(keys):
+        run = tmp_path / str(n)
+        run.mkdir()
+        cache.get_or_create_outputs(key, str(run), lambda run=run: (run / "grid.grd").write_text("x" * 600))
+        os.utime(cache.entry_path(key), (n, n))
+    assert not os.path.exists(cache.entry_path(keys[0]))
+    assert os.path.exists(cache.entry_path(keys[1])) and os.path.exists(cache.entry_path(keys[2]))
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from app.ingestOutputFiles_helper import (
+    checkNaNInOutputFrame,
+    date_hour_to_timestamp,
+    format_timestamps,
+    prepare_output_frame,
+    soil_days_to_timestamp,
+)
+
+
+def test_date_hour_to_timestamp() -> None:
+    stamps = date_hour_to_timestamp(pd.Series(["05/01/2020", " 12/31/2020"]), pd.Series([0, 23]))
+    assert list(stamps) == [pd.Timestamp(2020, 5, 1, 0), pd.Timestamp(2020, 12, 31, 23)]
+
+
+def test_soil_days_are_rounded_to_the_hour() -> None:
+    stamps = soil_days_to_timestamp(pd.Series([43952.0, 43952.5 + 0.001]))
+    assert list(format_timestamps(stamps)) == ["2020-05-01 00:00:00", "2020-05-01 12:00:00"]
+
+
+def test_prepare_g01_potato_frame() -> None:
+    g_df = pd.DataFrame({"date": ["05/01/2020"], "time": [6], "LA/pl": [1.0], "Tr-Pot": [2.0]})
+    result = prepare_output_frame("g01_potato", g_df, "12")
+    assert list(result.columns) == ["LA_pl", "Tr_Pot", "g01_potato_id", "Date_Time"]
+    assert result["g01_potato_id"][0] == 12
+    assert result["Date_Time"][0] == pd.Timestamp(2020, 5, 1, 6)
+
+
+def test_prepare_g03_frame_drops_velocity_and_area() -> None:
+    g_df = pd.DataFrame({"Date_time": [43952.0], "Date": ["x"], "X": [1.0], "Y": [2.0],
+                         "Area": [3.0], "Vx": [0.0], "Vy": [0.0], "hNew": [-10.0]})
+    result = prepare_output_frame("g03_maize", g_df, 3)
+    assert list(result.columns) == ["X", "Y", "hNew", "g03_maize_id", "Date_Time"]
+
+
+def test_nan_report_lists_columns_and_dates() -> None:
+    g_df = pd.DataFrame({"date": ["05/01/2020", "05/02/2020"], "time": [0, 0],
+                         "LAI": [1.0, None], "RH": [None, None]})
+    message = checkNaNInOutputFrame("g01_maize", "run.g01", g_df)
+    assert message == "run.g01: LAI, RH<br>\nDate:05/02/2020<br>\n"
+    assert checkNaNInOutputFrame("g01_maize", "run.g01", g_df.fillna(0)) == ""
@@ -0,0 +1,97 @@
+import threading
+from collections.abc import Generator
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.nrcsSoil_helper import fetch_sdm_horizons, fetch_sdm_mukeys, lookup_horizons, soil_layers, tile_key
+
+envelope = ('<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope">'
+            '<soap:Body><RunQueryResponse xmlns="http://SDMDataAccess.nrcs.usda.gov/Tabular/SDMTabularService.asmx">'
+            '<RunQueryResult><diffgr:diffgram xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1" '
+            'xmlns:msdata="urn:schemas-microsoft-com:xml-msdata"><NewDataSet>{tables}</NewDataSet></diffgr:diffgram>'
+            '</RunQueryResult></RunQueryResponse></soap:Body></soap:Envelope>')
+
+
+def table(index: int, **fields) -> str:
+    values = "".join(f"<{name}>{value}</{name}>" for name, value in fields.items())
+    return f'<Table diffgr:id="Table{index}" msdata:rowOrder="{index}">{values}</Table>'
+
+
+horizon = dict(slope_r=2, slope=3, hzname="Ap", awc=0.2, dbthirdbar=1.4)
+profile_tables = "".join([
+    table(1, cokey=10, chkey=101, prcent=85, depth=30, clay=20, silt=40, sand=40, OM=2.5, th33=0.3, bd=1.1, **horizon),
+    table(2, cokey=10, chkey=100, prcent=85, depth=15, clay=18, silt=42, sand=40, OM=3, th33=0.28, bd=1.12, **horizon),
+    # hzname missing: the horizon is dropped
+    table(3, cokey=10, chkey=102, prcent=85, depth=60, clay=25, silt=35, sand=40, OM=1, th33=0.3, bd=1.2,
+          slope_r=2, slope=3, awc=0.2, dbthirdbar=1.5),
+    table(4, cokey=11, chkey=110, prcent=15, depth=20, clay=5, silt=5, sand=90, OM=0.5, th33=0.1, bd=1.5, **horizon),
+])
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    # Everything the test writes is rolled back; the session's own rollback
+    # only goes back to its savepoint
+    with engine.connect() as conn:
+        tx = conn.begin()
+        yield Session(bind=conn, join_transaction_mode="create_savepoint")
+        tx.rollback()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    requests: list = []
+    profile_tables = profile_tables
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        StandIn.requests.append(body)
+        tables = table(1, mukey=4321) if "SDA_Get_Mukey" in body else StandIn.profile_tables
+        content = envelope.format(tables=tables).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def test_sdm_lookup_against_local_stand_in(monkeypatch) -> None:
+    server = HTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "NRCS_SDM_URL", f"http://127.0.0.1:{server.server_port}/Tabular")
+    try:
+        mukeys = fetch_sdm_mukeys(-86.5, 40.25)
+        horizons = fetch_sdm_horizons(mukeys)
+    finally:
+        server.shutdown()
+    assert mukeys == ["4321"]
+    assert "point(-86.5 40.25)" in StandIn.requests[0] and "IN ('4321')" in StandIn.requests[1]
+    assert [h["depth"] for h in horizons] == [15.0, 30.0]
+    layers = soil_layers(horizons)
+    assert layers[0]["Sand"] == 40.0 and layers[0]["OM_pct"] == 3.0 and layers[0]["NO3"] == 25
+    assert list(layers[0])[:2] == ["Bottom_depth", "OM_pct"]
+
+
+def test_tile_key_rounds_nearby_sites_together(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "NRCS_TILE_DECIMALS", 3)
+    assert tile_key(-86.50012, 40.25049) == tile_key(-86.49991, 40.24951)
+    assert tile_key(-86.5, 40.25) != tile_key(-86.502, 40.25)
+
+
+def test_malformed_sdm_answer_gives_no_horizons(monkeypatch, session: Session) -> None:
+    server = HTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "NRCS_SDM_URL", f"http://127.0.0.1:{server.server_port}/Tabular")
+    monkeypatch.setattr(settings, "NRCS_OFFLINE", False)
+    # No component percentage and a depth that is not a number
+    monkeypatch.setattr(StandIn, "profile_tables", table(1, cokey=10, chkey=100, depth="n/a", clay=18, **horizon))
+    try:
+        assert lookup_horizons(-120.125, 10.375, session, refresh=True) == (None, 'none')
+    finally:
+        server.shutdown()
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+
+from app import outputArchive_helper
+from app.outputArchive_helper import OutputArchive, read_archive_table
+
+
+def test_published_archive_is_read_by_column_and_window(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(outputArchive_helper, "archiveDir", str(tmp_path))
+    frame = pd.DataFrame({
+        "g01_maize_id": [5] * 48,
+        "Date_Time": pd.date_range("2020-05-01", periods=48, freq="h"),
+        "LAI": [float(i) for i in range(48)],
+        "earDM": [0.0] * 48,
+    })
+    archive = OutputArchive(5)
+    archive.add("g01_maize", frame)
+    assert read_archive_table(5, "g01_maize") is None
+    archive.publish()
+
+    table = read_archive_table(5, "g01_maize", ["LAI"], "2020-05-02 00:00", "2020-05-02 02:00")
+    assert table.schema.names == ["Date_Time", "LAI"]
+    assert table.column("LAI").to_pylist() == [24.0, 25.0, 26.0]
+    assert not os.path.exists(archive.staging)
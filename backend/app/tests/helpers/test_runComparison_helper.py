@@ -0,0 +1,78 @@
+from collections.abc import Generator
+
+import numpy as np
+import pytest
+from sqlalchemy.sql import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.runComparison_helper import daily_statistics, run_deltas, summary_statistics
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    # Everything the test writes is rolled back
+    with engine.connect() as conn:
+        tx = conn.begin()
+        yield Session(bind=conn)
+        tx.rollback()
+
+
+def insert_runs(session: Session, count: int) -> list:
+    owner = session.execute(text('SELECT id FROM "user" ORDER BY id LIMIT 1')).scalar()
+    return session.execute(text("""
+        INSERT INTO pastruns ("rotationID", site, soil, stationtype, weather, treatment, startyear, endyear,
+                              waterstress, nitrostress, "tempVar", "rainVar", "CO2Var", owner_id, status)
+        SELECT 1, 's', 's', 'st', 'w', 'maize/e/t', 2020, 2020, '', '', n, 0, 0, :o, 101
+          FROM generate_series(1, :count) n
+        RETURNING id
+    """), {'o': owner, 'count': count}).scalars().all()
+
+
+def test_deltas_and_percentiles(session: Session) -> None:
+    ids = insert_runs(session, 3)
+    for sim_id, value in zip(ids, [100.0, 150.0, 0.0]):
+        session.execute(text("""
+            INSERT INTO simulation_summary (sim_id, crop, yield, total_biomass, nitrogen_uptake)
+            VALUES (:id, 'maize', :v, :v * 2, NULL)
+        """), {'id': sim_id, 'v': value})
+    runs = run_deltas(ids, ids[0], session)
+    assert [run["delta_yield"] for run in runs] == [0.0, 50.0, -100.0]
+    assert [run["delta_yield_pct"] for run in runs] == [0.0, 50.0, -100.0]
+    assert runs[1]["delta_nitrogen_uptake"] is None
+    # A zero baseline has no relative difference
+    assert run_deltas(ids, ids[2], session)[0]["delta_yield_pct"] is None
+    assert "delta_yield" not in run_deltas(ids, None, session)[0]
+
+    stats = summary_statistics(ids, [10, 50, 90], session)["yield"]
+    values = [100.0, 150.0, 0.0]
+    assert (stats["count"], stats["min"], stats["max"]) == (3, 0.0, 150.0)
+    assert np.isclose(stats["mean"], np.mean(values)) and np.isclose(stats["std"], np.std(values, ddof=1))
+    assert np.allclose([stats["percentiles"][p] for p in (10, 50, 90)], np.percentile(values, [10, 50, 90]))
+    assert summary_statistics(ids, [50], session)["nitrogen_uptake"]["count"] == 0
+
+
+def test_daily_statistics_aggregate_daily_means(session: Session) -> None:
+    ids = insert_runs(session, 4)
+    baseline, runs = ids[0], ids[1:]
+    # Two hourly values a day; the daily mean of run k on day d is k * 10 + d + 0.5
+    for k, sim_id in enumerate(ids):
+        session.execute(text("""
+            INSERT INTO g01_maize (g01_maize_id, "Date_Time", "LAI", "shootDM")
+            SELECT :id, '2020-07-01'::timestamp + d * interval '1 day' + h * interval '1 hour',
+                   :k * 10 + d + h, 1
+              FROM generate_series(0, 1) d, generate_series(0, 1) h
+        """), {'id': sim_id, 'k': k})
+    result = daily_statistics("maize", runs, ["LAI", "biomass"], baseline, session)
+    assert result["dates"] == ["2020-07-01", "2020-07-02"]
+    lai = result["LAI"]
+    for d in range(2):
+        daily = np.array([k * 10 + d + 0.5 for k in range(1, 4)])
+        assert lai["runs"][d] == 3
+        assert np.isclose(lai["mean"][d], daily.mean()) and np.isclose(lai["std"][d], daily.std(ddof=1))
+        assert (lai["min"][d], lai["max"][d]) == (daily.min(), daily.max())
+        assert np.allclose([lai["p10"][d], lai["p90"][d]], np.percentile(daily, [10, 90]))
+        assert lai["baseline"][d] == d + 0.5
+        assert np.isclose(lai["delta"][d], daily.mean() - (d + 0.5))
+    assert result["biomass"]["mean"] == [1.0, 1.0]
+    assert daily_statistics("maize", runs, ["not_a_column"], None, session) is None
@@ -0,0 +1,97 @@
+from collections.abc import Generator
+from datetime import date
+
+import pytest
+from sqlalchemy.sql import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.dbsupport_helper import (
+    getMaizeAgronomicData,
+    getMaizeDateByDev,
+    read_experimentDB_id,
+    read_operationsDB_id,
+    read_treatmentDB_id,
+    readOpDetails,
+)
+from app.simulationSummary_helper import compute_simulation_summary
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    # Everything the test writes is rolled back
+    with engine.connect() as conn:
+        tx = conn.begin()
+        yield Session(bind=conn)
+        tx.rollback()
+
+
+def maize_run(session: Session) -> int:
+    def execute(query, params=None):
+        return session.execute(text(query), params or {})
+
+    owner = execute('SELECT id FROM "user" ORDER BY id LIMIT 1').scalar()
+    exid = execute("INSERT INTO experiment (name, crop, owner_id) VALUES ('summary test', 'maize', :o) RETURNING exid",
+                   {'o': owner}).scalar()
+    tid = execute("INSERT INTO treatment (t_exid, name, owner_id) VALUES (:e, 't', :o) RETURNING tid",
+                  {'e': exid, 'o': owner}).scalar()
+
+    def operation(name, odate):
+        return execute('INSERT INTO operations (o_t_exid, name, odate, owner_id) VALUES (:t, :n, :d, :o) RETURNING "opID"',
+                       {'t': tid, 'n': name, 'd': odate, 'o': owner}).scalar()
+
+    execute('INSERT INTO "initCondOp" ("opID", pop) VALUES (:op, 7.5)', {'op': operation('Simulation Start', '04/20/2020')})
+    operation('Sowing', '05/01/2020')
+    operation('Harvest', '09/30/2020')
+    fertilizer = operation('Fertilizer', '05/02/2020')
+    execute("""INSERT INTO "fertilizationOp" ("opID", "fertilizationClass", depth) VALUES (:op, 'Fertilizer-Banded', 5)""",
+            {'op': fertilizer})
+    execute("""INSERT INTO "fertNutOp" ("opID", nutrient, "nutrientQuantity")
+               VALUES (:op, 'Nitrogen (N)', 50), (:op, 'Nitrogen (N)', 25)""", {'op': fertilizer})
+    sim_id = execute("""
+        INSERT INTO pastruns ("rotationID", site, soil, stationtype, weather, treatment, startyear, endyear,
+                              waterstress, nitrostress, "tempVar", "rainVar", "CO2Var", owner_id, status)
+        VALUES (1, 's', 's', 'st', 'w', 'maize/summary test/t', 2020, 2020, '', '', 0, 0, 0, :o, 101) RETURNING id
+    """, {'o': owner}).scalar()
+    # Matured twice: yield is read up to the end of the first maturity day
+    execute("""INSERT INTO g01_maize (g01_maize_id, "Date_Time", "Note", "earDM", "shootDM", "NUpt") VALUES
+        (:id, '2020-05-10 06:00', 'Emerged', 0, 1, 0.1), (:id, '2020-07-20 13:00', 'Tasseled', 10, 50, 1),
+        (:id, '2020-07-25', 'Silked', 20, 80, 2), (:id, '2020-09-10 01:00', 'Matured', 100, 200, 3),
+        (:id, '2020-09-10 23:00', 'Matured', 110, 210, 3.5), (:id, '2020-09-20', 'Matured', 500, 900, 9)""",
+            {'id': sim_id})
+    return sim_id
+
+
+def legacy_exp_data(sim_id: int, session: Session) -> dict:
+    # What read_exp_data computed on every view before the summary table
+    cropname, experiment, treatmentname = session.execute(
+        text("SELECT treatment FROM pastruns WHERE id = :id"), {'id': sim_id}).scalar().split('/')
+    tid = read_treatmentDB_id(read_experimentDB_id(cropname, experiment, session), treatmentname, session)
+    totalNAppl = 0
+    for opID, name, odate in read_operationsDB_id(tid, session):
+        if name == 'Simulation Start':
+            plantDensity = readOpDetails(opID, name, session)[0][3]
+        if name == 'Harvest':
+            HarvestDate = odate
+        if name == 'Fertilizer':
+            for row in readOpDetails(opID, name, session):
+                if row[5] == "Nitrogen (N)":
+                    totalNAppl += row[6]
+    MaturityDate = getMaizeDateByDev(sim_id, "Matured", session)
+    agroDataTuple = getMaizeAgronomicData(sim_id, MaturityDate if MaturityDate != "N/A" else HarvestDate, session)
+    return {'Yield': round(float(agroDataTuple[0]) * float(plantDensity) * 10, 2),
+            'Total_biomass': round(float(agroDataTuple[1]) * float(plantDensity) * 10, 2),
+            'Nitrogen_Uptake': round(float(agroDataTuple[2]) * float(plantDensity) * 10, 2),
+            'MaturityDate': MaturityDate, 'totalNAppl': totalNAppl}
+
+
+def test_maize_summary_matches_legacy_values(session: Session) -> None:
+    sim_id = maize_run(session)
+    summary = compute_simulation_summary(sim_id, session)
+    legacy = legacy_exp_data(sim_id, session)
+    assert (summary['yield'], summary['total_biomass'], summary['nitrogen_uptake']) == \
+        (legacy['Yield'], legacy['Total_biomass'], legacy['Nitrogen_Uptake'])
+    assert summary['maturity_date'].strftime('%m/%d/%Y') == legacy['MaturityDate']
+    assert summary['total_n_applied'] == legacy['totalNAppl'] == 75
+    assert (summary['sowing_date'], summary['emergence_date'], summary['silked_date']) == \
+        (date(2020, 5, 1), date(2020, 5, 10), date(2020, 7, 25))
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+from app.simulation_worker import HOSTNAME, batch_state, worker_alive, worker_name
+
+
+def test_worker_alive_only_for_running_local_processes() -> None:
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    assert worker_alive(worker_name())
+    assert not worker_alive(f"{HOSTNAME}:{exited.pid}")
+    # Workers of other hosts cannot be checked from here
+    assert worker_alive(f"other-{HOSTNAME}:{exited.pid}")
+
+
+def test_deleted_batch_members_count_as_failed() -> None:
+    # 4 members: one completed, one running at 50%, two failed and deleted
+    counts = {"members": 4, "existing": 2, "queued": 0, "running": 1, "completed": 1, "failed_rows": 0,
+              "progress_sum": 150, "queued_at": None, "finished_at": None}
+    state = batch_state(counts)
+    assert (state["failed"], state["progress"], state["done"]) == (2, 87.5, False)
+    state = batch_state({**counts, "running": 0, "completed": 2, "progress_sum": 200})
+    assert (state["members"], state["failed"], state["progress"], state["done"]) == (4, 2, 100.0, True)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from app.soilArrays_helper import node_output, pack_node_frame
+
+
+def test_timesteps_are_packed_in_node_order() -> None:
+    grd_df = pd.DataFrame({"nodeNum": [1, 2, 3], "X": [0.0, 1.0, 0.0], "Y": [0.0, 0.0, 5.0]})
+    g_df = pd.DataFrame({
+        "g03_maize_id": [7] * 5,
+        "Date_Time": pd.to_datetime(["2020-05-01 01:00"] * 2 + ["2020-05-01 00:00"] * 3),
+        "X": [0.0, 0.0, 0.0, 1.0, 0.0],
+        "Y": [5.0, 0.0, 5.0, 0.0, 0.0],
+        "hNew": [13.0, 11.0, 3.0, 2.0, 1.0],
+        "Temp": [23.0, 21.0, 20.3, 20.2, 20.1],
+    })
+    records = pack_node_frame("g03_maize", g_df, grd_df, 7)
+    assert [r[2] for r in records] == [pd.Timestamp("2020-05-01 00:00"), pd.Timestamp("2020-05-01 01:00")]
+    sim_id, output, _, variables, node_count, data = records[1]
+    assert (sim_id, output, variables, node_count) == (7, "g03", ["hNew", "Temp"], 3)
+    values = np.frombuffer(data, dtype="<f4").reshape(2, 3)
+    np.testing.assert_array_equal(values[0], np.array([11.0, np.nan, 13.0], dtype="<f4"))
+    assert node_output("g05_maize") is None
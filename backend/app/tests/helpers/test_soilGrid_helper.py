@@ -0,0 +1,34 @@
+import hashlib
+
+import pandas as pd
+
+from app.soilGrid_helper import grid_nodes, read_grd, read_grd_elements
+
+
+def test_read_grd_stops_at_element_block(tmp_path) -> None:
+    content = ("***** GRID GEOMETRY INFORMATION *****\n KAT NumNP NumEl\n  2 3 1\n\n"
+               "   n    x     y   MatNum\n   1  0.0   0.0   1\n   2  1.0   0.0   1\n   3  0.0  -5.0   2\n"
+               "***************** ELEMENT INFORMATION ******************************************************\n"
+               "   e   i   j   k   l  MatNum\n   1   1   2   3   3   1\n")
+    grd = tmp_path / "field.grd"
+    grd.write_text(content)
+    nodes, content_hash = read_grd(str(grd))
+    assert list(nodes.columns) == ["nodeNum", "X", "Y", "Layer"]
+    assert nodes["nodeNum"].tolist() == [1, 2, 3] and nodes["Layer"].tolist() == [1, 1, 2]
+    assert content_hash == hashlib.sha256(content.encode()).hexdigest()
+
+
+def test_grid_nodes_use_first_timestep() -> None:
+    grd_df = pd.DataFrame({"nodeNum": [2, 1], "X": [1.0, 0.0], "Y": [0.0, 0.0], "Layer": [1, 1]})
+    g03_df = pd.DataFrame({"Date_time": [43952.0, 43952.0, 43953.0, 43953.0],
+                           "X": [0.0, 1.0, 0.0, 1.0], "Y": 0.0, "Area": [0.5, 0.7, 0.9, 0.9]})
+    nodes = grid_nodes(grd_df, g03_df)
+    assert nodes["nodeNum"].tolist() == [1, 2]
+    assert nodes["Area"].tolist() == [0.5, 0.7]
+
+
+def test_read_grd_elements_named_corners(tmp_path) -> None:
+    grd = tmp_path / "field.grd"
+    grd.write_text("header\n***************** ELEMENT INFORMATION ******\n   e   i   j   k   l  MatNum\n"
+                   "   1   1   2   5   4   1\n   2   2   3   6   6   1\n***** BOUNDARY INFORMATION *****\n 1 2 3\n")
+    assert read_grd_elements(str(grd)).tolist() == [[1, 2, 5, 4], [2, 3, 6, 6]]
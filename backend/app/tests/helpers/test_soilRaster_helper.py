@@ -0,0 +1,29 @@
+import numpy as np
+
+from app.soilRaster_helper import delaunay_triangles, element_triangles, interpolation_weights, pixel_centers, render_raster
+
+# 3 x 2 nodes numbered row by row, two quadrilateral elements
+x = np.array([0.0, 1.0, 2.0, 0.0, 1.0, 2.0])
+y = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+elements = np.array([[1, 2, 5, 4], [2, 3, 6, 6]])
+
+
+def test_element_triangles_split_quadrilaterals() -> None:
+    triangles = element_triangles(elements, len(x))
+    assert triangles.tolist() == [[0, 1, 4], [1, 2, 5], [0, 4, 3]]
+
+
+def test_linear_field_is_reproduced() -> None:
+    weights = interpolation_weights(x, y, delaunay_triangles(x, y), 8, 4)
+    raster = render_raster(weights, (2 * x + 3 * y).astype("<f4")).reshape(4, 8)
+    xs, ys = pixel_centers(weights.extent, 8, 4)
+    assert weights.covered.all()
+    assert np.allclose(raster, 2 * xs[None, :] + 3 * ys[:, None], atol=1e-5)
+
+
+def test_pixels_outside_the_mesh_are_nan() -> None:
+    weights = interpolation_weights(x, y, element_triangles(elements, len(x)), 8, 4)
+    raster = render_raster(weights, np.ones(len(x), dtype="<f4")).reshape(4, 8)
+    # The second element is only a triangle, its upper left half is not covered
+    assert not np.isnan(raster[0, -1]) and np.isnan(raster[-1, 4])
+    assert np.allclose(raster[~np.isnan(raster)], 1.0)
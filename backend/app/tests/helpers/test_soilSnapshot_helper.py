@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from app.soilSnapshot_helper import node_coordinates, timestep_index
+
+
+def test_timestep_index_follows_sorted_rows() -> None:
+    stamps = pd.to_datetime(["2020-05-01 01:00", "2020-05-01 00:00", "2020-05-01 01:00", "2020-05-01 00:00",
+                             "2020-05-01 02:00"])
+    days, starts, counts = timestep_index(pd.DataFrame({"Date_Time": stamps}))
+    assert list(pd.DatetimeIndex(days)) == list(pd.to_datetime(["2020-05-01 00:00", "2020-05-01 01:00",
+                                                                "2020-05-01 02:00"]))
+    assert starts.tolist() == [0, 2, 4] and counts.tolist() == [2, 2, 1]
+
+
+def test_node_coordinates_by_position() -> None:
+    nodes = pd.DataFrame({"nodeNum": [1, 3], "X": [0.5, 2.0], "Y": [-1.0, -3.0]})
+    coords = np.frombuffer(node_coordinates(nodes).tobytes(), dtype="<f4")
+    assert coords[[0, 2, 3, 5]].tolist() == [0.5, 2.0, -1.0, -3.0]
+    assert np.isnan(coords[1]) and np.isnan(coords[4])
@@ -0,0 +1,34 @@
+import numpy as np
+from shapely.geometry import Point, Polygon
+
+from app.texture_helper import Texture, classify_textures, texture_polygons
+
+
+def shapely_texture(sand: float, clay: float) -> str:
+    texture = ''
+    if sand >= 0 and clay >= 0:
+        for name, vertices in texture_polygons:
+            if Polygon(vertices).contains(Point(sand, clay)):
+                texture += '/' + name
+    return texture or 'silt loam'
+
+
+def test_whole_percentages_match_polygon_tests() -> None:
+    pairs = [(sand, clay) for sand in range(-1, 102) for clay in range(-1, 102)]
+    textures = classify_textures([p[0] for p in pairs], [p[1] for p in pairs])
+    assert textures == [shapely_texture(sand, clay) for sand, clay in pairs]
+
+
+def test_fractional_percentages_match_polygon_tests() -> None:
+    rng = np.random.default_rng(0)
+    points = np.vstack([rng.uniform(-5, 105, (2000, 2)), np.round(rng.uniform(0, 100, (2000, 2)), 1),
+                        [(43.5, 7.0), (47.5, 3.5), (0.1 + 0.2, 27.0), (21.5, 13.5)]])
+    textures = classify_textures(points[:, 0], points[:, 1])
+    assert textures == [shapely_texture(sand, clay) for sand, clay in points]
+
+
+def test_edge_cases() -> None:
+    # On the loam / sandy loam boundary, in no class, and missing values
+    assert classify_textures([52, 40, None, float('nan')], [10, 20, 10, 10]) == \
+        ['silt loam', '/loam', 'silt loam', 'silt loam']
+    assert Texture(10, 70).whatTexture() == '/clay'
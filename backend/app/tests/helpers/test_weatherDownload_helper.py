@@ -0,0 +1,55 @@
+import asyncio
+from datetime import date
+
+from aiohttp import ClientSession, web
+
+from app.weatherDownload_helper import missing_windows, process_weather_data, stream_weather_csv
+from app.weatherIngest_helper import download_required, validate_weather_frame
+
+
+def test_missing_windows_skips_covered_days() -> None:
+    covered = {date(2020, 1, d) for d in range(3, 8)}
+    windows = missing_windows(covered, date(2020, 1, 1), date(2020, 1, 12), 3)
+    assert windows == [(date(2020, 1, 1), date(2020, 1, 2)),
+                       (date(2020, 1, 8), date(2020, 1, 10)),
+                       (date(2020, 1, 11), date(2020, 1, 12))]
+
+
+def test_missing_windows_refreshes_recent_days() -> None:
+    covered = {date(2020, 1, d) for d in range(1, 11)}
+    assert missing_windows(covered, date(2020, 1, 1), date(2020, 1, 10), 30) == []
+    assert missing_windows(covered, date(2020, 1, 1), date(2020, 1, 10), 30, date(2020, 1, 9)) == \
+        [(date(2020, 1, 9), date(2020, 1, 10))]
+
+
+def test_stream_parse_from_local_server() -> None:
+    lines = ["date,air_temperature,relative_humidity,wind_speed,shortwave_radiation,precipitation"]
+    lines += [f"2020-01-01 {h:02d}:00,{h}.5,0.5,2,100,0" for h in range(24)]
+    lines.append("2020-01-02 00:00,,0.5,2,100,0")
+
+    async def handler(request):
+        assert request.query["start"] == "2020-01-01"
+        return web.Response(text="\r\n".join(lines) + "\r\n", content_type="text/csv")
+
+    async def fetch() -> list:
+        app = web.Application()
+        app.router.add_get("/hourly", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with ClientSession() as http_session:
+                async with http_session.get(f"http://127.0.0.1:{port}/hourly", params={"start": "2020-01-01"}) as response:
+                    return [batch async for batch in stream_weather_csv(response, batch_lines=10)]
+        finally:
+            await runner.cleanup()
+
+    batches = asyncio.run(fetch())
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    rows = [validate_weather_frame(process_weather_data(batch, "station", 7), download_required)[0] for batch in batches]
+    assert sum(len(frame) for frame in rows) == 24
+    first = rows[0].iloc[1]
+    assert (first["date"], first["hour"], first["jday"]) == ("2020-01-01", 1, 1)
+    assert first["srad"] == 0.36 and first["rh"] == 50
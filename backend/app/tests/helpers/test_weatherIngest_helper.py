@@ -0,0 +1,63 @@
+from collections.abc import Generator
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.sql import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.models import WeatherCreate
+from app.weatherIngest_helper import copy_weather_rows, ingest_columns, upload_required, validate_weather_frame
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    # Everything the test writes is rolled back
+    with engine.connect() as conn:
+        tx = conn.begin()
+        yield Session(bind=conn)
+        tx.rollback()
+
+
+def test_validate_drops_unusable_rows() -> None:
+    frame = pd.DataFrame({
+        "stationtype": "st",
+        "weather_id": 3,
+        "jday": [1, 2, 400, None, 5],
+        "date": ["1/1/2020", "2020-01-02", "2020-01-03", "2020-01-04", "not a date"],
+        "hour": [0, 25, 1, 1, 1],
+        "srad": ["1.5", 2.0, 3.0, 4.0, 5.0],
+    })
+    valid, rejected = validate_weather_frame(frame, upload_required)
+    # An hour past 24 and a date that does not parse; jday comes from the date
+    assert rejected == 2
+    assert list(valid.columns) == ingest_columns
+    assert valid["jday"].tolist() == [1, 3, 4]
+    row = valid.iloc[0]
+    assert (row["date"], row["weather_id"], row["srad"]) == ("2020-01-01", "3", 1.5)
+    assert np.isnan(row["co2"])
+
+
+def test_rows_posted_by_the_upload_page_are_kept() -> None:
+    # weather.tsx used to send days since 1970 as jday and m/d/Y dates
+    rows = [WeatherCreate(id=0, stationtype="st", weather_id="7", date="03/01/2024", jday=19783, hour=None,
+                          srad=12.5, wind=None, rh=None, rain=0.0, tmax=21.0, tmin=8.0, temperature=None, co2=None)]
+    frame = pd.DataFrame([row.model_dump(include=set(ingest_columns)) for row in rows], columns=ingest_columns)
+    valid, rejected = validate_weather_frame(frame, upload_required)
+    assert rejected == 0
+    assert (valid.iloc[0]["date"], valid.iloc[0]["jday"]) == ("2024-03-01", 61)
+
+
+def test_daily_rows_replace_their_day(session: Session) -> None:
+    def upload(tmax: float) -> None:
+        frame = pd.DataFrame({"stationtype": "st", "weather_id": "daily-test", "date": ["2020-01-01", "2020-01-02"],
+                              "tmax": [tmax, tmax + 1]})
+        copy_weather_rows(validate_weather_frame(frame, upload_required)[0], session)
+
+    upload(10.0)
+    upload(20.0)
+    rows = session.execute(text("""
+        SELECT date, hour, tmax FROM weather_data WHERE weather_id = 'daily-test' ORDER BY date
+    """)).fetchall()
+    assert [tuple(row) for row in rows] == [("2020-01-01", None, 20.0), ("2020-01-02", None, 21.0)]
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from app.weather_helper import format_weather
+
+
+def daily_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "jday": [1, 2],
+        "date": pd.to_datetime(["2020-01-01", "2020-01-02"]),
+        "hour": [0, 0],
+        "srad": [1.234, 2.0],
+        "tmax": [10.0, 11.0],
+        "tmin": [1.0, 2.0],
+        "temperature": [0.0, 0.0],
+        "rain": [0.0, 1.256],
+        "wind": [3.0, np.nan],
+        "rh": [50.0, 60.0],
+        "co2": [0.0, 0.0],
+    })
+
+
+def test_daily_file_drops_missing_columns() -> None:
+    text, hourly_flag, rh_flag, co2_flag, wind_flag = format_weather(daily_frame(), 0, 0, 0)
+    assert (hourly_flag, rh_flag, co2_flag, wind_flag) == (0, 1, 0, 0)
+    assert text.splitlines() == [
+        "JDay,Date,Radiation,Tmax,Tmin,rain,rh",
+        "JDay Date Radiation Tmax Tmin rain rh",
+        "1 '01/01/2020' 1.23 10.0 1.0 0.0 50.0",
+        "2 '01/02/2020' 2.0 11.0 2.0 1.26 60.0",
+    ]
+
+
+def test_co2_and_temperature_variations() -> None:
+    text, _, _, co2_flag, _ = format_weather(daily_frame(), 2, 0, 450)
+    assert co2_flag == 1
+    assert text.splitlines()[2] == "1 '01/01/2020' 1.23 12.0 3.0 0.0 50.0 450.0"
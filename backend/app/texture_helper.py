@@ -1,67 +1,144 @@
-from shapely.geometry import Point, Polygon
 '''
 Function to classify a soil in the triangle based on sand and clay %
 Reference: http://nowlin.css.msu.edu/software/triangle_form.html
 '''
-class Texture:
-    def __init__(self,sand,clay):
-        self.sand = sand
-        self.clay = clay
-    
+from fractions import Fraction
+from typing import Any
 
-    def whatTexture(self):
-        # Initialize polygons
-        silt_loam = Polygon([(0,12),(0,27),(23,27),(50,0),(20,0),(8,12)])
-        sand = Polygon([(85,0),(90,10),(100,0)])
-        silty_clay_loam = Polygon([(0,27),(0,40),(20,40),(20,27)])
-        loam = Polygon([(43,7),(23,27),(45,27),(52,20),(52,7)])
-        clay_loam = Polygon([(20,27),(20,40),(45,40),(45,27)])
-        sandy_loam = Polygon([(50,0),(43,7),(52,7),(52,20),(80,20),(85,15),(70,0)])
-        silty_clay = Polygon([(0,40),(0,60),(20,40)])
-        sandy_clay_loam = Polygon([(52,20),(45,27),(45,35),(65,35),(80,20)])
-        loamy_sand = Polygon([(70,0),(85,15),(90,10),(85,0)])
-        clay = Polygon([(20,40),(0,60),(0,100),(45,55),(45,40)])
-        silt = Polygon([(0,0),(0,12),(8,12),(20,0)])
-        sandy_clay = Polygon([(45,35),(45,55),(65,35)])
-
-        # Define point
-        p = Point(self.sand,self.clay)
-
-        texture = ''
-
-        # Find polygon(s) where the point is.
-        if self.sand >= 0 and self.clay >= 0:
-            if silt_loam.contains(p):
-                texture += '/silt loam'
-            if sand.contains(p):
-                texture += '/sand'
-            if silty_clay_loam.contains(p):
-                texture += '/silty clay loam'
-            if loam.contains(p):
-                texture += '/loam'
-            if clay_loam.contains(p):
-                texture += '/clay loam'
-            if sandy_loam.contains(p):
-                texture += '/sandy loam'
-            if silty_clay.contains(p):
-                texture += '/silty clay'
-            if sandy_clay_loam.contains(p):
-                texture += '/sandy clay loam'
-            if loamy_sand.contains(p):
-                texture += '/loamy sand'
-            if clay.contains(p):
-                texture += '/clay'
-            if silt.contains(p):
-                texture += '/silt'
-            if sandy_clay.contains(p):
-                texture += '/sandy clay'
-
-        if texture == '':
-            texture='silt loam'
-
-        return texture
+import numpy as np
+
+# Texture classes of the triangle as (name, vertices in (sand, clay) %), in
+# the order their names are appended when a point falls in several of them
+texture_polygons = [
+    ('silt loam', [(0, 12), (0, 27), (23, 27), (50, 0), (20, 0), (8, 12)]),
+    ('sand', [(85, 0), (90, 10), (100, 0)]),
+    ('silty clay loam', [(0, 27), (0, 40), (20, 40), (20, 27)]),
+    ('loam', [(43, 7), (23, 27), (45, 27), (52, 20), (52, 7)]),
+    ('clay loam', [(20, 27), (20, 40), (45, 40), (45, 27)]),
+    ('sandy loam', [(50, 0), (43, 7), (52, 7), (52, 20), (80, 20), (85, 15), (70, 0)]),
+    ('silty clay', [(0, 40), (0, 60), (20, 40)]),
+    ('sandy clay loam', [(52, 20), (45, 27), (45, 35), (65, 35), (80, 20)]),
+    ('loamy sand', [(70, 0), (85, 15), (90, 10), (85, 0)]),
+    ('clay', [(20, 40), (0, 60), (0, 100), (45, 55), (45, 40)]),
+    ('silt', [(0, 0), (0, 12), (8, 12), (20, 0)]),
+    ('sandy clay', [(45, 35), (45, 55), (65, 35)]),
+]
+
+default_texture = 'silt loam'
+
+# Cross products this close to 0 are settled with exact arithmetic, so a
+# point on a class boundary never lands inside by rounding
+boundary_tolerance = 1e-9
+
+
+def _polygon_edges(vertices: list) -> list:
+    return list(zip(vertices, vertices[1:] + vertices[:1]))
+
+
+def _inside_polygon(sand: np.ndarray, clay: np.ndarray, vertices: list) -> tuple:
+    '''
+    Strict point-in-polygon test over arrays: points on an edge or a vertex
+    are outside, as with shapely's contains.
+    Output:
+        (bool array inside, bool array of points too close to an edge for
+        floating point to decide)
+    '''
+    inside = np.zeros(sand.shape, dtype=bool)
+    on_edge = np.zeros(sand.shape, dtype=bool)
+    unsure = np.zeros(sand.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in _polygon_edges(vertices):
+        cross = (x1 - x0) * (clay - y0) - (y1 - y0) * (sand - x0)
+        in_box = (sand >= min(x0, x1)) & (sand <= max(x0, x1)) & (clay >= min(y0, y1)) & (clay <= max(y0, y1))
+        on_edge |= in_box & (cross == 0)
+        unsure |= in_box & (np.abs(cross) <= boundary_tolerance) & (cross != 0)
+        # Ray towards +sand: crosses the edge when the point is left of an
+        # upward edge or right of a downward one
+        straddle = (y0 > clay) != (y1 > clay)
+        inside ^= straddle & ((cross > 0) if y1 > y0 else (cross < 0))
+    return inside & ~on_edge, unsure
+
+
+def _inside_polygon_exact(sand: float, clay: float, vertices: list) -> bool:
+    sand, clay = Fraction(sand), Fraction(clay)
+    inside = False
+    for (x0, y0), (x1, y1) in _polygon_edges(vertices):
+        cross = (x1 - x0) * (clay - y0) - (y1 - y0) * (sand - x0)
+        if cross == 0 and min(x0, x1) <= sand <= max(x0, x1) and min(y0, y1) <= clay <= max(y0, y1):
+            return False
+        if ((y0 > clay) != (y1 > clay)) and ((cross > 0) if y1 > y0 else (cross < 0)):
+            inside = not inside
+    return inside
 
 
+def _texture_names(matches: list) -> str:
+    return ''.join('/' + name for name in matches) or default_texture
 
 
+def classify_points(sand: np.ndarray, clay: np.ndarray) -> np.ndarray:
+    '''
+    Texture of every (sand, clay) point by polygon tests over the arrays.
+    Input:
+        sand, clay: float arrays of %, same shape
+    Output:
+        object array of texture strings as returned by Texture.whatTexture
+    '''
+    valid = (sand >= 0) & (clay >= 0)
+    member = np.zeros((len(texture_polygons),) + sand.shape, dtype=bool)
+    unsure = np.zeros(sand.shape, dtype=bool)
+    for i, (name, vertices) in enumerate(texture_polygons):
+        member[i], near = _inside_polygon(sand, clay, vertices)
+        unsure |= near
+    member &= valid
+    textures = np.full(sand.shape, default_texture, dtype=object)
+    for pos in zip(*np.nonzero(member.any(axis=0) | (unsure & valid))):
+        if unsure[pos]:
+            matches = [name for name, vertices in texture_polygons
+                       if _inside_polygon_exact(float(sand[pos]), float(clay[pos]), vertices)]
+        else:
+            matches = [name for (name, vertices), hit in zip(texture_polygons, member[(slice(None),) + pos]) if hit]
+        textures[pos] = _texture_names(matches)
+    return textures
 
+
+def _texture_table() -> np.ndarray:
+    percent = np.arange(101, dtype=np.float64)
+    sand, clay = np.meshgrid(percent, percent, indexing='ij')
+    return classify_points(sand, clay)
+
+
+# Texture of every whole-percent (sand, clay) pair, indexed [sand, clay]
+texture_table = _texture_table()
+
+
+def classify_textures(sand: Any, clay: Any) -> list:
+    '''
+    Textures of a whole soil profile at once. Whole percentages are looked up
+    in texture_table, other values go through the polygon tests.
+    Input:
+        sand, clay: sequences of % per layer; None or NaN gives the default
+    Output:
+        list of texture strings as returned by Texture.whatTexture: '/name'
+        for each class holding the point, 'silt loam' when none does
+    '''
+    sand = np.asarray(sand, dtype=np.float64).ravel()
+    clay = np.asarray(clay, dtype=np.float64).ravel()
+    with np.errstate(invalid='ignore'):
+        whole = (sand == np.round(sand)) & (clay == np.round(clay)) \
+            & (sand >= 0) & (sand <= 100) & (clay >= 0) & (clay <= 100)
+    textures = np.empty(sand.shape, dtype=object)
+    textures[whole] = texture_table[sand[whole].astype(np.intp), clay[whole].astype(np.intp)]
+    other = ~whole
+    if other.any():
+        with np.errstate(invalid='ignore'):
+            textures[other] = classify_points(sand[other], clay[other])
+    return textures.tolist()
+
+
+class Texture:
+    def __init__(self,sand,clay):
+        self.sand = sand
+        self.clay = clay
+
+
+    def whatTexture(self):
+        return classify_textures([self.sand], [self.clay])[0]
@@ -0,0 +1,161 @@
+import io
+import logging
+from datetime import date, timedelta
+from typing import Any, AsyncIterator
+
+import numpy as np
+import pandas as pd
+from aiohttp import ClientSession, ClientTimeout
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+from app.weatherIngest_helper import download_required, ingest_weather_frame
+
+logger = logging.getLogger(__name__)
+
+weather_attributes = "air_temperature,relative_humidity,wind_speed,shortwave_radiation,precipitation"
+
+# CSV lines parsed and written at a time
+stream_batch_lines = 24 * 30
+
+
+def read_station_coverage(weather_id: Any, start: date, end: date, session: Any) -> set:
+    '''
+    Days between start and end (inclusive) for which the station has all 24 hours.
+    '''
+    query = text("""
+        SELECT date FROM weather_station_daily
+         WHERE weather_id = :weather_id AND date >= :start AND date <= :end AND hours >= 24
+    """)
+    rows = session.execute(query, {'weather_id': str(weather_id), 'start': start, 'end': end}).fetchall()
+    return {row[0] for row in rows}
+
+
+def missing_windows(covered: set, start: date, end: date, chunk_days: int, refresh_from: Any = None) -> list:
+    '''
+    Date windows to request so that every day between start and end is fetched
+    once: runs of days not in covered, plus every day from refresh_from on,
+    each split into windows of at most chunk_days.
+    Input:
+        covered: set of dates already complete
+        start, end: inclusive range
+        chunk_days: longest window
+        refresh_from: optional first date fetched even when covered
+    Output:
+        list of (first day, last day) tuples in date order
+    '''
+    days = pd.date_range(start, end, freq="D").date
+    wanted = np.array([day not in covered or (refresh_from is not None and day >= refresh_from)
+                       for day in days], dtype=bool)
+    windows = []
+    # Runs of wanted days: a run starts where wanted turns on and ends where it turns off
+    edges = np.flatnonzero(np.diff(np.r_[False, wanted, False].astype(np.int8)))
+    for first, stop in zip(edges[::2], edges[1::2]):
+        for chunk in range(first, stop, chunk_days):
+            windows.append((days[chunk], days[min(chunk + chunk_days, stop) - 1]))
+    return windows
+
+
+def process_weather_data(data: pd.DataFrame, station_type: str, weather_id: Any) -> pd.DataFrame:
+    '''
+    Turn rows of the weather service CSV into weather_data rows.
+    '''
+    date_objects = pd.to_datetime(data['date'])
+    data['jday'] = date_objects.dt.dayofyear
+    data['hour'] = date_objects.dt.hour
+    data['date'] = date_objects.dt.strftime('%Y-%m-%d')
+
+    data.rename(columns={
+        "air_temperature": "temperature",
+        "relative_humidity": "rh",
+        "wind_speed": "wind",
+        "shortwave_radiation": "srad",
+        "precipitation": "rain"
+    }, inplace=True)
+
+    # W/m2 over an hour to MJ/m2, fraction to percent
+    data['srad'] = data['srad'] * 3600 / 1000000
+    data['rh'] = data['rh'] * 100
+
+    data['stationtype'] = station_type
+    data['weather_id'] = weather_id
+
+    for col in ['tmax', 'tmin', 'co2']:
+        if col not in data.columns:
+            data[col] = 0.00
+
+    return data
+
+
+def weather_request_params(lat: Any, lon: Any, first: date, last: date) -> dict:
+    return {
+        "email": settings.WEATHER_SERVICE_EMAIL,
+        "lat": lat,
+        "lon": lon,
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+        "attributes": weather_attributes,
+        "output": "csv",
+        "options": "predicted",
+    }
+
+
+async def stream_weather_csv(response: Any, batch_lines: int = stream_batch_lines) -> AsyncIterator[pd.DataFrame]:
+    '''
+    Parse a CSV response body as it arrives, batch_lines rows at a time.
+    '''
+    header = None
+    lines = []
+    async for raw in response.content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            continue
+        if header is None:
+            header = line
+            continue
+        lines.append(line)
+        if len(lines) >= batch_lines:
+            yield pd.read_csv(io.StringIO("\n".join([header] + lines)))
+            lines = []
+    if lines:
+        yield pd.read_csv(io.StringIO("\n".join([header] + lines)))
+
+
+async def download_station_weather(station_type: str, weather_id: Any, lat: Any, lon: Any, windows: list,
+                                   session: Any) -> int:
+    '''
+    Fetch the given windows from the weather service and upsert them. Every
+    window is committed on its own, so an interrupted download resumes from
+    the coverage it left.
+    Input:
+        windows: (first day, last day) tuples as from missing_windows
+    Output:
+        number of rows written
+    Raises RuntimeError when the service answers with an error status.
+    '''
+    row_count = 0
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    async with ClientSession(timeout=ClientTimeout(total=None, sock_read=45)) as http_session:
+        for first, last in windows:
+            params = weather_request_params(lat, lon, first, last)
+            async with http_session.get(settings.WEATHER_SERVICE_URL, params=params, headers=headers) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"API returned status {response.status}")
+                async for batch in stream_weather_csv(response):
+                    written, rejected = ingest_weather_frame(process_weather_data(batch, station_type, weather_id),
+                                                             session, download_required)
+                    row_count += written
+            session.commit()
+            logger.info(f"Weather for station {weather_id} {first}..{last} stored, {row_count} rows so far")
+    return row_count
+
+
+def download_range(con: bool, today: date) -> tuple:
+    '''
+    (start, end, refresh_from) of a download: the whole configured range,
+    refetched entirely when con is set.
+    '''
+    start = date.fromisoformat(settings.WEATHER_DOWNLOAD_START)
+    end = today + timedelta(days=settings.WEATHER_DOWNLOAD_AHEAD_DAYS)
+    refresh_from = start if con else today - timedelta(days=settings.WEATHER_DOWNLOAD_REFRESH_DAYS)
+    return start, end, refresh_from
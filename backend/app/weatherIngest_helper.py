@@ -0,0 +1,142 @@
+import logging
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+from app.weatherStats_helper import refresh_station_days
+
+logger = logging.getLogger(__name__)
+
+# weather_data columns written by an ingest, in COPY order
+ingest_columns = ["stationtype", "weather_id", "jday", "date", "hour", "srad", "wind", "rh", "rain",
+                  "tmax", "tmin", "temperature", "co2"]
+
+numeric_columns = ["jday", "hour", "srad", "wind", "rh", "rain", "tmax", "tmin", "temperature", "co2"]
+
+# Rows of user files only need a day; downloads carry every hourly variable.
+# jday is always derived from the date.
+upload_required = ["date"]
+download_required = ["date", "hour", "srad", "wind", "rh", "rain", "tmax", "tmin", "temperature", "co2"]
+
+# Rows read from an uploaded CSV at a time
+upload_chunk_rows = 100000
+
+# Rows formatted into one COPY write
+copy_block_rows = 20000
+
+
+def validate_weather_frame(frame: pd.DataFrame, required: list) -> tuple:
+    '''
+    Coerce a frame to weather_data types and drop the rows that cannot be
+    stored, with column-wide masks instead of per-row checks. jday is set to
+    the day of year of the date, whatever the rows carried.
+    Input:
+        frame: weather rows, any subset of ingest_columns; stationtype and
+            weather_id must be there
+        required: columns that must be present in a row
+    Output:
+        (frame with every ingest column, number of rows dropped)
+    '''
+    frame = frame.copy()
+    for col in numeric_columns:
+        if col in frame.columns:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce")
+        else:
+            frame[col] = np.nan
+    dates = pd.to_datetime(frame["date"], errors="coerce", format="mixed") if "date" in frame.columns \
+        else pd.Series(pd.NaT, index=frame.index)
+    frame["date"] = dates.dt.strftime("%Y-%m-%d")
+    frame["jday"] = dates.dt.dayofyear
+
+    keep = np.ones(len(frame), dtype=bool)
+    for col in required:
+        keep &= frame[col].notna().to_numpy()
+    for col in numeric_columns:
+        values = frame[col].to_numpy(dtype=np.float64)
+        keep &= ~np.isinf(values)
+    hour = frame["hour"].to_numpy(dtype=np.float64)
+    keep &= np.isnan(hour) | ((hour >= 0) & (hour <= 24))
+    frame = frame.loc[keep, ingest_columns]
+    frame["weather_id"] = frame["weather_id"].astype(str)
+    return frame, int((~keep).sum())
+
+
+def copy_weather_rows(frame: pd.DataFrame, session: Any, returning: bool = False) -> Any:
+    '''
+    Load validated rows into weather_data: COPY into a temporary staging
+    table, then one INSERT ... SELECT that replaces the station hours already
+    stored, and refresh the statistics of the days written. Rows without an
+    hour (daily stations) replace the stored row of their day. The caller
+    commits.
+    Input:
+        frame: output of validate_weather_frame
+        returning: return the stored rows (id and ingest_columns) instead of their number
+    Output:
+        number of rows written, or the list of stored rows
+    '''
+    if frame.empty:
+        return [] if returning else 0
+    # seq keeps the COPY order, so the last row of a station hour can win
+    session.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS weather_stage (
+            seq integer GENERATED ALWAYS AS IDENTITY,
+            stationtype varchar, weather_id varchar, jday integer, date varchar, hour integer,
+            srad float8, wind float8, rh float8, rain float8, tmax float8, tmin float8,
+            temperature float8, co2 float8
+        ) ON COMMIT DELETE ROWS
+    """))
+    session.execute(text("TRUNCATE weather_stage"))
+    columns = ", ".join(ingest_columns)
+    frame = frame.astype({"jday": "Int64", "hour": "Int64"})
+    dbapi_conn = session.connection().connection.driver_connection
+    with dbapi_conn.cursor() as cur:
+        with cur.copy(f"COPY weather_stage ({columns}) FROM STDIN (FORMAT csv)") as copy:
+            for start in range(0, len(frame), copy_block_rows):
+                copy.write(frame.iloc[start:start + copy_block_rows].to_csv(index=False, header=False))
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in ingest_columns if col not in ("weather_id", "date", "hour"))
+    # The last row of a station hour wins, as if the rows had been written in
+    # order. The unique index maps a NULL hour to -1 so daily rows conflict too.
+    result = session.execute(text(f"""
+        INSERT INTO weather_data ({columns})
+        SELECT DISTINCT ON (weather_id, date, hour) {columns} FROM weather_stage
+         ORDER BY weather_id, date, hour, seq DESC
+        ON CONFLICT (weather_id, date, COALESCE(hour, -1)) DO UPDATE SET {updates}
+        RETURNING {"id, " + columns if returning else "1"}
+    """))
+    rows = result.fetchall()
+    refresh_station_days("SELECT DISTINCT weather_id, date FROM weather_stage", session)
+    return rows if returning else len(rows)
+
+
+def ingest_weather_frame(frame: pd.DataFrame, session: Any, required: list = upload_required) -> tuple:
+    '''
+    Validate and store weather rows. The caller commits.
+    Output:
+        (rows written, rows rejected)
+    '''
+    valid, rejected = validate_weather_frame(frame, required)
+    return copy_weather_rows(valid, session), rejected
+
+
+def ingest_weather_csv(chunks: Iterable, station_type: str, weather_id: Any, session: Any) -> tuple:
+    '''
+    Store an uploaded weather CSV (jday, date, hour, srad, wind, rh, rain,
+    tmax, tmin, temperature, co2 columns; any may be missing except date)
+    read in chunks. The caller commits.
+    Input:
+        chunks: DataFrames, e.g. pd.read_csv(file, chunksize=upload_chunk_rows)
+    Output:
+        (rows written, rows rejected)
+    '''
+    written = rejected = 0
+    for chunk in chunks:
+        chunk.columns = [str(col).strip().lower() for col in chunk.columns]
+        chunk["stationtype"] = station_type
+        chunk["weather_id"] = weather_id
+        count, dropped = ingest_weather_frame(chunk, session)
+        written += count
+        rejected += dropped
+    logger.info(f"Weather upload for station {weather_id}: {written} rows stored, {rejected} rejected")
+    return written, rejected
@@ -0,0 +1,95 @@
+from typing import Any, Optional
+
+from sqlalchemy.sql import text
+
+# weather_data variables summarized per day and per station
+stats_variables = ["srad", "wind", "rh", "rain", "tmax", "tmin", "temperature"]
+
+# weather_data.date values that can be cast to a date
+iso_date_pattern = r'^\d{4}-\d{2}-\d{2}$'
+
+
+def _daily_aggregates() -> str:
+    return ", ".join(f"min({var}), max({var})" for var in stats_variables)
+
+
+def _daily_columns() -> str:
+    return ", ".join(f"{var}_min, {var}_max" for var in stats_variables)
+
+
+def refresh_station_days(days_query: str, session: Any, params: Optional[dict] = None) -> None:
+    '''
+    Recompute weather_station_daily for some station days and then the
+    weather_station_stats of those stations. Only the hourly rows of the
+    given days are read. The caller commits.
+    Input:
+        days_query: SQL returning distinct (weather_id, date) pairs, date as
+            'YYYY-MM-DD' text
+    '''
+    params = params or {}
+    session.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS weather_touched (weather_id varchar, date varchar) ON COMMIT DELETE ROWS
+    """))
+    session.execute(text("TRUNCATE weather_touched"))
+    session.execute(text(f"""INSERT INTO weather_touched {days_query}"""), params)
+    session.execute(text("""
+        DELETE FROM weather_station_daily d USING weather_touched t
+         WHERE d.weather_id = t.weather_id AND d.date = CAST(t.date AS date)
+    """))
+    session.execute(text(f"""
+        INSERT INTO weather_station_daily (weather_id, stationtype, date, hours, {_daily_columns()})
+        SELECT w.weather_id, w.stationtype, CAST(w.date AS date), count(*), {_daily_aggregates()}
+          FROM weather_data w
+          JOIN weather_touched t ON t.weather_id = w.weather_id AND t.date = w.date
+         WHERE w.stationtype IS NOT NULL AND w.date ~ '{iso_date_pattern}'
+         GROUP BY w.weather_id, w.stationtype, w.date
+    """))
+    rollup = ", ".join(f"min({var}_min), max({var}_max)" for var in stats_variables)
+    session.execute(text("""
+        DELETE FROM weather_station_stats WHERE weather_id IN (SELECT weather_id FROM weather_touched)
+    """))
+    session.execute(text(f"""
+        INSERT INTO weather_station_stats (weather_id, stationtype, row_count, days, complete_days,
+                                           first_date, last_date, {_daily_columns()}, updated_at)
+        SELECT weather_id, stationtype, CAST(sum(hours) AS bigint), count(*), count(*) FILTER (WHERE hours >= 24),
+               min(date), max(date), {rollup}, now()
+          FROM weather_station_daily
+         WHERE weather_id IN (SELECT weather_id FROM weather_touched)
+         GROUP BY weather_id, stationtype
+    """))
+
+
+def delete_station_stats(weather_id: Any, session: Any) -> None:
+    '''
+    Remove the statistics of a station whose weather rows were deleted. The
+    caller commits.
+    '''
+    session.execute(text("""DELETE FROM weather_station_daily WHERE weather_id = :id"""), {'id': str(weather_id)})
+    session.execute(text("""DELETE FROM weather_station_stats WHERE weather_id = :id"""), {'id': str(weather_id)})
+
+
+def read_station_stats(weather_id: Any, session: Any) -> Optional[dict]:
+    '''
+    Date range, row counts and per-variable extremes of a station across its
+    station types, in the shape of the old availability report.
+    Output:
+        dict with weather_id, date_min, date_max, <var>_min, <var>_max,
+        row_count, days and complete_days; None if the station has no weather rows
+    '''
+    extremes = ", ".join(f"min({var}_min) AS {var}_min, max({var}_max) AS {var}_max" for var in stats_variables)
+    row = session.execute(text(f"""
+        SELECT weather_id, min(first_date) AS date_min, max(last_date) AS date_max, {extremes},
+               CAST(sum(row_count) AS bigint) AS row_count, CAST(sum(days) AS integer) AS days,
+               CAST(sum(complete_days) AS integer) AS complete_days
+          FROM weather_station_stats
+         WHERE weather_id = :id
+         GROUP BY weather_id
+    """), {'id': str(weather_id)}).fetchone()
+    return dict(row._mapping) if row is not None else None
+
+
+def station_has_weather(weather_id: Any, stationtype: str, session: Any) -> bool:
+    row = session.execute(text("""
+        SELECT 1 FROM weather_station_stats WHERE weather_id = :id AND stationtype = :stationtype AND row_count > 0
+    """), {'id': str(weather_id), 'stationtype': stationtype}).fetchone()
+    return row is not None
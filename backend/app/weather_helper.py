@@ -0,0 +1,244 @@
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+weather_columns = ["jday", "date", "hour", "srad", "tmax", "tmin", "temperature", "rain", "wind", "rh", "co2"]
+
+
+class WeatherCache:
+    '''
+    Process-wide LRU of weather frames, one entry per (stationtype, weather_id).
+
+    An entry holds the rows of one date window, with the date column already
+    parsed, and the weather_meta.data_version it was read at. A request for a
+    window inside the cached one is served by slicing; a wider window reloads
+    the union of both. Every lookup checks data_version with a primary key
+    read, so rows written by the weather routes in another process are never
+    served stale. Loads of the same station are serialized so concurrent runs
+    in one process read the weather once.
+    '''
+
+    def __init__(self, max_stations: int):
+        self.max_stations = max_stations
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._station_locks: dict = {}
+
+    def _station_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._station_locks.setdefault(key, threading.Lock())
+
+    def _get(self, key, version, start, end) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            if entry["version"] != version:
+                del self._entries[key]
+                return None, None
+            self._entries.move_to_end(key)
+            if entry["start"] <= start and end <= entry["end"]:
+                return entry, None
+            return None, entry
+
+    def _put(self, key, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_stations:
+                self._entries.popitem(last=False)
+
+    def window(self, stationtype: str, weather_id: Any, start: str, end: str, session: Any) -> pd.DataFrame:
+        '''
+        Weather rows of a station between two ISO dates (inclusive).
+        Input:
+            stationtype
+            weather_id: weather_meta.id
+            start, end: 'YYYY-MM-DD'
+        Output:
+            DataFrame with weather_columns sorted by date, hour; the caller owns it
+        '''
+        key = (stationtype, str(weather_id))
+        version = read_weather_version(weather_id, session)
+        entry, partial = self._get(key, version, start, end)
+        if entry is None and self.max_stations > 0:
+            with self._station_lock(key):
+                entry, partial = self._get(key, version, start, end)
+                if entry is None:
+                    if partial is not None:
+                        start, end = min(start, partial["start"]), max(end, partial["end"])
+                    entry = {"version": version, "start": start, "end": end,
+                             "frame": _read_window(stationtype, weather_id, start, end, session)}
+                    self._put(key, entry)
+        elif entry is None:
+            return _read_window(stationtype, weather_id, start, end, session)
+        frame = entry["frame"]
+        dates = frame["date"]
+        mask = (dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))
+        return frame.loc[mask].copy()
+
+    def invalidate(self, stationtype: Any = None) -> None:
+        '''
+        Drop cached frames of one station type, or all of them.
+        '''
+        with self._lock:
+            for key in list(self._entries):
+                if stationtype is None or key[0] == stationtype:
+                    del self._entries[key]
+
+
+def read_weather_version(weather_id: Any, session: Any) -> int:
+    '''
+    Returns weather_meta.data_version, bumped whenever weather rows change.
+    '''
+    row = session.execute(text("""SELECT data_version FROM weather_meta WHERE id = :id"""),
+                          {'id': int(weather_id)}).fetchone()
+    return row[0] if row else 0
+
+
+def bump_weather_version(weather_ids: Any, session: Any) -> None:
+    '''
+    Record that weather rows of the given stations changed, so cached frames
+    in every process are reloaded. Commits.
+    Input:
+        weather_ids: weather_meta ids
+    '''
+    ids = sorted({int(i) for i in weather_ids if i is not None and str(i) != ""})
+    if not ids:
+        return
+    session.execute(text("""UPDATE weather_meta SET data_version = data_version + 1 WHERE id = ANY(:ids)"""),
+                    {'ids': ids})
+    session.commit()
+
+
+def _read_window(stationtype, weather_id, start, end, session) -> pd.DataFrame:
+    # weather_data.date is stored as 'YYYY-MM-DD', so the window is a range
+    # predicate on the string column
+    query = text("""
+        SELECT jday, date, hour, srad, tmax, tmin, temperature, rain, wind, rh, co2
+        FROM weather_data
+        WHERE stationtype = :stationtype AND weather_id = :weather_id
+          AND date >= :start AND date <= :end
+        ORDER BY date, hour
+    """)
+    result = session.execute(query, {'stationtype': stationtype, 'weather_id': str(weather_id),
+                                     'start': start, 'end': end})
+    frame = pd.DataFrame(result.fetchall(), columns=weather_columns)
+    frame['date'] = pd.to_datetime(frame['date'])
+    logger.info(f"Loaded {len(frame)} weather rows for {stationtype} {start}..{end}")
+    return frame
+
+
+def _column_text(values: np.ndarray) -> np.ndarray:
+    '''
+    Text of one .wea column as pandas.to_csv writes it: shortest repr of
+    each number and an empty field for NaN.
+    '''
+    if values.dtype.kind in "iub":
+        return values.astype(str)
+    values = values.astype(np.float64)
+    text_values = values.astype(str)
+    text_values[np.isnan(values)] = ""
+    return text_values
+
+
+def format_weather(df: pd.DataFrame, tempVar: Any, rainVar: Any, CO2Var: Any) -> tuple:
+    '''
+    Build the body of a .wea file from the simulation window of a station.
+    Daily/hourly detection and the optional-column rules are those of the
+    original pandas writer; all presence flags come from one NaN scan of the
+    optional columns.
+    Input:
+        df: weather_columns rows, date parsed
+        tempVar, rainVar, CO2Var: sensitivity variations of the run
+    Output:
+        (text, hourly_flag, rh_flag, co2_flag, wind_flag)
+    '''
+    dates = df["date"].to_numpy()
+    num_records = len(df)
+    weather_length = (dates.max() - dates.min()) // np.timedelta64(1, "D") if num_records else 0
+    hourly_flag = 1 if num_records > weather_length + 1 else 0
+    if hourly_flag:
+        order = np.lexsort((df["hour"].to_numpy(), dates))
+        names = ["JDay", "Date", "hour", "Radiation", "temperature", "rain", "Wind", "rh", "CO2"]
+        fields = ["jday", "date", "hour", "srad", "temperature", "rain", "wind", "rh", "co2"]
+        temperature_fields = ["temperature"]
+    else:
+        order = np.argsort(dates, kind="stable")
+        names = ["JDay", "Date", "Radiation", "Tmax", "Tmin", "rain", "Wind", "rh", "CO2"]
+        fields = ["jday", "date", "srad", "tmax", "tmin", "rain", "wind", "rh", "co2"]
+        temperature_fields = ["tmax", "tmin"]
+    columns = {name: df[field].to_numpy()[order] for name, field in zip(names, fields)}
+
+    # One pass over the optional columns for missing values
+    optional = ["rh", "CO2", "rain", "Wind"]
+    matrix = np.column_stack([columns[name].astype(np.float64) for name in optional]) if num_records \
+        else np.empty((0, len(optional)))
+    missing = dict(zip(optional, np.isnan(matrix).any(axis=0)))
+    co2_zero = bool((matrix[:, 1] == 0).any()) if num_records else False
+
+    decimals = {"Radiation": 2, "rain": 2, "Wind": 2, "rh": 1, "CO2": 1}
+    # The pandas writer rounded by lower-case name, which matched the hourly
+    # temperature column but not the daily Tmax/Tmin ones
+    if hourly_flag:
+        decimals["temperature"] = 1
+    if tempVar != 0:
+        for name, field in zip(names, fields):
+            if field in temperature_fields:
+                columns[name] = columns[name] + float(tempVar)
+
+    rh_flag = 1
+    if missing["rh"]:
+        del columns["rh"]
+        rh_flag = 0
+    co2_flag = 1
+    if CO2Var != "None" and CO2Var != 0:
+        columns["CO2"] = np.full(num_records, float(CO2Var))
+    elif missing["CO2"] or co2_zero:
+        del columns["CO2"]
+        co2_flag = 0
+    if rainVar != 0:
+        rain = columns["rain"].astype(np.float64)
+        columns["rain"] = rain + rain * (float(rainVar) / 100.0)
+    elif missing["rain"]:
+        del columns["rain"]
+    wind_flag = 1
+    if missing["Wind"]:
+        del columns["Wind"]
+        wind_flag = 0
+
+    # Dates repeat 24 times in hourly files, format each distinct day once
+    codes, uniques = pd.factorize(columns["Date"])
+    date_text = np.asarray(pd.DatetimeIndex(uniques).strftime("'%m/%d/%Y'"), dtype=object)
+    cells = []
+    for name, values in columns.items():
+        if name == "Date":
+            cells.append(date_text[codes] if num_records else np.empty(0, dtype=object))
+            continue
+        if name in decimals and values.dtype.kind == "f":
+            values = np.round(values, decimals[name])
+        cells.append(_column_text(values))
+
+    buffer = io.StringIO()
+    buffer.write(",".join(columns))
+    buffer.write("\n")
+    buffer.write(" ".join(columns))
+    buffer.write("\n")
+    rows = map(" ".join, zip(*cells))
+    buffer.write("\n".join(rows))
+    if num_records:
+        buffer.write("\n")
+    return buffer.getvalue(), hourly_flag, rh_flag, co2_flag, wind_flag
+
+
+weather_cache = WeatherCache(settings.WEATHER_CACHE_STATIONS)
@@ -0,0 +1,140 @@
+"""
+Micro-benchmark of the .wea writer: the previous pandas path of WriteWeather
+against app.weather_helper.format_weather, on a synthetic 10-year hourly
+station. Both outputs are compared byte for byte.
+
+    cd backend && python scripts/benchmark_weather_writer.py [--years 10] [--repeat 5]
+
+Needs the same environment as the backend (app.core.config settings).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.weather_helper import format_weather
+
+
+def synthetic_station(years: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2014-01-01", periods=365 * years, freq="D")
+    n = len(days) * 24
+    dates = np.repeat(days.values, 24)
+    return pd.DataFrame({
+        "jday": np.repeat(days.dayofyear.values, 24),
+        "date": dates,
+        "hour": np.tile(np.arange(24), len(days)),
+        "srad": rng.uniform(0, 3.5, n),
+        "tmax": np.zeros(n),
+        "tmin": np.zeros(n),
+        "temperature": rng.normal(15, 8, n),
+        "rain": rng.exponential(0.2, n),
+        "wind": rng.uniform(0, 9, n),
+        "rh": rng.uniform(20, 100, n),
+        "co2": np.zeros(n),
+    })
+
+
+def legacy_write(df_weatherdata, filename, tempVar, rainVar, CO2Var):
+    # WriteWeather before the NumPy formatter, unchanged
+    hourly_flag = 0
+    weather_length = df_weatherdata['date'].max() - df_weatherdata['date'].min()
+    num_records = len(df_weatherdata)
+    df_weatherdata['date'] = pd.to_datetime(df_weatherdata['date'], format='%Y-%m-%d')
+    weatherRoundDict = {"Radiation": 2, "rain": 2, "Wind": 2, "rh": 1, "CO2": 1}
+    if (num_records > (weather_length.days + 1)):
+        df_weatherdata = df_weatherdata.drop(columns=['tmax', 'tmin'])
+        weather_col_names = ["JDay", "Date", "hour", "Radiation", "temperature", "rain", "Wind", "rh", "CO2"]
+        hourly_flag = 1
+        df_weatherdata = df_weatherdata.sort_values(by=['date', 'hour'])
+        if tempVar != 0:
+            df_weatherdata['temperature'] = df_weatherdata['temperature'] + float(tempVar)
+        weatherRoundDict['temperature'] = 1
+    else:
+        df_weatherdata = df_weatherdata.drop(columns=['hour', 'temperature'])
+        weather_col_names = ["JDay", "Date", "Radiation", "Tmax", "Tmin", "rain", "Wind", "rh", "CO2"]
+        df_weatherdata = df_weatherdata.sort_values(by=['date'])
+        if tempVar != 0:
+            df_weatherdata['tmax'] = df_weatherdata['tmax'] + float(tempVar)
+            df_weatherdata['tmin'] = df_weatherdata['tmin'] + float(tempVar)
+        weatherRoundDict['tmax'] = 1
+        weatherRoundDict['tmin'] = 1
+    df_weatherdata['date'] = df_weatherdata['date'].dt.strftime('\'%m/%d/%Y\'')
+    df_weatherdata.columns = weather_col_names
+    rh_flag = 1
+    if (df_weatherdata['rh'].isna().sum() > 0 or (df_weatherdata['rh'] == '').sum() > 0):
+        df_weatherdata = df_weatherdata.drop(columns=['rh'])
+        rh_flag = 0
+        del weatherRoundDict['rh']
+    co2_flag = 1
+    if CO2Var != "None" and CO2Var != 0:
+        df_weatherdata['CO2'] = float(CO2Var)
+    else:
+        if (df_weatherdata['CO2'].isna().sum() > 0 or (df_weatherdata['CO2'] == 0).sum() > 0):
+            df_weatherdata = df_weatherdata.drop(columns=['CO2'])
+            co2_flag = 0
+            del weatherRoundDict['CO2']
+    if rainVar != 0:
+        df_weatherdata['rain'] = df_weatherdata['rain'] + (df_weatherdata['rain'] * (float(rainVar) / 100.0))
+    else:
+        if (df_weatherdata['rain'].isna().sum() > 0 or (df_weatherdata['rain'] == '').sum() > 0):
+            df_weatherdata = df_weatherdata.drop(columns=['rain'])
+            del weatherRoundDict['rain']
+    wind_flag = 1
+    if (df_weatherdata['Wind'].isna().sum() > 0 or (df_weatherdata['Wind'] == '').sum() > 0):
+        df_weatherdata = df_weatherdata.drop(columns=['Wind'])
+        del weatherRoundDict['Wind']
+        wind_flag = 0
+    comment_value = ",".join(df_weatherdata.columns)
+    with open(filename, 'a') as ff:
+        ff.write(comment_value)
+        ff.write('\n')
+    df_weatherdata = df_weatherdata.round(weatherRoundDict)
+    df_weatherdata.to_csv(filename, sep=' ', index=False, mode='a')
+    return hourly_flag, rh_flag, co2_flag, wind_flag
+
+
+def numpy_write(df, filename, tempVar, rainVar, CO2Var):
+    weather_text, hourly_flag, rh_flag, co2_flag, wind_flag = format_weather(df, tempVar, rainVar, CO2Var)
+    with open(filename, 'a') as ff:
+        ff.write(weather_text)
+    return hourly_flag, rh_flag, co2_flag, wind_flag
+
+
+def best_of(writer, df, repeat, variation):
+    best = float("inf")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(repeat):
+            filename = os.path.join(tmp, f"{writer.__name__}{i}.wea")
+            frame = df.copy()
+            started = time.perf_counter()
+            flags = writer(frame, filename, *variation)
+            best = min(best, time.perf_counter() - started)
+        with open(filename) as fh:
+            content = fh.read()
+    return best, flags, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_station(args.years)
+    print(f"{len(df)} hourly rows")
+    for variation in [(0, 0, 0), (2, -20, 550)]:
+        legacy, legacy_flags, legacy_text = best_of(legacy_write, df, args.repeat, variation)
+        fast, fast_flags, fast_text = best_of(numpy_write, df, args.repeat, variation)
+        same = legacy_text == fast_text and legacy_flags == fast_flags
+        print(f"tempVar/rainVar/CO2Var={variation}: pandas {legacy:.3f}s  numpy {fast:.3f}s  "
+              f"speedup {legacy / fast:.1f}x  identical={same}")
+        if not same:
+            raise SystemExit("outputs differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,7 @@ import type {
   // WeatherDatasPublic,
   CultivarsPublic,
   WeatherDataCreate,
+  WeatherDataPublic,
   SoilsPublicTable,
   SoilCreateTable,
   SoilUpdateTable,
@@ -1314,7 +1315,7 @@ export class WeatherService {
 
   public static submitWeatherTable(
     data: TDataCreateWeatherTable
-  ): CancelablePromise<WeatherDataCreate> {
+  ): CancelablePromise<Array<WeatherDataPublic>> {
     const { requestBody } = data;
     return __request(OpenAPI, {
       method: "POST",
@@ -9,6 +9,7 @@ import {
 } from '@chakra-ui/react';
 import Plot from 'react-plotly.js';
 import { Layout, Data } from 'plotly.js';
+import { OpenAPI } from '../../client';
 
 // Define the type for the props
 interface SoilWHN2DTabProps {
@@ -18,40 +19,72 @@ interface SoilWHN2DTabProps {
   onClickPlotSoil2DTab: (date: string) => void; // Callback function for plot button click
 }
 
+const authHeaders = () => ({
+  Authorization: `Bearer ${localStorage.getItem('access_token')}`,
+});
+
 const SoilWHN2DTab: React.FC<SoilWHN2DTabProps> = ({
+  g03Tablename,
+  simulationID,
   onClickPlotSoil2DTab,
 }) => {
   const [dateList, setDateList] = useState<string[]>([]);
+  const [variableList, setVariableList] = useState<string[]>([]);
   const [selectedDate, setSelectedDate] = useState<string>('');
+  const [selectedVariable, setSelectedVariable] = useState<string>('');
   const [plotData, setPlotData] = useState<Data[]>([]);
+  const table = (g03Tablename || 'g03').split('_')[0];
+  const baseUrl = `${OpenAPI.BASE}/api/v1/seasonaloutput/${simulationID}/soil2d`;
 
-  // Simulate fetching data for date selection
   useEffect(() => {
-    // Replace with actual data fetching
     const fetchDateList = async () => {
-      // Simulate a data fetching operation
-      const response = await fetch('/api/getDateList'); // Replace with your API endpoint
+      const response = await fetch(`${baseUrl}/dates?table=${table}`, { headers: authHeaders() });
+      if (!response.ok) return;
       const data = await response.json();
-      setDateList(data.dates); // Assuming the API returns an object with a dates array
+      setDateList(data.dates);
+      setVariableList(data.variables);
+      setSelectedVariable((current) => current || data.variables[0] || '');
     };
 
     fetchDateList();
-  }, []);
+  }, [baseUrl, table]);
 
   // Handle date selection
   const handleDateChange = (event: React.ChangeEvent<HTMLSelectElement>) => {
     setSelectedDate(event.target.value);
   };
 
-  // Plotting function
-  const handlePlot = () => {
-    // Simulate generating plot data based on selected date
+  const handleVariableChange = (event: React.ChangeEvent<HTMLSelectElement>) => {
+    setSelectedVariable(event.target.value);
+  };
+
+  // Plotting function: the server interpolates the frame onto a pixel grid
+  const handlePlot = async () => {
+    if (!selectedDate || !selectedVariable) return;
+    const response = await fetch(
+      `${baseUrl}/raster?table=${table}&variable=${encodeURIComponent(selectedVariable)}` +
+      `&date=${encodeURIComponent(selectedDate.replace(' ', 'T'))}`,
+      { headers: authHeaders() }
+    );
+    if (!response.ok) return;
+    const width = Number(response.headers.get('X-Raster-Width'));
+    const height = Number(response.headers.get('X-Raster-Height'));
+    const [xmin, xmax, ymin, ymax] = (response.headers.get('X-Raster-Extent') || '0,0,0,0')
+      .split(',').map(Number);
+    const raster = new Float32Array(await response.arrayBuffer());
+    const z: (number | null)[][] = [];
+    for (let row = 0; row < height; row++) {
+      z.push(Array.from(raster.subarray(row * width, (row + 1) * width), (v) => (Number.isNaN(v) ? null : v)));
+    }
     const data: Data[] = [{
-      x: [1, 2, 3, 4, 5], // Example x values
-      y: [1, 4, 9, 16, 25], // Example y values
-      type: 'scatter',
-      mode: 'lines+markers',
-      name: 'Soil WHN Data', // Example name
+      z,
+      x0: xmin + (xmax - xmin) / width / 2,
+      dx: (xmax - xmin) / width,
+      y0: ymin + (ymax - ymin) / height / 2,
+      dy: (ymax - ymin) / height,
+      type: 'heatmap',
+      colorscale: 'Viridis',
+      name: selectedVariable,
     }];
 
     setPlotData(data);
@@ -63,10 +96,10 @@ const SoilWHN2DTab: React.FC<SoilWHN2DTabProps> = ({
     if (!plotData.length) return null;
 
     const layout: Partial<Layout> = {
-      title: { text: 'Soil WHN 2D Graph' },
+      title: { text: `${selectedVariable} ${selectedDate}` },
       hovermode: false,
-      xaxis: { title: { text: 'X Axis' } },
-      yaxis: { title: { text: 'Y Axis' } },
+      xaxis: { title: { text: 'X (cm)' } },
+      yaxis: { title: { text: 'Y (cm)' } },
     };
 
     const config = {
@@ -93,6 +126,17 @@ const SoilWHN2DTab: React.FC<SoilWHN2DTabProps> = ({
           </Select>
         </FormControl>
 
+        <FormControl>
+          <FormLabel>Select Variable</FormLabel>
+          <Select value={selectedVariable} onChange={handleVariableChange}>
+            {variableList.map((variable) => (
+              <option key={variable} value={variable}>
+                {variable}
+              </option>
+            ))}
+          </Select>
+        </FormControl>
+
         <Button colorScheme='teal' onClick={handlePlot}>
           Plot
         </Button>
@@ -32,6 +32,7 @@ import useCustomToast from "../../hooks/useCustomToast";
 function StatusBar({ status }: { status: number | null | undefined }) {
   if (status == null) return <Text color="red.400">Failed</Text>;
   if (status === 101) return <Text color="green.500">Completed</Text>;
+  if (status === 1000) return <Text color="gray.500">Queued</Text>;
   if (status === 1001) return <Text color="orange.400">Started</Text>;
   if (status < 0) return <Text color="red.500">Failed</Text>;
   // Show progress bar for 0-100
@@ -67,7 +68,7 @@ const SeasonalOutput: React.FC = () => {
         (resp.data || []).forEach((sim: any) => {
           newStatusMap[sim.id] = sim.status;
           // Consider "Started" as status === -1, and "in progress" as 0 <= status < 101
-          if (sim.status === -1 || (sim.status != null && sim.status >= 0 && sim.status < 101)) {
+          if (sim.status === -1 || sim.status === 1000 || sim.status === 1001 || (sim.status != null && sim.status >= 0 && sim.status < 101)) {
             anyStarted = true;
           }
         });
@@ -86,7 +87,7 @@ const SeasonalOutput: React.FC = () => {
         let anyStarted = false;
         (resp.data || []).forEach((sim: any) => {
           newStatusMap[sim.id] = sim.status;
-          if (sim.status === -1 || (sim.status != null && sim.status >= 0 && sim.status < 101)) {
+          if (sim.status === -1 || sim.status === 1000 || sim.status === 1001 || (sim.status != null && sim.status >= 0 && sim.status < 101)) {
             anyStarted = true;
           }
         });
@@ -210,7 +210,8 @@ function Weather() {
 
           // dateString = `${year}-${month}-${day}`;
           dateString = `${month}/${day}/${year}`;
-          jday = Math.floor(date.getTime() / (1000 * 60 * 60 * 24)); // Calculate Julian day
+          // Day of year; the server derives it from the date as well
+          jday = Math.round((Date.UTC(year, date.getMonth(), date.getDate()) - Date.UTC(year, 0, 0)) / (1000 * 60 * 60 * 24));
         }
 
         const processedRow: WeatherDataCreate = {
@@ -240,10 +241,13 @@ function Weather() {
       };
       try {
         // Submit the processed data
-        await WeatherService.submitWeatherTable(data);
+        const stored = await WeatherService.submitWeatherTable(data);
+        const skipped = processedData.length - stored.length;
         showToast(
           "Data Submitted",
-          "The weather data has been successfully submitted.",
+          skipped > 0
+            ? `${stored.length} rows were stored, ${skipped} invalid rows were skipped.`
+            : "The weather data has been successfully submitted.",
           "success"
         );
       } catch (error) {